@@ -0,0 +1,366 @@
+"""
+asyncio versions of the conversions in convert.py (Python 3 only).
+
+The functions in convert.py block on cgl_execute until their command is done, so a service has to give every
+conversion its own thread and has no way of stopping a runaway encode.  Here the same ffmpeg and magick commands are
+run as asyncio subprocesses:
+
+    results = await aio.gather(aio.convert_to_mp4('a.mov'), aio.create_movie_thumb('a.mov', 'a.jpg'),
+                               aio.create_web_mov('b.####.jpg', 'b.mp4', timeout=600))
+
+Every command waits on a shared limit (set_limit, defaults to the number of cpus) before it starts, so any number of
+conversions can be awaited at once without oversubscribing the machine.  A command that runs past its timeout, or
+whose task is cancelled, has its whole process group killed and its partial output removed.  These always run
+locally, farm jobs go through convert.py.
+"""
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import signal
+import weakref
+
+from cgl.core.utils.general import write_to_cgl_data
+from convert import convert
+from convert.config import CONFIG
+from convert.manifest import Manifest
+from convert.metrics import FfmpegProgress, StepTimer, add_metrics
+from convert.scheduler import MAGICK_MEMORY, Slot, get_scheduler
+from convert.sequence_index import PATTERN_REGEX, find_sequence
+
+DEFAULT_LIMIT = multiprocessing.cpu_count()
+
+_limit = DEFAULT_LIMIT
+_semaphores = weakref.WeakKeyDictionary()
+# commands holding the semaphore on each event loop.
+_active = weakref.WeakKeyDictionary()
+
+
+def set_limit(limit):
+    """
+    sets how many commands run at the same time, across all conversions.  Takes effect for event loops that haven't
+    started a command yet.
+    """
+    global _limit
+    _limit = max(1, int(limit))
+    _semaphores.clear()
+
+
+def encode_limit():
+    """
+    :return: the semaphore commands on the running event loop wait on
+    """
+    loop = asyncio.get_event_loop()
+    if loop not in _semaphores:
+        _semaphores[loop] = asyncio.Semaphore(_limit)
+    return _semaphores[loop]
+
+
+def _in_thread(func, *args, **kwargs):
+    # probing and sequence scans are blocking, keep them off the event loop.
+    return asyncio.get_event_loop().run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+
+def _kill(process):
+    if process.returncode is not None:
+        return
+    try:
+        if os.name == 'posix':
+            # commands run through a shell, killing the group takes ffmpeg/magick down with it.
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except OSError:
+        pass
+
+
+def _remove(outputs):
+    for output in outputs:
+        if os.path.isfile(output):
+            try:
+                os.remove(output)
+            except OSError:
+                pass
+
+
+async def run_command(command, step, outputs=(), timeout=None, limit=None, command_name=None,
+                      progress_callback=None):
+    """
+    runs a command as an asyncio subprocess.
+    :param command: shell command
+    :param step: name the command's metrics are recorded under
+    :param outputs: files the command writes, removed if it's killed
+    :param timeout: seconds the command may run for, None for no limit.  asyncio.TimeoutError is raised once it's
+    been killed.
+    :param limit: semaphore to wait on before starting, defaults to encode_limit()
+    :param command_name: name recorded in process_info
+    :param progress_callback: called with ffmpeg's progress (frame, fps, speed, out_time, step) while it runs
+    :return: process_info with the command's returncode, stderr and metrics
+    """
+    progress = None
+    if command.startswith(CONFIG.paths['ffmpeg']):
+        callback = None
+        if progress_callback:
+            def callback(snapshot):
+                snapshot['step'] = step
+                progress_callback(snapshot)
+        progress = FfmpegProgress(callback)
+        command = progress.instrument(command, CONFIG.paths['ffmpeg'])
+    loop = asyncio.get_event_loop()
+    async with limit or encode_limit():
+        # the semaphore decides what runs, the budget is worked out as a command starts: the cores split between the
+        # commands running at that moment.
+        _active[loop] = _active.get(loop, 0) + 1
+        scheduler = get_scheduler()
+        budget = Slot(scheduler, scheduler.budget(share=_active[loop]), MAGICK_MEMORY)
+        command = budget.wrap(command, ffmpeg=CONFIG.paths['ffmpeg'], magick=CONFIG.paths['magick'],
+                              outputs=outputs or ())
+        timer = StepTimer(step, outputs=outputs)
+        try:
+            with timer:
+                process = await asyncio.create_subprocess_shell(command, stdout=asyncio.subprocess.PIPE,
+                                                                stderr=asyncio.subprocess.PIPE,
+                                                                start_new_session=True)
+                try:
+                    if progress:
+                        with progress:
+                            out, err = await asyncio.wait_for(process.communicate(), timeout)
+                    else:
+                        out, err = await asyncio.wait_for(process.communicate(), timeout)
+                except BaseException as e:
+                    _kill(process)
+                    await process.wait()
+                    _remove(outputs)
+                    if isinstance(e, asyncio.TimeoutError):
+                        logging.error('%s ran for more than %ss, killed it: %s' % (command_name or step, timeout,
+                                                                                   command))
+                    raise
+        finally:
+            _active[loop] -= 1
+    process_info = {'command': command, 'command_name': command_name or step, 'returncode': process.returncode,
+                    'stderr': err.decode('utf-8', 'replace')}
+    metrics = timer.metrics
+    if progress:
+        for key, value in progress.metrics.items():
+            if value is not None and not metrics.get(key):
+                metrics[key] = value
+    add_metrics(process_info, metrics)
+    if process.returncode != 0:
+        logging.error('%s exited with %s: %s' % (command_name or step, process.returncode, command))
+    return process_info
+
+
+def _record(process_info):
+    try:
+        write_to_cgl_data(process_info)
+    except ValueError:
+        print('Skipping creation of cgl_data for %s' % process_info.get('file_out'))
+    return process_info
+
+
+async def _convert(command, fileout, step, inputs=(), incremental=False, content_hash=False, timeout=None,
+                   limit=None, command_name=None, progress_callback=None):
+    """
+    runs a command that makes a single output, skipping it if the conversion manifest says the output is current.
+    """
+    manifest = Manifest.for_output(fileout)
+    params = {'command': command}
+    if incremental and manifest.is_current(fileout, inputs, params, content_hash=content_hash):
+        logging.info('%s is up to date, skipping' % fileout)
+        return {'command_name': command_name, 'file_out': fileout, 'skipped': True}
+    convert.prep_for_output(fileout)
+    process_info = await run_command(command, step, outputs=[fileout], timeout=timeout, limit=limit,
+                                      command_name=command_name, progress_callback=progress_callback)
+    process_info['file_out'] = fileout
+    if incremental and process_info['returncode'] == 0 and os.path.exists(fileout):
+        manifest.record(fileout, inputs, params, content_hash=content_hash)
+        manifest.save()
+    return _record(process_info)
+
+
+async def create_web_mov(input_sequence, output, framerate=None, output_frame_rate=None, res=None, start_frame=None,
+                         end_frame=None, incremental=False, content_hash=False, timeout=None, limit=None,
+                         command_name='create_web_mov()', progress_callback=None):
+    """
+    awaitable convert.create_web_mov, for jpg sequences.
+    :param input_sequence: input sequence string, formatted with (#, %04d, *)
+    :param output: output mp4
+    :param timeout: seconds the encode may run for
+    :param limit: semaphore to wait on, defaults to encode_limit()
+    :return: process_info, None if there are no frames
+    """
+    sequence = await _in_thread(find_sequence, input_sequence)
+    if not sequence:
+        logging.error('No frames found on disk for %s' % input_sequence)
+        return None
+    first = sequence.start_frame if start_frame is None else start_frame
+    last = sequence.end_frame if end_frame is None else end_frame
+    extra_args = ''
+    if (first, last) != (sequence.start_frame, sequence.end_frame):
+        extra_args = '-frames:v %s -flags +cgop' % (last - first + 1)
+    command = convert.web_mov_command(sequence.num_sequence, output, first, framerate=framerate,
+                                      output_frame_rate=output_frame_rate, res=res, extra_args=extra_args)
+    inputs = [sequence.frame_path(f) for f in sequence.frames if first <= f <= last]
+    return await _convert(command, output, 'web_mov', inputs=inputs, incremental=incremental,
+                          content_hash=content_hash, timeout=timeout, limit=limit, command_name=command_name,
+                          progress_callback=progress_callback)
+
+
+async def convert_to_mp4(filein, fileout=None, audio_only=False, allow_remux=True, incremental=False,
+                         content_hash=False, timeout=None, limit=None, command_name='convert_to_mp4()',
+                         progress_callback=None):
+    """
+    awaitable convert.convert_to_mp4.
+    :return: process_info, 'method' says whether the input was remuxed or encoded
+    """
+    if not fileout:
+        fileout = convert.change_extension(filein, 'mp4')
+    if audio_only and not fileout.endswith('_audio.mp4'):
+        fileout = fileout.replace('.mp4', '_audio.mp4')
+    info = await _in_thread(convert.media_info, filein)
+    if audio_only and info and not info['has_audio']:
+        logging.info('No audio stream in %s, skipping audio conversion' % filein)
+        return {'command_name': command_name, 'file_out': fileout, 'skipped': 'no audio stream'}
+    command, method = convert.mp4_command(filein, fileout, info, audio_only=audio_only, allow_remux=allow_remux)
+    process_info = await _convert(command, fileout, 'audio' if audio_only else 'mp4', inputs=[filein],
+                                  incremental=incremental, content_hash=content_hash, timeout=timeout, limit=limit,
+                                  command_name=command_name, progress_callback=progress_callback)
+    process_info['method'] = method
+    return process_info
+
+
+async def create_prores_mov(input_file, output_file=None, quality=0, timeout=None, limit=None,
+                            command_name='create_prores_mov()', progress_callback=None):
+    """
+    awaitable convert.create_prores_mov.
+    :param quality: 0:proxy, 1:low, 2:standard, 3:high
+    :return: process_info
+    """
+    if not output_file:
+        output_file = '%s_prores_%s.mov' % (os.path.splitext(input_file)[0], convert.PRORES_QUALITY[quality])
+    command = convert.prores_command(input_file, output_file, quality)
+    return await _convert(command, output_file, 'prores', inputs=[input_file], timeout=timeout, limit=limit,
+                          command_name=command_name, progress_callback=progress_callback)
+
+
+async def create_movie_thumb(input_file, output_file, timeout=None, limit=None, command_name='create_movie_thumb()',
+                             progress_callback=None):
+    """
+    awaitable convert.create_movie_thumb.
+    :return: process_info
+    """
+    info = await _in_thread(convert.media_info, input_file)
+    command = convert.movie_thumb_command(input_file, output_file, info)
+    return await _convert(command, output_file, 'thumb', inputs=[input_file], timeout=timeout, limit=limit,
+                          command_name=command_name, progress_callback=progress_callback)
+
+
+async def extract_wav_from_movie(filein, fileout=None, timeout=None, limit=None,
+                                 command_name='extract_wav_from_movie()'):
+    """
+    awaitable convert.extract_wav_from_movie.
+    :return: process_info, None if fileout isn't a wav
+    """
+    if not fileout:
+        fileout = '%s.wav' % os.path.splitext(filein)[0]
+    if not fileout.endswith('.wav'):
+        logging.error('%s is not a .wav file, aborting wav extraction' % fileout)
+        return None
+    info = await _in_thread(convert.media_info, filein)
+    if info and not info['has_audio']:
+        logging.info('No audio stream in %s, skipping wav extraction' % filein)
+        return {'command_name': command_name, 'file_out': fileout, 'skipped': 'no audio stream'}
+    return await _convert(convert.wav_command(filein, fileout), fileout, 'wav', inputs=[filein], timeout=timeout,
+                          limit=limit, command_name=command_name)
+
+
+def _num_sequence(path, padding):
+    match = PATTERN_REGEX.match(os.path.basename(path))
+    if not match:
+        return None
+    return os.path.join(os.path.dirname(path), '%s%%0%sd.%s' % (match.group('prefix'), padding, match.group('ext')))
+
+
+async def create_proxy_sequence(input_sequence, output_sequence, width='1920', height='1080', do_height=False,
+                                ext=None, start_frame=None, end_frame=None, incremental=False, content_hash=False,
+                                timeout=None, limit=None, command_name='create_proxy_sequence()',
+                                progress_callback=None):
+    """
+    awaitable convert.create_proxy_sequence, every frame is resized by its own magick command under the shared limit.
+    :param input_sequence: input sequence string, formatted with (#, %04d, *)
+    :param output_sequence: output sequence string, formatted with (####, %04d, *), padded like the input
+    :param timeout: seconds each frame may take
+    :param progress_callback: called with the number of frames done (frame, frames, step) as frames finish
+    :return: process_info for the whole sequence, with any failed frames listed under 'failed'
+    """
+    sequence = await _in_thread(find_sequence, input_sequence)
+    fileout = _num_sequence(output_sequence, sequence.padding if sequence else 4)
+    if not sequence or not fileout:
+        logging.error('Can not make proxies of %s as %s' % (input_sequence, output_sequence))
+        return None
+    res = 'x%s' % height if do_height else width
+    frames = convert.proxy_frames(sequence, fileout, ext=ext, start_frame=start_frame, end_frame=end_frame)
+    out_dir = os.path.dirname(fileout)
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    manifest = Manifest(out_dir)
+    params = {'res': res}
+    if incremental:
+        todo = [f for f in frames if not manifest.is_current(f[1], [f[0]], params, content_hash=content_hash)]
+        skipped = len(frames) - len(todo)
+        frames = todo
+    else:
+        skipped = 0
+    done = []
+
+    async def resize(frame):
+        file_in, file_out = frame
+        process_info = await run_command(convert.resize_command(file_in, file_out, res), 'resize',
+                                         outputs=[file_out], timeout=timeout, limit=limit, command_name=command_name)
+        done.append(frame)
+        if progress_callback:
+            progress_callback({'step': 'resize', 'frame': len(done), 'frames': len(frames)})
+        return process_info
+
+    timer = StepTimer('resize', outputs=[f[1] for f in frames], frames=len(frames))
+    with timer:
+        results = await asyncio.gather(*[resize(frame) for frame in frames], return_exceptions=True)
+    failed = []
+    for (file_in, file_out), result in zip(frames, results):
+        if isinstance(result, BaseException):
+            failed.append({'file_in': file_in, 'file_out': file_out, 'error': repr(result)})
+        elif result['returncode'] != 0 or not os.path.exists(file_out):
+            failed.append({'file_in': file_in, 'file_out': file_out, 'error': result['stderr'] or 'output not written'})
+        elif incremental:
+            manifest.record(file_out, [file_in], params, content_hash=content_hash)
+    if incremental:
+        manifest.save()
+    if failed:
+        logging.error('%s of %s frames failed to process' % (len(failed), len(frames)))
+    process_info = {'command_name': command_name, 'file_out': fileout, 'frames': len(frames), 'skipped': skipped,
+                    'failed': failed}
+    add_metrics(process_info, timer.metrics)
+    return _record(process_info)
+
+
+async def gather(*conversions):
+    """
+    awaits several conversions at once.  A conversion that fails or times out doesn't stop the others, its exception
+    is returned in its place.  Cancelling the gather cancels, and kills, everything still running.
+    :return: list of process_info (or exceptions) in the order the conversions were given
+    """
+    return await asyncio.gather(*conversions, return_exceptions=True)
+
+
+def run(*conversions):
+    """
+    runs conversions to completion from synchronous code:
+
+        aio.run(aio.convert_to_mp4('a.mov'), aio.convert_to_mp4('b.mov'))
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(gather(*conversions))
+    finally:
+        loop.close()
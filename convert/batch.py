@@ -0,0 +1,230 @@
+"""
+Runs many conversions in one interpreter.
+
+Inputs come from a glob, a folder, or a json/csv manifest of jobs, and run on a pool of worker threads.  Finished jobs
+are appended to a state file as they complete, so an interrupted batch picks up where it stopped when it's run again
+with resume.
+
+    python convert.py --batch "/delivery/*.mov" -t mp4,thumb -o /delivery/converted --jobs 8
+    python convert.py --batch jobs.csv --jobs 8 --resume
+
+Manifests are a json list of job dicts (see convert.run_job), or a csv with input_file, output_file, file_type and
+conversion_type columns; any other column is passed to convert_file as an option.  Without an output folder, outputs
+of globbed inputs go to a 'converted' folder next to each input, so an mp4 made from an mp4 never replaces it.
+"""
+import csv
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from convert import convert
+from convert.jobs import OUTPUT_FOLDER, jobs_for, source_key
+from convert.scheduler import get_scheduler
+
+STATE_NAME = '.cgl_convert_batch.state'
+JOB_FIELDS = ('input_file', 'output_file', 'file_type', 'conversion_type')
+
+
+def _option(value):
+    # csv values are strings, '2' should reach convert_file as 2 and 'true' as True.
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def read_manifest(path):
+    """
+    :param path: .json file with a list of job dicts, or .csv file with a row per job
+    :return: list of job dicts
+    """
+    if path.lower().endswith('.csv'):
+        jobs = []
+        with open(path) as f:
+            for row in csv.DictReader(f):
+                job = dict([(k, row.get(k) or None) for k in JOB_FIELDS])
+                job['options'] = dict([(k, _option(v)) for k, v in row.items()
+                                       if k not in JOB_FIELDS and k and v not in (None, '')])
+                jobs.append(job)
+        return jobs
+    with open(path) as f:
+        jobs = json.load(f)
+    if isinstance(jobs, dict):
+        jobs = jobs.get('jobs', [])
+    return jobs
+
+
+def find_jobs(source, conversion_type='web_preview', output_dir=None, options=None):
+    """
+    turns a batch source into jobs.
+    :param source: glob, folder, or json/csv manifest
+    :param conversion_type: conversion(s) to run on each movie and sequence a glob or folder turns up, comma separated
+    :param output_dir: folder outputs of globbed inputs are written to, defaults to OUTPUT_FOLDER next to each input
+    :param options: convert_file keyword arguments every job starts with, manifest options override them
+    :return: list of job dicts
+    """
+    options = options or {}
+    if os.path.isfile(source) and os.path.splitext(source)[-1].lower() in ('.json', '.csv'):
+        jobs = read_manifest(source)
+        for job in jobs:
+            job['conversion_type'] = job.get('conversion_type') or conversion_type
+            job['options'] = dict(options, **(job.get('options') or {}))
+        return jobs
+    if os.path.isdir(source):
+        paths = [os.path.join(source, f) for f in sorted(os.listdir(source)) if not f.startswith('.')]
+    else:
+        paths = sorted(glob.glob(source))
+    types = [c.strip() for c in conversion_type.split(',') if c.strip()]
+    jobs = []
+    seen = set()
+    for path in paths:
+        if not os.path.isfile(path):
+            continue
+        key, file_type, input_file = source_key(path)
+        if key in seen or file_type not in ('movie', 'sequence'):
+            continue
+        seen.add(key)
+        rule = {'output': output_dir or os.path.join(os.path.dirname(input_file), OUTPUT_FOLDER), 'movie': types,
+                'sequence': types}
+        for job in jobs_for(input_file, file_type, rule):
+            job['options'] = dict(options, **(job.get('options') or {}))
+            jobs.append(job)
+    return jobs
+
+
+def job_key(job):
+    return json.dumps([job.get(k) for k in JOB_FIELDS], sort_keys=True)
+
+
+class BatchState(object):
+    """
+    append only record of finished jobs, one json line per job.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def done(self):
+        """
+        :return: keys of jobs that finished successfully
+        """
+        done = set()
+        if not os.path.exists(self.path):
+            return done
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    # the line being written when the batch was killed.
+                    continue
+                if result.get('status') == 'done':
+                    done.add(result['key'])
+        return done
+
+    def reset(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def record(self, result):
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write('%s\n' % json.dumps(result))
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def _run(job):
+    start = time.time()
+    result = {'key': job_key(job), 'input_file': job['input_file'], 'conversion_type': job.get('conversion_type')}
+    try:
+        process_info = convert.run_job(job)
+    except Exception as e:
+        logging.exception('%s failed' % job['input_file'])
+        result.update({'status': 'failed', 'error': str(e), 'file_out': None})
+    else:
+        error = convert.job_error(process_info)
+        result.update({'status': 'failed' if error else 'done', 'error': error,
+                       'file_out': process_info.get('file_out') if isinstance(process_info, dict) else process_info})
+    result['time'] = time.time() - start
+    return result
+
+
+def run_batch(jobs, workers=1, state_file=None, resume=False, callback=None):
+    """
+    runs jobs on a pool of threads.
+    :param jobs: list of job dicts
+    :param workers: number of jobs run at the same time
+    :param state_file: where finished jobs are recorded, None to not keep state
+    :param resume: skip jobs the state file says already finished, otherwise the state file starts over
+    :param callback: called with each job's result as it finishes
+    :return: list of results (key, input_file, conversion_type, status, error, file_out, time), in the order the jobs
+    were given.  Jobs skipped on resume have the status 'skipped'.
+    """
+    # the commands of every job share the machine, each gets its part of the cores.
+    get_scheduler().concurrency = max(1, workers)
+    state = BatchState(state_file) if state_file else None
+    done = set()
+    if state:
+        if resume:
+            done = state.done()
+        else:
+            state.reset()
+    todo = [job for job in jobs if job_key(job) not in done]
+    results = {}
+
+    def run(job):
+        result = _run(job)
+        if state:
+            state.record(result)
+        if callback:
+            callback(result)
+        return result
+
+    pool = ThreadPool(max(1, min(workers, len(todo) or 1)))
+    try:
+        for result in pool.imap_unordered(run, todo):
+            results[result['key']] = result
+    finally:
+        pool.close()
+        pool.join()
+    ordered = []
+    for job in jobs:
+        key = job_key(job)
+        ordered.append(results.get(key) or {'key': key, 'input_file': job['input_file'],
+                                            'conversion_type': job.get('conversion_type'), 'status': 'skipped',
+                                            'error': None, 'file_out': None, 'time': 0})
+    return ordered
+
+
+def summary(results, wall_time=None):
+    """
+    :return: text summary of a batch, a line per job and the totals
+    """
+    lines = []
+    for result in results:
+        lines.append('%-7s %8.2fs  %s (%s) -> %s%s' % (result['status'], result['time'], result['input_file'],
+                                                       result['conversion_type'], result['file_out'] or '-',
+                                                       '  %s' % result['error'] if result['error'] else ''))
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    totals = ', '.join(['%s %s' % (counts[k], k) for k in sorted(counts)])
+    if wall_time is not None:
+        totals = '%s in %.2fs' % (totals, wall_time)
+    lines.append('%s jobs: %s' % (len(results), totals))
+    return '\n'.join(lines)
+
+
+def default_state_file(source, output_dir=None):
+    if os.path.isfile(source):
+        return '%s.state' % source
+    return os.path.join(output_dir or (source if os.path.isdir(source) else os.getcwd()), STATE_NAME)
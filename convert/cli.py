@@ -0,0 +1,97 @@
+"""
+Command line for the conversions in convert.py.
+
+Kept out of convert.py so importing the conversions (farm tasks, the daemon, library users) doesn't import click.
+convert.py's main hands its arguments to this, farm jobs still run "python convert.py -i ... -t ...".
+"""
+import os
+import sys
+import time
+
+import click
+
+if __name__ == '__main__' and not __package__:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from convert.convert import HLS_SEGMENT_TIME, HLS_SEGMENT_TYPES, convert_file, media_info
+from convert.sequence_index import get_index
+
+
+@click.command()
+@click.option('--input_file', '-i', default=None,
+              help='Path to the Input File.  Can be Image, Image Sequence, Movie')
+@click.option('--output_file', '-o', default=None,
+              help='Path to the output file/folder/sequence, with --batch the folder outputs are written to')
+@click.option('--width', '-w', default=1920, help='width in pixels')
+@click.option('--height', '-h', default=1080, help='height in pixels')
+@click.option('--file_type', '-ft', default='movie', help='options: sequence, image, movie')
+@click.option('--conversion_type', '-t', default='web_preview',
+              help='Type of Conversions: proxy, mp4, web_preview, prores, thumb, contact_sheet, gif, audio, wav, hls, '
+                   'index, probe.  '
+                   'Movie conversions can be combined with commas (mp4,audio,thumb) to decode the input once.')
+@click.option('--quality', '-q', default=0, help='0:proxy, 1:low, 2:standard, 3:high')
+@click.option('--workers', '-wk', default=1, help='number of frames to process at the same time')
+@click.option('--batch_size', '-bs', default=0, help='frames per magick mogrify call, 0 for one process per frame')
+@click.option('--incremental', is_flag=True, default=False, help='only convert inputs that changed since the last run')
+@click.option('--segments', '-sg', default=0, help='number of segments to encode web previews in at the same time')
+@click.option('--segment_size', '-sz', default=0, help='frames per web preview segment, overrides --segments')
+@click.option('--start_frame', '-sf', default=None, type=int, help='first frame of the sequence to process')
+@click.option('--end_frame', '-ef', default=None, type=int, help='last frame of the sequence to process')
+@click.option('--chunks', '-ch', default=0, help='number of farm tasks to split proxy sequences into')
+@click.option('--chunk_size', '-cs', default=0, help='frames per farm task for proxy sequences, overrides --chunks')
+@click.option('--stream', is_flag=True, default=False,
+              help='pipe decoded frames of any image format straight into the web preview encode')
+@click.option('--rungs', '-r', default=None, help='comma separated hls ladder rungs (720p,360p), defaults to all')
+@click.option('--segment_type', default='mpegts', type=click.Choice(HLS_SEGMENT_TYPES),
+              help='hls segments, mpegts for .ts or fmp4 for fragmented mp4')
+@click.option('--segment_time', default=HLS_SEGMENT_TIME, help='seconds per hls segment')
+@click.option('--thumbs', '-n', default=20, help='number of thumbnails in a contact sheet')
+@click.option('--engine', '-en', default='magick', type=click.Choice(['magick', 'pillow']),
+              help='resize proxy frames with a magick process per frame or in process with pillow')
+@click.option('--batch', '-b', default=None,
+              help='convert many inputs: a glob ("/delivery/*.mov"), a folder, or a json/csv manifest of jobs')
+@click.option('--jobs', '-j', default=1, help='with --batch, number of inputs converted at the same time')
+@click.option('--resume', is_flag=True, default=False,
+              help='with --batch, skip jobs that finished in an earlier run of the same batch')
+@click.option('--state', default=None, help='with --batch, file finished jobs are recorded in')
+def main(input_file, output_file, height, width, file_type, conversion_type, quality=0, workers=1, batch_size=0,
+         incremental=False, segments=0, segment_size=0, start_frame=None, end_frame=None, chunks=0, chunk_size=0,
+         stream=False, engine='magick', rungs=None, thumbs=20, segment_type='mpegts', segment_time=HLS_SEGMENT_TIME,
+         batch=None, jobs=1, resume=False, state=None):
+    options = dict(width=width, height=height, quality=quality, workers=workers, batch_size=batch_size,
+                   incremental=incremental, segments=segments, segment_size=segment_size, start_frame=start_frame,
+                   end_frame=end_frame, chunks=chunks, chunk_size=chunk_size, stream=stream, engine=engine,
+                   rungs=rungs.split(',') if rungs else None, thumbs=thumbs, segment_type=segment_type,
+                   segment_time=segment_time)
+    if batch:
+        from convert import batch as batch_
+        start = time.time()
+        batch_jobs = batch_.find_jobs(batch, conversion_type=conversion_type, output_dir=output_file,
+                                      options=options)
+        results = batch_.run_batch(batch_jobs, workers=jobs, resume=resume,
+                                   state_file=state or batch_.default_state_file(batch, output_file))
+        click.echo(batch_.summary(results, wall_time=time.time() - start))
+        if [r for r in results if r['status'] == 'failed']:
+            sys.exit(1)
+        return
+    if not input_file:
+        raise click.UsageError('--input_file or --batch is required')
+    run_dict = {}
+    if conversion_type == 'index':
+        directory = input_file if os.path.isdir(input_file) else os.path.dirname(input_file)
+        for sequence in get_index(directory).sequences:
+            run_dict[sequence.hash_sequence] = '%s-%s, %s frames, %s missing' % (sequence.start_frame,
+                                                                                 sequence.end_frame,
+                                                                                 len(sequence.frames),
+                                                                                 len(sequence.gaps))
+    elif conversion_type == 'probe':
+        run_dict = media_info(input_file) or {}
+    else:
+        convert_file(input_file, output_file, file_type=file_type, conversion_type=conversion_type, **options)
+    if run_dict.keys():
+        for key in run_dict:
+            click.echo('%s: %s' % (key, run_dict[key]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Studio config for the conversions, loaded the first time a value is needed.
+
+Importing convert.convert used to call app_config() straight away, so every farm task and library user paid for the
+config load (and its cgl imports) even when it never read a value, and values couldn't change without a re-import.
+CONFIG loads once, on first use, and is shared by everything in the process; reload() picks up changes.
+
+    from convert.config import CONFIG
+    ffmpeg = CONFIG.paths['ffmpeg']
+    CONFIG.reload()
+"""
+import threading
+
+
+def _app_config():
+    from cgl.core.config import app_config
+    return app_config()
+
+
+class Config(object):
+    """
+    lazily loaded, cached app_config().  Reads like the config dict (CONFIG['paths']), with properties for the values
+    the conversions use.
+    """
+
+    def __init__(self, loader=None):
+        """
+        :param loader: function returning the config dict, defaults to cgl's app_config
+        """
+        self.loader = loader or _app_config
+        self._data = None
+        self._lock = threading.Lock()
+
+    @property
+    def data(self):
+        if self._data is None:
+            with self._lock:
+                if self._data is None:
+                    self._data = self.loader()
+        return self._data
+
+    @property
+    def loaded(self):
+        return self._data is not None
+
+    def reload(self):
+        """
+        loads the config again, values read from CONFIG after this see the changes.
+        :return: the config dict
+        """
+        with self._lock:
+            self._data = self.loader()
+        return self._data
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    @property
+    def paths(self):
+        return self.data['paths']
+
+    @property
+    def settings(self):
+        return self.data['default']
+
+    @property
+    def padding(self):
+        return self.settings['padding']
+
+    @property
+    def thumb_res(self):
+        return self.settings['resolution']['thumb']
+
+    @property
+    def frame_rate(self):
+        return self.settings['frame_rate']
+
+    @property
+    def ext_map(self):
+        return self.data['ext_map']
+
+    @property
+    def proj_management(self):
+        return self.data['account_info']['project_management']
+
+
+CONFIG = Config()
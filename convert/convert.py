@@ -1,30 +1,110 @@
 import logging
+import math
 import os
-import re
-import click
-from cgl.core.config import app_config
+import shutil
+import sys
+import time
+from multiprocessing.pool import ThreadPool
+
+if __name__ == '__main__' and not __package__:
+    # run as a script (this is how farm jobs call us), make the convert package importable.
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from cgl.core.utils.general import cgl_execute, write_to_cgl_data
+from convert.config import CONFIG
+from convert.manifest import Manifest
+from convert.metrics import FfmpegProgress, StepTimer, add_metrics
+from convert.probe import probe
+from convert.resize import PillowResizer, available as pillow_available
+from convert.scheduler import FFMPEG_MEMORY, MAGICK_MEMORY, get_scheduler
+from convert.sequence_index import find_sequence
+from convert.stream import PIPE_INPUT_ARGS, stream_frames
+
+# config values that used to be loaded at import, convert.PATHS etc still work and are read from CONFIG on access.
+CONFIG_NAMES = {'PATHS': 'paths',
+                'PADDING': 'padding',
+                'settings': 'settings',
+                'thumb_res': 'thumb_res',
+                'frame_rate': 'frame_rate',
+                'ext_map': 'ext_map',
+                'PROJ_MANAGEMENT': 'proj_management'}
+
+# adaptive bitrate ladder: rung: [bitrate, maxrate, scale].  -2 keeps widths even, which libx264 needs.
+OPTIONS = {'320p': ['180k', '360k', '-2:320'],
+           '360p': ['300k', '600k', '-2:360'],
+           '480p': ['500k', '1000k', '-2:480'],
+           '576p': ['850k', '1700k', '-2:576'],
+           '720p': ['1000k', '2000k', '-2:720'],
+           '1080p': ['1000k', '2000k', '-2:1080']}
+HLS_SEGMENT_TIME = 6
+HLS_SEGMENT_TYPES = ('mpegts', 'fmp4')
+HLS_MASTER = 'master.m3u8'
+
+PRORES_QUALITY = {0: 'proxy', 1: 'low', 2: 'standard', 3: 'high'}
+MP4_VCODEC = '-vcodec libx264 -pix_fmt yuv420p -vf "scale=trunc((a*oh)/2)*2:720" -g 30 -b:v 2000k -vprofile high -bf 0'
+MP4_ACODEC = "-strict experimental -acodec aac -ab 160k -ac 2"
+# inputs already within these limits don't need to be encoded to make an mp4 matching MP4_VCODEC/MP4_ACODEC.
+MP4_MAX_HEIGHT = 720
+MP4_MAX_CHANNELS = 2
+# how far into a movie, as a fraction of its duration, thumbnails are taken from.  Skips slates and black leaders.
+THUMB_POSITION = 0.1
+# keyframes sampled by fast thumbnails, the most representative one is kept.
+THUMB_CANDIDATES = 5
+CONTACT_SHEET_COLUMNS = 10
+
+
+def __getattr__(name):
+    # python 3.7+ calls this for module attributes that don't exist (PEP 562).
+    if name in CONFIG_NAMES:
+        return getattr(CONFIG, CONFIG_NAMES[name])
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+
+if sys.version_info < (3, 7):
+    # no module __getattr__, the old names are loaded up front.
+    for _name, _attr in CONFIG_NAMES.items():
+        globals()[_name] = getattr(CONFIG, _attr)
+
+
+def ffprobe_path():
+    """
+    :return: the ffprobe executable, from the paths config or next to ffmpeg
+    """
+    if CONFIG.paths.get('ffprobe'):
+        return CONFIG.paths['ffprobe']
+    directory, name = os.path.split(CONFIG.paths['ffmpeg'])
+    return os.path.join(directory, name.replace('ffmpeg', 'ffprobe'))
+
+
+def media_info(filein):
+    """
+    returns probe metadata (duration, frame_rate, width, height, codecs, audio layout, start_timecode) for a media
+    file, cached between calls.
+    :param filein: media file
+    :return: dict, None if the file couldn't be probed
+    """
+    return probe(filein, ffprobe=ffprobe_path())
 
-CONFIG = app_config()
-PATHS = CONFIG['paths']
-PADDING = CONFIG['default']['padding']
-settings = CONFIG['default']
-thumb_res = settings['resolution']['thumb']
-frame_rate = settings['frame_rate']
-ext_map = CONFIG['ext_map']
-PROJ_MANAGEMENT = CONFIG['account_info']['project_management']
 
-OPTIONS = {'320p': ['180k', '360k', '-1:320'],
-           '360p': ['300k', '600k', '-1:360'],
-           '480p': ['500k', '1000k', '-1:480'],
-           '576p': ['850k', '1700k', '-1:576'],
-           '720p': ['1000k', '2000k', '-1:720'],
-           '1080p': ['1000k', '2000k', '-1:1080']}
+def get_file_type(filein):
+    """
+    returns the file type of filein from ext_map, probing files with extensions ext_map doesn't know about.
+    :param filein: media file
+    :return: 'movie', 'image', etc, None if the file type couldn't be determined
+    """
+    ext = os.path.splitext(filein)[-1]
+    if ext in CONFIG.ext_map:
+        return CONFIG.ext_map[ext]
+    info = media_info(filein)
+    if info and info['has_video'] and info['duration']:
+        return 'movie'
 
 
 def create_proxy_sequence(input_sequence, output_sequence, width='1920', height='1080', do_height=False,
                           processing_method='local', dependent_job=None, copy_input_padding=True,
-                          command_name='create_proxy_sequence()', new_window=False, ext=None):
+                          command_name='create_proxy_sequence()', new_window=False, ext=None, workers=1,
+                          batch_size=0, incremental=False, content_hash=False, start_frame=None, end_frame=None,
+                          chunks=0, chunk_size=0, progress_callback=None, engine='magick'):
     """
     Create a proxy jpeg sequence in sRGB color space from the given input sequence.
     :param input_sequence: input sequence string, formatted with (#, %04d, *)
@@ -39,7 +119,20 @@ def create_proxy_sequence(input_sequence, output_sequence, width='1920', height=
     :param command_name: this is the command name that will be sent to the render farm
     :param new_window: Puts the processing of the job into a new shell
     :param ext: if none i'll use what's in the output.
-    :return:
+    :param workers: number of frames processed at the same time when processing locally.
+    :param batch_size: if > 0, frames are handed to magick mogrify in batches of this size instead of one process per
+    frame.  Only used when the output frames keep the input file names.
+    :param incremental: only process frames that are new or changed since they were last converted.
+    :param content_hash: with incremental, compare file contents of frames whose size/mtime changed.
+    :param start_frame: first frame to process, defaults to the first frame of the sequence
+    :param end_frame: last frame to process, defaults to the last frame of the sequence
+    :param chunks: with smedge, split the frame range into this many farm tasks
+    :param chunk_size: with smedge, split the frame range into farm tasks of this many frames, overrides chunks
+    :param progress_callback: called with a dict of progress (step, frame: frames done so far, frames: frames to do)
+    as the local pool works through them
+    :param engine: 'magick' runs a magick process per frame (or batch), 'pillow' resizes frames inside this process
+    and hands the frames Pillow can't read to magick.
+    :return: process_info for the whole sequence, with any failed frames listed under 'failed'
     """
     from cgl.core.path import Sequence, PathObject
     if ' ' in input_sequence:
@@ -52,8 +145,8 @@ def create_proxy_sequence(input_sequence, output_sequence, width='1920', height=
     if copy_input_padding:
         padding = input_.padding
     else:
-        padding = PADDING
-    output_sequence = output_sequence.replace('/', '\\')
+        padding = CONFIG.padding
+    output_sequence = os.path.normpath(output_sequence)
     output_ = Sequence(output_sequence, padding=padding)
 
     if not output_.is_valid_sequence():
@@ -75,31 +168,62 @@ def create_proxy_sequence(input_sequence, output_sequence, width='1920', height=
         res = 'x%s' % height
     else:
         res = width
-    start_frame = input_.start_frame
+    sequence = find_sequence(filein)
 
     if processing_method == 'smedge':
+        if not sequence:
+            logging.error('No frames found on disk for %s, nothing submitted' % filein)
+            return
         pyfile = '%s.py' % os.path.splitext(__file__)[0]
         command = r'python %s -i %s -o %s -w %s -h %s -ft sequence -t proxy' % (pyfile, filein, fileout,
                                                                                         width, height)
-        # probably good to write a custom imagemagick command for smedge for this.
-        process_info = cgl_execute(command, command_name=command_name, methodology='smedge', WaitForJobID=dependent_job)
+        if engine != 'magick':
+            command = '%s --engine %s' % (command, engine)
+        first = sequence.start_frame if start_frame is None else start_frame
+        last = sequence.end_frame if end_frame is None else end_frame
+        if chunks or chunk_size:
+            # every chunk records what it made, so the assemble task only redoes frames a chunk didn't deliver.
+            command = '%s --incremental' % command
+            commands = ['%s -sf %s -ef %s' % (command, a, b) for a, b in frame_chunks(first, last, chunks=chunks,
+                                                                                       chunk_size=chunk_size)]
+            process_info = submit_chunks(commands, '%s -sf %s -ef %s' % (command, first, last),
+                                         dependent_job=dependent_job, command_name=command_name)
+        else:
+            if start_frame is not None or end_frame is not None:
+                command = '%s -sf %s -ef %s' % (command, first, last)
+            if incremental:
+                command = '%s --incremental' % command
+            # probably good to write a custom imagemagick command for smedge for this.
+            process_info = cgl_execute(command, command_name=command_name, methodology='smedge',
+                                       WaitForJobID=dependent_job)
     elif processing_method == 'local':
-        dirname, filename = os.path.split(filein)
-        match = filename.split('*')[0]
-        for each in os.listdir(os.path.dirname(filein)):
-            if match in each:
-                file_ = os.path.join(os.path.dirname(filein), each)
-                SEQ_SPLIT = "\d{3,}\.\w{2,4}$"
-                frange = re.search(SEQ_SPLIT, each)
-                if frange:
-                    num = os.path.splitext(frange.group(0))[0]
-                    filename, ext_ = fileout.split('%')
-                    if not ext:
-                        ext = os.path.splitext(ext_)[-1].replace('.', '')
-                    file_out = '%s%s.%s' % (filename, num, ext)
-                    command = '%s %s -resize %s %s' % (PATHS['magick'], file_, res, file_out)
-                    process_info = cgl_execute(command, methodology='local', command_name=command_name, verbose=True,
-                                               new_window=new_window)
+        frames = []
+        if not sequence:
+            logging.error('No frames found on disk for %s' % filein)
+        else:
+            frames = proxy_frames(sequence, fileout, ext=ext, start_frame=start_frame, end_frame=end_frame)
+        manifest = None
+        skipped = 0
+        if incremental:
+            manifest = Manifest(out_dir)
+            params = {'res': res}
+            todo = [f for f in frames if not manifest.is_current(f[1], [f[0]], params, content_hash=content_hash)]
+            skipped = len(frames) - len(todo)
+            frames = todo
+            logging.info('%s frames up to date, %s to process' % (skipped, len(frames)))
+            if not frames:
+                return {'command_name': command_name, 'file_out': fileout, 'frames': 0, 'skipped': skipped,
+                        'failed': []}
+        process_info = process_frames(frames, res, workers=workers, batch_size=batch_size,
+                                      command_name=command_name, new_window=new_window,
+                                      progress_callback=progress_callback, engine=engine)
+        if manifest and not new_window:
+            failed = set([f['file_out'] for f in process_info['failed']])
+            for file_in, file_out in frames:
+                if file_out not in failed:
+                    manifest.record(file_out, [file_in], params, content_hash=content_hash)
+            manifest.save()
+            process_info['skipped'] = skipped
 
     if process_info:
         process_info['file_out'] = fileout
@@ -116,34 +240,215 @@ def create_proxy_sequence(input_sequence, output_sequence, width='1920', height=
         print('process_info not defined')
 
 
+def proxy_frames(sequence, fileout, ext=None, start_frame=None, end_frame=None):
+    """
+    pairs the frames of a sequence on disk with the proxy frames made from them.
+    :param sequence: SequenceInfo of the input frames
+    :param fileout: output sequence, formatted with %04d
+    :param ext: extension of the output frames, if None the one in fileout is used
+    :param start_frame: first frame, defaults to the first frame of the sequence
+    :param end_frame: last frame, defaults to the last frame of the sequence
+    :return: list of (file_in, file_out) tuples
+    """
+    filename, ext_ = fileout.split('%')
+    if not ext:
+        ext = os.path.splitext(ext_)[-1].replace('.', '')
+    frames = []
+    for frame in sequence.frames:
+        if start_frame is not None and frame < start_frame:
+            continue
+        if end_frame is not None and frame > end_frame:
+            continue
+        frames.append((sequence.frame_path(frame), '%s%s.%s' % (filename, sequence.frame_string(frame), ext)))
+    return frames
+
+
+def resize_command(file_in, file_out, res):
+    return '%s %s -resize %s %s' % (CONFIG.paths['magick'], file_in, res, file_out)
+
+
+def process_frames(frames, res, workers=1, batch_size=0, command_name='process_frames()', new_window=False,
+                   progress_callback=None, engine='magick'):
+    """
+    Resizes a list of frames with magick, spreading the work across a pool of workers.
+    :param frames: list of (file_in, file_out) tuples
+    :param res: magick resize geometry (width, or x{height})
+    :param workers: number of magick processes (or pillow threads) running at the same time
+    :param batch_size: if > 0, hand batches of frames to a single magick mogrify call where possible.
+    :param command_name: command name passed on to cgl_execute
+    :param new_window: Puts the processing of each job into a new shell
+    :param progress_callback: called with a dict of progress (step, frame: frames done so far, frames: frames to do)
+    after each magick call
+    :param engine: 'magick' or 'pillow'.  pillow resizes in process and falls back to magick frame by frame for
+    anything it can't read, it is ignored when Pillow isn't installed.
+    :return: aggregated process_info for all frames, None if there were no frames to process.  The 'resize' step in
+    its metrics times the whole pool, process_time is the sum of the time spent in each magick call.
+    """
+    if not frames:
+        return None
+    if engine == 'pillow' and not pillow_available():
+        logging.warning('Pillow is not installed, resizing with magick')
+        engine = 'magick'
+    if engine == 'pillow':
+        resizer = PillowResizer(res)
+        size = batch_size or 1
+        jobs = [frames[i:i + size] for i in range(0, len(frames), size)]
+
+        def runner(job, res_, command_name='process_frames()', new_window=False, share=1):
+            return _pillow_frames(job, res_, resizer, command_name=command_name, new_window=new_window, share=share)
+    elif batch_size and _mogrify_compatible(frames):
+        jobs = [frames[i:i + batch_size] for i in range(0, len(frames), batch_size)]
+        runner = _mogrify_frames
+    else:
+        if batch_size:
+            logging.info('Output names differ from input names, resizing one frame per process')
+        jobs = [[frame] for frame in frames]
+        runner = _resize_frames
+
+    done = []
+
+    def run(job):
+        start = time.time()
+        result = runner(job, res, command_name=command_name, new_window=new_window, share=workers)
+        done.append((len(job), time.time() - start))
+        if progress_callback:
+            progress_callback({'step': 'resize', 'frame': sum([d[0] for d in done]), 'frames': len(frames)})
+        return result
+
+    timer = StepTimer('resize', outputs=[f[1] for f in frames], frames=len(frames))
+    with timer:
+        if workers > 1 and len(jobs) > 1:
+            pool = ThreadPool(min(workers, len(jobs)))
+            try:
+                results = pool.map(run, jobs)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [run(job) for job in jobs]
+    timer.metrics['process_time'] = sum([d[1] for d in done])
+
+    process_info = {}
+    failed = []
+    for info, failures in results:
+        if info:
+            process_info = info
+        failed.extend(failures)
+    process_info = dict(process_info)
+    process_info['command_name'] = command_name
+    process_info['frames'] = len(frames)
+    process_info['processes'] = len(jobs)
+    process_info['engine'] = engine
+    process_info['failed'] = failed
+    process_info.pop('metrics', None)
+    add_metrics(process_info, timer.metrics)
+    if failed:
+        logging.error('%s of %s frames failed to process' % (len(failed), len(frames)))
+    return process_info
+
+
+def _mogrify_compatible(frames):
+    """
+    mogrify writes files with the same name as its inputs, so it can only be used when the output frames keep the
+    input names and share a single output directory.
+    """
+    out_dir = os.path.dirname(frames[0][1])
+    for file_in, file_out in frames:
+        if os.path.dirname(file_out) != out_dir:
+            return False
+        if os.path.splitext(os.path.basename(file_in))[0] != os.path.splitext(os.path.basename(file_out))[0]:
+            return False
+    return True
+
+
+def _resize_frames(frames, res, command_name='process_frames()', new_window=False, share=1):
+    file_in, file_out = frames[0]
+    command = resize_command(file_in, file_out, res)
+    return _execute_frames(command, frames, command_name, new_window, share=share)
+
+
+def _mogrify_frames(frames, res, command_name='process_frames()', new_window=False, share=1):
+    out_dir = os.path.dirname(frames[0][1])
+    ext = os.path.splitext(frames[0][1])[-1].replace('.', '')
+    command = '%s mogrify -path %s -format %s -resize %s %s' % (CONFIG.paths['magick'], out_dir, ext, res,
+                                                                ' '.join([f[0] for f in frames]))
+    return _execute_frames(command, frames, command_name, new_window, share=share)
+
+
+def _pillow_frames(frames, res, resizer, command_name='process_frames()', new_window=False, share=1):
+    process_info = None
+    failures = []
+    for file_in, file_out in frames:
+        if resizer.resize(file_in, file_out):
+            continue
+        info, failed = _resize_frames([(file_in, file_out)], res, command_name=command_name, new_window=new_window,
+                                      share=share)
+        process_info = info or process_info
+        failures.extend(failed)
+    return process_info, failures
+
+
+def _execute_frames(command, frames, command_name, new_window, share=1):
+    """
+    runs a single magick command and reports which of its frames did not make it to disk.  Outputs left by an
+    earlier run are removed first, so they can't pass for frames this command failed to write.
+    :param share: number of magick commands running at the same time, sets the command's share of the machine
+    :return: (process_info, failures)
+    """
+    for file_in, file_out in frames:
+        if os.path.exists(file_out):
+            os.remove(file_out)
+    try:
+        if new_window:
+            process_info = cgl_execute(command, methodology='local', command_name=command_name, verbose=True,
+                                       new_window=new_window)
+        else:
+            with get_scheduler().reserve(share=share, memory=MAGICK_MEMORY) as slot:
+                process_info = cgl_execute(slot.wrap(command, magick=CONFIG.paths['magick']), methodology='local',
+                                           command_name=command_name, verbose=True, new_window=new_window)
+    except Exception as e:
+        return None, [{'file_in': file_in, 'file_out': file_out, 'error': str(e)} for file_in, file_out in frames]
+    failures = []
+    if new_window:
+        # the shell returns before magick is done, there's nothing to check yet.
+        return process_info, failures
+    returncode = (process_info or {}).get('returncode')
+    for file_in, file_out in frames:
+        if returncode:
+            failures.append({'file_in': file_in, 'file_out': file_out, 'error': 'exited with %s' % returncode})
+        elif not os.path.exists(file_out):
+            failures.append({'file_in': file_in, 'file_out': file_out, 'error': 'output not written'})
+    return process_info, failures
+
+
 def create_prores_mov(input_file, output_file=None, processing_method='local', dependent_job=None, quality=0,
-                      new_window=False, command_name="create_prores_mov()"):
+                      new_window=False, command_name="create_prores_mov()", progress_callback=None):
     """
     create a prores mov from specified input sequence, and save it to output.
     :param input_file: input sequence string, formatted with (#, %04d, *)
     :param output: output string
-    :return:
+    :return: process_info, with the mov as 'file_out' and, for local conversions, the encode's metrics
     """
-    if quality == 0:
-        description = 'proxy'
-    elif quality == 1:
-        description = 'low'
-    elif quality == 2:
-        description = 'standard'
-    elif quality == 3:
-        description = 'high'
+    description = PRORES_QUALITY[quality]
     if not command_name:
         command_name = "create_prores_mov(%s)" % description
     file_, ext = os.path.splitext(input_file)
-    file_type = ext_map[ext]
+    file_type = get_file_type(input_file)
     if not output_file:
         output_file = '%s_prores_%s.mov' % (file_, description)
     if file_type == 'movie':
         if processing_method == 'local':
-            command = '%s -i %s -c:v prores_ks -qscale:v 1 -profile:v %s -c:a copy %s' % (PATHS['ffmpeg'], input_file, quality, output_file)
-            cgl_execute(command, command_name='Create Prores', methodology=processing_method, WaitForJobID=dependent_job,
-                        new_window=new_window)
-            return output_file
+            command = prores_command(input_file, output_file, quality)
+            process_info = execute_instrumented(command, 'prores', outputs=[output_file],
+                                                progress_callback=progress_callback, command_name='Create Prores',
+                                                methodology=processing_method, WaitForJobID=dependent_job,
+                                                new_window=new_window)
+            process_info['file_out'] = output_file
+            try:
+                write_to_cgl_data(process_info)
+            except ValueError:
+                print('Skipping creation of cgl_data for %s' % output_file)
+            return process_info
         elif processing_method == 'smedge':
             filename = "%s.py" % os.path.splitext(__file__)[0]
             command = r'python %s -i %s -o %s -t prores -ft movie -q %s' % (filename, input_file, output_file, quality)
@@ -155,6 +460,11 @@ def create_prores_mov(input_file, output_file=None, processing_method='local', d
         print('File type: %s not supported with create_prores_mov()' % file_type)
 
 
+def prores_command(input_file, output_file, quality=0):
+    return '%s -i %s -c:v prores_ks -qscale:v 1 -profile:v %s -c:a copy %s' % (CONFIG.paths['ffmpeg'], input_file,
+                                                                              quality, output_file)
+
+
 def create_title(file_path='sample_image.png', title_text="Sample Title Text", size='1920x1080',
                  bg='transparent',
                  font_color='ffffff',
@@ -163,11 +473,16 @@ def create_title(file_path='sample_image.png', title_text="Sample Title Text", s
                  processing_method='local',
                  dependent_job=None):
     command = '%s convert -background %s -fill #%s -size %s -gravity center ' \
-              '-font %s -pointsize %s label:"%s" %s' % (PATHS['magick'], bg, font_color,
+              '-font %s -pointsize %s label:"%s" %s' % (CONFIG.paths['magick'], bg, font_color,
                                                         size, font, font_size,
                                                         title_text, file_path)
-    cgl_execute(command, command_name='Create Title', methodology=processing_method, WaitForJobID=dependent_job,
-                new_window=False)
+    if processing_method == 'local':
+        with get_scheduler().reserve(memory=MAGICK_MEMORY) as slot:
+            cgl_execute(slot.wrap(command, magick=CONFIG.paths['magick']), command_name='Create Title',
+                        methodology=processing_method, WaitForJobID=dependent_job, new_window=False)
+    else:
+        cgl_execute(command, command_name='Create Title', methodology=processing_method, WaitForJobID=dependent_job,
+                    new_window=False)
 
 
 def create_quicktime_mov():
@@ -177,29 +492,44 @@ def create_quicktime_mov():
     """
 
 
-def create_web_mov(input_sequence, output, framerate=settings['frame_rate'], output_frame_rate=None,
-                   res=settings['resolution']['video_review'], processing_method='local', dependent_job=None,
-                   command_name='create_web_mov()', new_window=False):
+def create_web_mov(input_sequence, output, framerate=None, output_frame_rate=None, res=None, processing_method='local',
+                   dependent_job=None, command_name='create_web_mov()', new_window=False, incremental=False,
+                   content_hash=False, segments=0, segment_size=0, workers=None, start_frame=None, end_frame=None,
+                   stream=False, progress_callback=None):
     """
     create a web optimized h264 mp4 from an specified input_sequence to a specified output.mp4
     This assumes an sRGB jpg sequence as input
     :param input_sequence: input sequence string, formatted with (#, %04d, *)
     :param output: output mp4 string
-    :param framerate: frame rate for input sequence
+    :param framerate: frame rate for input sequence, defaults to the frame_rate setting
     :param output_frame_rate: if None frame rate for input movie is used, if defined this frame rate is used for output movie
-    :param res: resolution 1920x1080
+    :param res: resolution 1920x1080, defaults to the video_review resolution setting
     :param processing_method: local, smedge, deadline
     :param dependent_job: job_id of dependencies
     :param command_name: this is the command name that will be sent to the render farm
-    :return:
+    :param incremental: skip the encode if output was already made from the same frames with the same settings
+    :param content_hash: with incremental, compare file contents of frames whose size/mtime changed.
+    :param segments: if > 0, split the frame range into this many segments that are encoded at the same time and
+    joined losslessly.
+    :param segment_size: if > 0, split the frame range into segments of this many frames, overrides segments.
+    :param workers: number of segments encoded at the same time locally, defaults to one per segment.
+    :param start_frame: first frame to encode, defaults to the first frame of the sequence
+    :param end_frame: last frame to encode, defaults to the last frame of the sequence
+    :param stream: decode, resize and color convert frames of any format with magick and pipe them straight into
+    ffmpeg, instead of needing a jpg sequence on disk.  workers sets how many frames are decoded at the same time.
+    :param progress_callback: called with ffmpeg's progress (frame, fps, speed, out_time, step) while it encodes
+    :return: process_info, with timing and encode stats for each step under 'metrics'
     """
     from cgl.core.path import Sequence
     if not output:
         logging.error('No Output Defined')
         return
+    framerate = framerate or CONFIG.frame_rate
+    res = res or CONFIG.settings['resolution']['video_review']
     input_ = Sequence(input_sequence)
+    first_frame, last_frame = start_frame, end_frame
     start_frame = None
-    if input_.ext != '.jpg':
+    if input_.ext != '.jpg' and not stream:
         logging.error('%s is not a valid ext for input sequences' % input_.ext)
     if not input_.is_valid_sequence():
         logging.error('%s is not a valid sequence for web quicktimes' % input_sequence)
@@ -208,13 +538,32 @@ def create_web_mov(input_sequence, output, framerate=settings['frame_rate'], out
         start_frame = input_.start_frame
     file_type = 'sequence'
     filein = input_.num_sequence
+    sequence = find_sequence(filein)
+    if sequence:
+        start_frame = sequence.start_frame
+        if first_frame is None:
+            first_frame = sequence.start_frame
+        if last_frame is None:
+            last_frame = sequence.end_frame
+        if sequence.gaps:
+            logging.warning('%s is missing %s frames, ffmpeg will stop at frame %s' % (filein, len(sequence.gaps),
+                                                                                       sequence.gaps[0]))
+    partial = sequence and (first_frame, last_frame) != (sequence.start_frame, sequence.end_frame)
+    inputs = [sequence.frame_path(f) for f in sequence.frames if first_frame <= f <= last_frame] if sequence else []
     fileout = output
-    prep_for_output(fileout)
+    prep_for_output(fileout, cleanup=not incremental)
     process_info = None
+    segmented = (segments or segment_size) and sequence
 
-    if processing_method == 'smedge':
+    if processing_method == 'smedge' and not segmented:
         filename = "%s.py" % os.path.splitext(__file__)[0]
         command = r'python %s -i %s -o %s -t web_preview -ft sequence' % (filename, filein, fileout)
+        if partial:
+            command = '%s -sf %s -ef %s' % (command, first_frame, last_frame)
+        if incremental:
+            command = '%s --incremental' % command
+        if stream:
+            command = '%s --stream' % command
         process_info = cgl_execute(command, command_name=command_name, methodology='smedge', WaitForJobID=dependent_job)
         process_info['file_out'] = fileout
         try:
@@ -224,44 +573,479 @@ def create_web_mov(input_sequence, output, framerate=settings['frame_rate'], out
         return process_info
 
     ffmpeg_cmd = ''
-    if not output_frame_rate:
-        output_frame_rate = framerate
+
+    def sequence_command(first, fileout_, extra_args='', input_args=None):
+        return web_mov_command(filein, fileout_, first, framerate=framerate, output_frame_rate=output_frame_rate,
+                               res=res, extra_args=extra_args, input_args=input_args)
+
+    if file_type == 'sequence':
+        if partial:
+            ffmpeg_cmd = sequence_command(first_frame, fileout, '-frames:v %s -flags +cgop' % (last_frame -
+                                                                                              first_frame + 1))
+        else:
+            ffmpeg_cmd = sequence_command(start_frame, fileout)
+    elif file_type == 'movie':
+        ffmpeg_cmd = web_mov_command(filein, fileout, None, framerate=framerate, output_frame_rate=output_frame_rate,
+                                     res=res, input_args='-gamma 1 -i %s' % filein)
+    if ffmpeg_cmd and stream and sequence:
+        ffmpeg_cmd = sequence_command(first_frame, fileout, input_args=PIPE_INPUT_ARGS % framerate)
+        manifest = Manifest.for_output(fileout)
+        if incremental and manifest.is_current(fileout, inputs, {'command': ffmpeg_cmd}, content_hash=content_hash):
+            logging.info('%s is up to date, skipping' % fileout)
+            return {'command_name': command_name, 'file_out': fileout, 'skipped': True}
+        prep_for_output(fileout)
+        progress = FfmpegProgress(progress_callback)
+        timer = StepTimer('stream', outputs=[fileout], frames=len(inputs))
+        with timer, progress, get_scheduler().reserve(memory=FFMPEG_MEMORY) as slot:
+            process_info = stream_frames(inputs, slot.wrap(progress.instrument(ffmpeg_cmd, CONFIG.paths['ffmpeg']),
+                                                           ffmpeg=CONFIG.paths['ffmpeg']),
+                                         magick=CONFIG.paths['magick'], res=res, workers=workers or 1)
+        timer.metrics.update(dict([(k, v) for k, v in progress.metrics.items() if v is not None and k != 'frames']))
+        add_metrics(process_info, timer.metrics)
+        process_info['command_name'] = command_name
+        if process_info['returncode'] != 0:
+            logging.error('ffmpeg exited with %s while streaming %s' % (process_info['returncode'], filein))
+        elif incremental and not process_info['failed']:
+            manifest.record(fileout, inputs, {'command': ffmpeg_cmd}, content_hash=content_hash)
+            manifest.save()
+        process_info['file_out'] = fileout
+        try:
+            write_to_cgl_data(process_info)
+        except ValueError:
+            print('Skipping creation of cgl_data for %s' % fileout)
+        return process_info
+    elif ffmpeg_cmd and segmented:
+        manifest = Manifest.for_output(fileout)
+        if incremental:
+            if manifest.is_current(fileout, inputs, {'command': ffmpeg_cmd}, content_hash=content_hash):
+                logging.info('%s is up to date, skipping' % fileout)
+                return {'command_name': command_name, 'file_out': fileout, 'skipped': True}
+            prep_for_output(fileout)
+        if processing_method == 'smedge':
+            pyfile = "%s.py" % os.path.splitext(__file__)[0]
+            chunks, segment_files, list_file, concat_cmd = plan_segments(fileout, first_frame, last_frame,
+                                                                         segments=segments,
+                                                                         segment_size=segment_size)
+            commands = [r'python %s -i %s -o %s -t web_preview -ft sequence -sf %s -ef %s' % (pyfile, filein,
+                                                                                             segment_file, a, b)
+                        for (a, b), segment_file in zip(chunks, segment_files)]
+            # the segments are removed once they're joined, a failed concat keeps them to be joined again.
+            concat_cmd = '%s && python -c "import shutil; shutil.rmtree(%r)"' % (concat_cmd,
+                                                                                 os.path.dirname(list_file))
+            process_info = submit_chunks(commands, concat_cmd, dependent_job=dependent_job,
+                                         command_name=command_name)
+        else:
+            process_info = encode_segments(sequence_command, fileout, first_frame, last_frame,
+                                           segments=segments, segment_size=segment_size, workers=workers,
+                                           dependent_job=dependent_job, command_name=command_name,
+                                           progress_callback=progress_callback)
+        if incremental and processing_method == 'local' and os.path.exists(fileout):
+            manifest.record(fileout, inputs, {'command': ffmpeg_cmd}, content_hash=content_hash)
+            manifest.save()
+        process_info['file_out'] = fileout
+        try:
+            write_to_cgl_data(process_info)
+        except ValueError:
+            print('Skipping creation of cgl_data for %s' % fileout)
+        return process_info
+    elif ffmpeg_cmd:
+        if incremental:
+            process_info = execute_incremental(ffmpeg_cmd, inputs, fileout, content_hash=content_hash, verbose=True,
+                                               command_name=command_name, WaitForJobID=dependent_job,
+                                               new_window=new_window, step='web_mov',
+                                               progress_callback=progress_callback)
+            if process_info.get('skipped'):
+                return process_info
+        else:
+            process_info = execute_instrumented(ffmpeg_cmd, 'web_mov', outputs=[fileout],
+                                                progress_callback=progress_callback, verbose=True,
+                                                command_name=command_name, WaitForJobID=dependent_job,
+                                                new_window=new_window)
+
+        process_info['file_out'] = fileout
+        try:
+            write_to_cgl_data(process_info)
+        except ValueError:
+            print('Skipping creation of cgl_data for %s' % fileout)
+        return process_info
+
+
+def web_mov_command(filein, fileout, start_frame, framerate=None, output_frame_rate=None, res=None, extra_args='',
+                    input_args=None):
+    """
+    builds the h264 encode create_web_mov runs.
+    :param filein: input sequence, formatted with %04d
+    :param fileout: output mp4
+    :param start_frame: first frame read from the sequence
+    :param framerate: frame rate of the input sequence
+    :param output_frame_rate: frame rate of the output, defaults to framerate
+    :param res: resolution of the output, 1920x1080.  Frames are letterboxed to fit.
+    :param extra_args: output arguments added before the filters, -frames:v for partial ranges
+    :param input_args: replaces the image sequence input arguments, used to read frames from a pipe
+    :return: ffmpeg command
+    """
+    framerate = framerate or CONFIG.frame_rate
+    output_frame_rate = output_frame_rate or framerate
+    res = res or CONFIG.settings['resolution']['video_review']
     encoder = "libx264"
     profile = 'high'
     constant_rate_factor = "24"  # i need to test this with stuff that's not created at 24fps -
     pixel_format = 'yuv420p'
     gamma = 1
     width, height = res.split('x')
-    vcodec = "-vcodec libx264 -pix_fmt yuv420p -vf 'scale=trunc((a*oh)/2)*2:720' -g 30 -b:v 2000k -vprofile high -bf 0"
-    acodec = "-strict experimental -acodec aac -ab 160k -ac 2"
 
     filter_arg = r' -filter:v "scale=iw*min($width/iw\,$height/ih):ih*min($width/iw\,$height/ih),' \
                  r' pad=$width:$height:($width-iw*min($width/iw\,$height/ih))/2:' \
                  r'($height-ih*min($width/iw\,$height/ih))/2" '.replace('$width', width).replace('$height',
                                                                                                  height)
+    if input_args is None:
+        input_args = '-start_number %s -framerate %s -gamma %s -i %s' % (start_frame, framerate, gamma, filein)
+    return r'%s %s -s:v %s -b:v 50M -c:v %s -profile:v %s' \
+           r' -crf %s -pix_fmt %s -r %s %s%s %s' % (CONFIG.paths['ffmpeg'], input_args, res, encoder,
+                                                    profile, constant_rate_factor, pixel_format,
+                                                    output_frame_rate, extra_args, filter_arg, fileout)
 
-    if file_type == 'sequence':
-        ffmpeg_cmd = r'%s -start_number %s -framerate %s -gamma %s -i %s -s:v %s -b:v 50M -c:v %s -profile:v %s' \
-                     r' -crf %s -pix_fmt %s -r %s %s %s' % (PATHS['ffmpeg'],
-                                                            start_frame, framerate, gamma, filein, res, encoder,
-                                                            profile, constant_rate_factor, pixel_format,
-                                                            output_frame_rate, filter_arg, fileout)
-    elif file_type == 'movie':
-        ffmpeg_cmd = r'%s -gamma %s -i %s -s:v %s -b:v 50M -c:v %s -profile:v %s' \
-                     r' -crf %s -pix_fmt %s -r %s %s %s' % (PATHS['ffmpeg'], gamma, filein, res,
-                                                            encoder, profile, constant_rate_factor, pixel_format,
-                                                            output_frame_rate, filter_arg, fileout)
-    if ffmpeg_cmd:
-        process_info = cgl_execute(ffmpeg_cmd, verbose=True,
-                                   command_name=command_name, WaitForJobID=dependent_job, new_window=new_window)
 
-        process_info['file_out'] = fileout
-        try:
-            write_to_cgl_data(process_info)
-        except ValueError:
-            print('Skipping creation of cgl_data for %s' % fileout)
+def create_abr_ladder(input_file, output_dir, rungs=None, segment_type='mpegts', segment_time=HLS_SEGMENT_TIME,
+                      framerate=None, processing_method='local', dependent_job=None,
+                      command_name='create_abr_ladder()', new_window=False, progress_callback=None):
+    """
+    creates an HLS adaptive bitrate ladder from a movie or jpg sequence.  The input is decoded once and split to every
+    rung in a single filter graph, each rung is written as a segmented rendition with a master playlist listing them
+    all.
+    :param input_file: movie, or sequence string formatted with (#, %04d, *)
+    :param output_dir: folder the master playlist and a folder per rung are written to
+    :param rungs: list of OPTIONS keys ('720p', '360p'), defaults to every rung no taller than the input.
+    :param segment_type: 'mpegts' for .ts segments, 'fmp4' for fragmented mp4 segments
+    :param segment_time: seconds per segment, keyframes are placed so every rung's segments line up.
+    :param framerate: frame rate for input sequences
+    :param processing_method: local or smedge
+    :param dependent_job: job_id of dependencies
+    :param command_name: this is the command name that will be sent to the render farm
+    :param new_window: Puts the processing of the job into a new shell
+    :param progress_callback: called with ffmpeg's progress (frame, fps, speed, out_time, step) while it encodes
+    :return: process_info, with the master playlist as 'file_out' and each rung's playlist under 'outputs'
+    """
+    if processing_method == 'smedge':
+        pyfile = '%s.py' % os.path.splitext(__file__)[0]
+        file_type = 'movie' if get_file_type(input_file) == 'movie' else 'sequence'
+        command = r'python %s -i %s -o %s -t hls -ft %s' % (pyfile, input_file, output_dir, file_type)
+        if rungs:
+            command = '%s --rungs %s' % (command, ','.join(rungs))
+        command = '%s --segment_type %s --segment_time %s' % (command, segment_type, segment_time)
+        process_info = cgl_execute(command, command_name=command_name, methodology='smedge',
+                                   WaitForJobID=dependent_job)
+        process_info['file_out'] = os.path.join(output_dir, HLS_MASTER)
         return process_info
 
+    command, outputs = ladder_command(input_file, output_dir, rungs=rungs, segment_type=segment_type,
+                                      segment_time=segment_time, framerate=framerate)
+    if not command:
+        return
+    remove_ladder(output_dir)
+    for playlist in outputs.values():
+        if not os.path.isdir(os.path.dirname(playlist)):
+            os.makedirs(os.path.dirname(playlist))
+    process_info = execute_instrumented(command, 'abr_ladder', progress_callback=progress_callback, verbose=True,
+                                        methodology='local', command_name=command_name, WaitForJobID=dependent_job,
+                                        new_window=new_window)
+    process_info['file_out'] = os.path.join(output_dir, HLS_MASTER)
+    process_info['outputs'] = outputs
+    try:
+        write_to_cgl_data(process_info)
+    except ValueError:
+        print('Skipping creation of cgl_data for %s' % output_dir)
+    return process_info
+
+
+def remove_ladder(output_dir):
+    """
+    removes a ladder written by an earlier run: the master playlist and the playlists and segments in the rung folders.
+    Anything else in output_dir is left alone.
+    """
+    master = os.path.join(output_dir, HLS_MASTER)
+    if os.path.exists(master):
+        os.remove(master)
+    for rung in OPTIONS:
+        folder = os.path.join(output_dir, rung)
+        if not os.path.isdir(folder):
+            continue
+        for name in os.listdir(folder):
+            if name == 'index.m3u8' or name == 'init.mp4' or name.startswith('segment_'):
+                os.remove(os.path.join(folder, name))
+        if not os.listdir(folder):
+            os.rmdir(folder)
+
+
+def ladder_command(input_file, output_dir, rungs=None, segment_type='mpegts', segment_time=HLS_SEGMENT_TIME,
+                   framerate=None):
+    """
+    builds the single ffmpeg command create_abr_ladder runs.
+    :return: (ffmpeg command, dict of rung: playlist), (None, {}) if there's nothing to encode
+    """
+    framerate = framerate or CONFIG.frame_rate
+    if get_file_type(input_file) == 'movie':
+        info = media_info(input_file) or {}
+        input_args = '-i %s' % input_file
+        rate = info.get('frame_rate') or framerate
+    else:
+        sequence = find_sequence(input_file)
+        if not sequence:
+            logging.error('No frames found on disk for %s' % input_file)
+            return None, {}
+        info = {}
+        input_args = '-start_number %s -framerate %s -i %s' % (sequence.start_frame, framerate,
+                                                               sequence.num_sequence)
+        rate = framerate
+    if not rungs:
+        rungs = [r for r in OPTIONS if not info.get('height') or int(OPTIONS[r][2].split(':')[1]) <= info['height']]
+        rungs = rungs or ['320p']
+    unknown = [r for r in rungs if r not in OPTIONS]
+    if unknown:
+        logging.error('Unknown ladder rungs %s, options: %s' % (', '.join(unknown), ', '.join(sorted(OPTIONS))))
+        return None, {}
+    rungs = sorted(set(rungs), key=lambda r: int(OPTIONS[r][2].split(':')[1]), reverse=True)
+    audio = info.get('has_audio')
+    gop = max(1, int(round(float(rate) * segment_time)))
+
+    splits = ''.join(['[v%s]' % i for i in range(len(rungs))])
+    scales = ';'.join(['[v%s]scale=%s[v%sout]' % (i, OPTIONS[r][2], i) for i, r in enumerate(rungs)])
+    args = ['-filter_complex "[0:v]split=%s%s;%s"' % (len(rungs), splits, scales)]
+    stream_map = []
+    for i, rung in enumerate(rungs):
+        bitrate, maxrate, scale = OPTIONS[rung]
+        bufsize = '%sk' % (int(maxrate.rstrip('k')) * 2)
+        args.append('-map [v%sout] -c:v:%s libx264 -profile:v:%s high -pix_fmt yuv420p -b:v:%s %s -maxrate:v:%s %s '
+                    '-bufsize:v:%s %s' % (i, i, i, i, bitrate, i, maxrate, i, bufsize))
+        if audio:
+            args.append('-map 0:a:0 -c:a:%s aac -b:a:%s 128k -ac 2' % (i, i))
+            stream_map.append('v:%s,a:%s,name:%s' % (i, i, rung))
+        else:
+            stream_map.append('v:%s,name:%s' % (i, rung))
+    # fixed gops, no scene cut keyframes, so every rung's segments start at the same time and players can switch.
+    args.append('-g %s -keyint_min %s -sc_threshold 0' % (gop, gop))
+    ext = 'm4s' if segment_type == 'fmp4' else 'ts'
+    args.append('-f hls -hls_time %s -hls_playlist_type vod -hls_segment_type %s -hls_flags independent_segments '
+                '-master_pl_name %s -var_stream_map "%s" -hls_segment_filename %s' %
+                (segment_time, segment_type, HLS_MASTER, ' '.join(stream_map),
+                 os.path.join(output_dir, '%v', 'segment_%05d.' + ext)))
+    outputs = dict([(rung, os.path.join(output_dir, rung, 'index.m3u8')) for rung in rungs])
+    command = '%s %s %s %s' % (CONFIG.paths['ffmpeg'], input_args, ' '.join(args), os.path.join(output_dir, '%v',
+                                                                                         'index.m3u8'))
+    return command, outputs
+
+
+def frame_chunks(start_frame, end_frame, chunks=0, chunk_size=0):
+    """
+    splits a frame range into contiguous chunks.
+    :param start_frame: first frame of the range
+    :param end_frame: last frame of the range
+    :param chunks: number of chunks to split the range into
+    :param chunk_size: number of frames per chunk, overrides chunks
+    :return: list of (first_frame, last_frame) tuples
+    """
+    total = end_frame - start_frame + 1
+    if chunk_size <= 0:
+        chunks = max(1, min(chunks or 1, total))
+        chunk_size = int(math.ceil(total / float(chunks)))
+    return [(f, min(f + chunk_size - 1, end_frame)) for f in range(start_frame, end_frame + 1, chunk_size)]
+
+
+def plan_segments(fileout, start_frame, end_frame, segments=0, segment_size=0):
+    """
+    lays out the segment files and the concat command for encoding a frame range in segments.
+    :param fileout: the joined output file
+    :param start_frame: first frame of the range
+    :param end_frame: last frame of the range
+    :param segments: number of segments
+    :param segment_size: number of frames per segment, overrides segments
+    :return: (chunks, segment_files, list_file, concat_cmd)
+    """
+    chunks = frame_chunks(start_frame, end_frame, chunks=segments, chunk_size=segment_size)
+    segment_dir = os.path.join(os.path.dirname(fileout), '.%s_segments' % os.path.basename(fileout))
+    if os.path.exists(segment_dir):
+        shutil.rmtree(segment_dir)
+    os.makedirs(segment_dir)
+    segment_files = [os.path.join(segment_dir, 'segment_%04d.mp4' % i) for i in range(len(chunks))]
+    list_file = os.path.join(segment_dir, 'segments.txt')
+    with open(list_file, 'w') as f:
+        for segment_file in segment_files:
+            f.write("file '%s'\n" % segment_file.replace('\\', '/'))
+    concat_cmd = '%s -f concat -safe 0 -i %s -c copy -movflags +faststart %s' % (CONFIG.paths['ffmpeg'], list_file,
+                                                                                 fileout)
+    return chunks, segment_files, list_file, concat_cmd
+
+
+def encode_segments(command_for, fileout, start_frame, end_frame, segments=0, segment_size=0, workers=None,
+                    dependent_job=None, command_name='encode_segments()', progress_callback=None):
+    """
+    encodes a frame range as separate segments at the same time and joins them with a lossless concat.  Segments are
+    encoded with closed GOPs so each one starts on a keyframe and the joined file plays cleanly.
+    :param command_for: function(first_frame, fileout, extra_args) returning the ffmpeg command for a segment
+    :param fileout: the joined output file
+    :param start_frame: first frame of the range
+    :param end_frame: last frame of the range
+    :param segments: number of segments
+    :param segment_size: number of frames per segment, overrides segments
+    :param workers: number of segments encoded at the same time, defaults to one per segment.
+    :param dependent_job: job_id of dependencies
+    :param command_name: command name passed on to cgl_execute
+    :param progress_callback: called with ffmpeg's progress for each segment and the concat
+    :return: process_info of the concat, with metrics of every segment, the concat and the whole encode
+    """
+    chunks, segment_files, list_file, concat_cmd = plan_segments(fileout, start_frame, end_frame, segments=segments,
+                                                                 segment_size=segment_size)
+    commands = [command_for(first, segment_file, '-frames:v %s -flags +cgop' % (last - first + 1))
+                for (first, last), segment_file in zip(chunks, segment_files)]
+
+    def run(args):
+        i, command = args
+        return execute_instrumented(command, 'segment_%04d' % i, outputs=[segment_files[i]],
+                                    progress_callback=progress_callback, share=min(workers or len(commands),
+                                                                                   len(commands)),
+                                    verbose=True, methodology='local', command_name=command_name,
+                                    WaitForJobID=dependent_job)
+    timer = StepTimer('encode_segments', outputs=[fileout], frames=end_frame - start_frame + 1)
+    results = []
+    try:
+        with timer:
+            pool = ThreadPool(min(workers or len(commands), len(commands)))
+            try:
+                results = pool.map(run, list(enumerate(commands)))
+            finally:
+                pool.close()
+                pool.join()
+            missing = [f for f in segment_files if not os.path.exists(f)]
+            if missing:
+                logging.error('%s of %s segments failed to encode for %s' % (len(missing), len(commands), fileout))
+                process_info = {'command_name': command_name, 'file_out': fileout, 'failed': missing}
+            else:
+                process_info = execute_instrumented(concat_cmd, 'concat', outputs=[fileout],
+                                                    progress_callback=progress_callback, verbose=True,
+                                                    methodology='local', command_name=command_name)
+    finally:
+        shutil.rmtree(os.path.dirname(list_file), ignore_errors=True)
+    metrics = []
+    for result in results:
+        metrics.extend(result.get('metrics', []))
+    process_info['metrics'] = metrics + process_info.get('metrics', []) + [timer.metrics]
+    process_info['segments'] = len(commands)
+    return process_info
+
+
+def submit_chunks(commands, assemble_command, dependent_job=None, command_name='submit_chunks()'):
+    """
+    submits one farm task per chunk, and an assemble task that waits on all of them.
+    :param commands: list of commands, one per chunk
+    :param assemble_command: command run once every chunk is finished
+    :param dependent_job: job_id every chunk waits on
+    :param command_name: this is the command name that will be sent to the render farm
+    :return: process_info of the assemble task, with the chunk job ids under 'chunk_jobs'
+    """
+    job_ids = []
+    for i, command in enumerate(commands):
+        info = cgl_execute(command, command_name='%s chunk %s' % (command_name, i), methodology='smedge',
+                           WaitForJobID=dependent_job)
+        job_ids.append(str(info['job_id']))
+    process_info = cgl_execute(assemble_command, command_name='%s assemble' % command_name, methodology='smedge',
+                               WaitForJobID=','.join(job_ids))
+    process_info['chunk_jobs'] = job_ids
+    return process_info
+
+
+def execute_instrumented(command, step, outputs=(), progress_callback=None, share=1, **kwargs):
+    """
+    runs a command through cgl_execute and adds its metrics (wall/cpu time, bytes written and, for local ffmpeg
+    commands, frames, fps and speed read from ffmpeg's -progress report) to process_info['metrics'].  Local commands
+    wait for a slot from the scheduler and are limited to its threads and memory.
+    :param command: command to run
+    :param step: name of the step the metrics are recorded under
+    :param outputs: files the command writes, used for bytes_written
+    :param progress_callback: called with ffmpeg's progress (frame, fps, speed, out_time, step) while it runs
+    :param share: number of commands the caller runs at the same time, sets the command's share of the machine
+    :param kwargs: passed on to cgl_execute
+    :return: process_info
+    """
+    progress = None
+    local = kwargs.get('methodology', 'local') == 'local' and not kwargs.get('new_window')
+    if command.startswith(CONFIG.paths['ffmpeg']) and local:
+        callback = None
+        if progress_callback:
+            def callback(snapshot):
+                snapshot['step'] = step
+                progress_callback(snapshot)
+        progress = FfmpegProgress(callback)
+        command = progress.instrument(command, CONFIG.paths['ffmpeg'])
+    slot = None
+    if local:
+        slot = get_scheduler().reserve(share=share, memory=FFMPEG_MEMORY if command.startswith(CONFIG.paths['ffmpeg'])
+                                       else MAGICK_MEMORY)
+        command = slot.wrap(command, ffmpeg=CONFIG.paths['ffmpeg'], magick=CONFIG.paths['magick'], outputs=outputs)
+    timer = StepTimer(step, outputs=outputs)
+    try:
+        with timer:
+            if progress:
+                with progress:
+                    process_info = cgl_execute(command, **kwargs)
+            else:
+                process_info = cgl_execute(command, **kwargs)
+    finally:
+        if slot:
+            slot.scheduler.release(slot)
+    metrics = timer.metrics
+    if progress:
+        for key, value in progress.metrics.items():
+            if value is not None and not metrics.get(key):
+                metrics[key] = value
+        if metrics['frames'] and metrics['wall_time']:
+            metrics['fps'] = metrics['frames'] / metrics['wall_time']
+    add_metrics(process_info, metrics)
+    return process_info
+
+
+def execute_incremental(command, inputs, fileout, content_hash=False, step=None, progress_callback=None, **kwargs):
+    """
+    runs a command through cgl_execute unless the conversion manifest next to fileout says it's already up to date.
+    Stale outputs are removed before running, and successful outputs are recorded in the manifest.
+    :param command: command to run
+    :param inputs: list of input files the output is made from
+    :param fileout: output file the command creates
+    :param content_hash: compare file contents of inputs whose size/mtime changed.
+    :param step: name the command's metrics are recorded under, defaults to the command_name
+    :param progress_callback: called with ffmpeg's progress while it runs
+    :param kwargs: passed on to cgl_execute
+    :return: process_info, with 'skipped' set to True if the output was up to date
+    """
+    manifest = Manifest.for_output(fileout)
+    params = {'command': command}
+    if manifest.is_current(fileout, inputs, params, content_hash=content_hash):
+        logging.info('%s is up to date, skipping' % fileout)
+        return {'command_name': kwargs.get('command_name'), 'file_out': fileout, 'skipped': True}
+    prep_for_output(fileout)
+    process_info = execute_instrumented(command, step or kwargs.get('command_name'), outputs=[fileout],
+                                        progress_callback=progress_callback, **kwargs)
+    if not kwargs.get('new_window') and os.path.exists(fileout):
+        manifest.record(fileout, inputs, params, content_hash=content_hash)
+        manifest.save()
+    return process_info
+
+
+def same_file(path_a, path_b):
+    """
+    :return: True if both paths point at the same file, whether or not it exists yet
+    """
+    if os.path.exists(path_a) and os.path.exists(path_b):
+        return os.path.samefile(path_a, path_b)
+    return os.path.normcase(os.path.realpath(path_a)) == os.path.normcase(os.path.realpath(path_b))
+
+
+def check_output(input_file, output_file):
+    """
+    raises ValueError if output_file is input_file, outputs are deleted before they're written.
+    """
+    if output_file and same_file(input_file, output_file):
+        raise ValueError('Output %s is the input file, refusing to overwrite it' % output_file)
+
 
 def prep_for_output(fileout, cleanup=True):
     if cleanup:
@@ -274,7 +1058,8 @@ def prep_for_output(fileout, cleanup=True):
 
 
 def create_movie_thumb(input_file, output_file, processing_method='local', command_name='create_movie_thumb()',
-                       dependent_job=None, new_window=False):
+                       dependent_job=None, new_window=False, progress_callback=None, fast=True, timestamp=None,
+                       candidates=THUMB_CANDIDATES):
     """
     creates thumbnail for a movie file.
     :param input_file: input sequence string, formatted with (#, %04d, *)
@@ -282,12 +1067,16 @@ def create_movie_thumb(input_file, output_file, processing_method='local', comma
     :param processing_method: how will this be processed? (local, smedge, deadline)
     :param dependent_job: job_id of any dependencies
     :param command_name: this is the command name that will be sent to the render farm
+    :param new_window: Puts the processing of the job into a new shell
+    :param fast: seek straight to keyframes and decode only those, so the time taken doesn't depend on the length
+    of the movie.  If False ffmpeg's thumbnail filter looks through the frames following THUMB_POSITION.
+    :param timestamp: with fast, seconds into the movie to take the thumbnail from instead of sampling candidates
+    :param candidates: with fast, number of keyframes sampled across the movie, the most representative is kept.
     :return:
     """
     if not output_file:
         print('No output_file specified, cancelling thumbnail generation')
         return
-    res = settings['resolution']['thumb_cine'].replace('x', ':')
     prep_for_output(output_file)
 
     if processing_method == 'smedge':
@@ -302,11 +1091,12 @@ def create_movie_thumb(input_file, output_file, processing_method='local', comma
         return process_info
 
     if processing_method == 'local':
-        command = '%s -i %s -vf "thumbnail,scale=%s" ' \
-                  '-frames:v 1 %s' % (PATHS['ffmpeg'], input_file, res, output_file)
-        process_info = cgl_execute(command, verbose=True, methodology='local',
-                                   command_name=command_name, new_window=True,
-                                   WaitForJobID=dependent_job)
+        command = movie_thumb_command(input_file, output_file, media_info(input_file), fast=fast, timestamp=timestamp,
+                                      candidates=candidates)
+        process_info = execute_instrumented(command, 'thumb', outputs=[output_file],
+                                            progress_callback=progress_callback, verbose=True, methodology='local',
+                                            command_name=command_name, new_window=new_window,
+                                            WaitForJobID=dependent_job)
         process_info['file_out'] = output_file
         try:
             write_to_cgl_data(process_info)
@@ -315,6 +1105,133 @@ def create_movie_thumb(input_file, output_file, processing_method='local', comma
         return process_info
 
 
+def movie_thumb_command(input_file, output_file, info=None, fast=True, timestamp=None, candidates=THUMB_CANDIDATES):
+    """
+    :param info: media_info() of the movie, used to seek past the head of the movie
+    :param fast: see create_movie_thumb
+    :param timestamp: with fast, seconds into the movie to take the thumbnail from
+    :param candidates: with fast, number of keyframes to choose from
+    :return: ffmpeg command that writes a thumbnail of input_file
+    """
+    res = CONFIG.settings['resolution']['thumb_cine'].replace('x', ':')
+    duration = info['duration'] if info else None
+    if not fast:
+        seek = ''
+        if duration:
+            seek = '-ss %.3f ' % (duration * THUMB_POSITION)
+        return '%s %s-i %s -vf "thumbnail,scale=%s" -frames:v 1 %s' % (CONFIG.paths['ffmpeg'], seek, input_file, res,
+                                                                       output_file)
+    if timestamp is not None or not duration or candidates <= 1:
+        if timestamp is None:
+            timestamp = duration * THUMB_POSITION if duration else 0
+        return '%s %s -vf "scale=%s" -frames:v 1 %s' % (CONFIG.paths['ffmpeg'], keyframe_input(input_file, timestamp),
+                                                          res, output_file)
+    # spread the candidates over the middle of the movie, clear of slates and end credits.
+    span = 1 - THUMB_POSITION * 2
+    times = [duration * (THUMB_POSITION + span * (i + 0.5) / candidates) for i in range(candidates)]
+    return '%s %s -filter_complex "%s,thumbnail=%s,scale=%s" -frames:v 1 %s' % (
+        CONFIG.paths['ffmpeg'], ' '.join([keyframe_input(input_file, t) for t in times]), _first_frames(len(times)),
+        len(times), res, output_file)
+
+
+def keyframe_input(input_file, seconds):
+    """
+    input arguments that seek to the keyframe at or before seconds and decode nothing but keyframes, so reading a frame
+    costs the same anywhere in the movie.
+    """
+    return '-skip_frame nokey -noaccurate_seek -ss %.3f -i %s' % (seconds, input_file)
+
+
+def _first_frames(inputs):
+    """
+    filter graph joining the first frame of each input into one stream.
+    """
+    trims = ';'.join(['[%s:v]trim=end_frame=1,setpts=PTS-STARTPTS[f%s]' % (i, i) for i in range(inputs)])
+    return '%s;%sconcat=n=%s:v=1:a=0' % (trims, ''.join(['[f%s]' % i for i in range(inputs)]), inputs)
+
+
+def create_contact_sheet(input_file, output_file, count=20, columns=CONTACT_SHEET_COLUMNS, size=None, vtt=True,
+                         processing_method='local', command_name='create_contact_sheet()', dependent_job=None,
+                         new_window=False, progress_callback=None):
+    """
+    creates a contact sheet (sprite) of thumbnails evenly spaced through a movie in a single ffmpeg run, with a
+    WebVTT file mapping each part of the movie to its thumbnail for scrubbing previews.  Only keyframes are decoded,
+    so long movies take no longer than short ones.
+    :param input_file: movie
+    :param output_file: sprite image, the WebVTT file is written next to it with a .vtt extension
+    :param count: number of thumbnails
+    :param columns: thumbnails per row of the sheet
+    :param size: size of each thumbnail (192x108), defaults to the thumb resolution.  Frames are letterboxed to fit.
+    :param vtt: write the WebVTT index
+    :param processing_method: local or smedge
+    :param dependent_job: job_id of any dependencies
+    :param command_name: this is the command name that will be sent to the render farm
+    :param new_window: Puts the processing of the job into a new shell
+    :param progress_callback: called with ffmpeg's progress while it runs
+    :return: process_info, with the WebVTT file under 'vtt'
+    """
+    prep_for_output(output_file)
+    if processing_method == 'smedge':
+        pyfile = '%s.py' % os.path.splitext(__file__)[0]
+        command = r'python %s -i %s -o %s -t contact_sheet -ft movie -n %s' % (pyfile, input_file, output_file, count)
+        process_info = cgl_execute(command, command_name=command_name, methodology='smedge',
+                                   WaitForJobID=dependent_job)
+        process_info['file_out'] = output_file
+        return process_info
+
+    info = media_info(input_file)
+    if not info or not info['duration']:
+        logging.error('Can not make a contact sheet of %s, duration unknown' % input_file)
+        return
+    width, height = [int(x) for x in (size or CONFIG.thumb_res).split('x')]
+    count = max(1, count)
+    columns = min(columns, count)
+    rows = int(math.ceil(count / float(columns)))
+    step = info['duration'] / count
+    times = [step * (i + 0.5) for i in range(count)]
+    filters = '%s,scale=%s:%s:force_original_aspect_ratio=decrease,pad=%s:%s:(ow-iw)/2:(oh-ih)/2,' \
+              'tile=%sx%s' % (_first_frames(count), width, height, width, height, columns, rows)
+    command = '%s %s -filter_complex "%s" -frames:v 1 %s' % (CONFIG.paths['ffmpeg'],
+                                                             ' '.join([keyframe_input(input_file, t) for t in times]),
+                                                             filters, output_file)
+    vtt_file = '%s.vtt' % os.path.splitext(output_file)[0]
+    process_info = execute_instrumented(command, 'contact_sheet', outputs=[output_file],
+                                        progress_callback=progress_callback, verbose=True, methodology='local',
+                                        command_name=command_name, new_window=new_window,
+                                        WaitForJobID=dependent_job)
+    process_info['file_out'] = output_file
+    if vtt:
+        with open(vtt_file, 'w') as f:
+            f.write(contact_sheet_vtt(os.path.basename(output_file), info['duration'], count, columns, width,
+                                      height))
+        process_info['vtt'] = vtt_file
+    try:
+        write_to_cgl_data(process_info)
+    except ValueError:
+        print('Error writing to cgl_data for: %s' % output_file)
+    return process_info
+
+
+def contact_sheet_vtt(image, duration, count, columns, width, height):
+    """
+    :return: WebVTT text pointing each 1/count of the movie at its tile of the contact sheet (image#xywh=...)
+    """
+    step = duration / count
+    cues = ['WEBVTT', '']
+    for i in range(count):
+        cues.append('%s --> %s' % (_vtt_time(step * i), _vtt_time(min(step * (i + 1), duration))))
+        cues.append('%s#xywh=%s,%s,%s,%s' % (image, (i % columns) * width, (i // columns) * height, width, height))
+        cues.append('')
+    return '\n'.join(cues)
+
+
+def _vtt_time(seconds):
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    return '%02d:%02d:%02d.%03d' % (hours, minutes, milliseconds // 1000, milliseconds % 1000)
+
+
 def change_extension(filein, new_ext):
     new_ext = new_ext.replace('.', '')
     file_ = os.path.splitext(filein)[0]
@@ -334,22 +1251,31 @@ def convert_to_webm(filein, fileout=None, processing_method='local', dependent_j
         fileout = change_extension(filein, 'mp4')
     vcodec = ' -pix_fmt yuv420p -vcodec libvpx -vf "scale=trunc((a*oh)/2)*2:720" -g 30 -b:v 2000k -vpre 720p -quality realtime -cpu-used 0 -qmin 10 -qmax 42'
     acodec = "-acodec libvorbis -aq 60 -ac 2"
-    command = "%s -i %s %s %s -f webm %s" % (PATHS['ffmpeg'], filein, acodec, vcodec, fileout)
+    command = "%s -i %s %s %s -f webm %s" % (CONFIG.paths['ffmpeg'], filein, acodec, vcodec, fileout)
     cgl_execute(command, command_name='convert to webm', methodology=processing_method, WaitForJobID=dependent_job,
                 new_window=True)
     return fileout
 
 
 def convert_to_mp4(filein, fileout=None, processing_method='local', dependent_job=None, audio_only=False,
-                   new_window=False, command_name='convert_to_mp4()', delete_existing=True):
+                   new_window=False, command_name='convert_to_mp4()', delete_existing=True, incremental=False,
+                   content_hash=False, allow_remux=True, progress_callback=None):
     """
     creates a .mp4 file specifically to be used in amazon's transcription services.
     :param filein:
     :param fileout:
     :param processing_method:
     :param dependent_job:
-    :return:
+    :param incremental: keep existing outputs that were made from the same input with the same settings.
+    :param content_hash: with incremental, compare file contents if the input's size/mtime changed.
+    :param allow_remux: if the input is already h264/aac within the mp4 limits, copy its streams instead of encoding.
+    :param progress_callback: called with ffmpeg's progress (frame, fps, speed, out_time, step) while it runs
+    :return: process_info, 'method' says whether the input was remuxed or encoded, timing and encode stats are
+    under 'metrics'.
     """
+    if incremental:
+        delete_existing = False
+    check_output(filein, fileout or change_extension(filein, 'mp4'))
     if not fileout:
         fileout = change_extension(filein, 'mp4')
         print(fileout)
@@ -359,13 +1285,12 @@ def convert_to_mp4(filein, fileout=None, processing_method='local', dependent_jo
                 print('deleting existing file: %s' % fileout)
                 os.remove(fileout)
         # 'scale=trunc((a*oh)/2)*2:720'
-    vcodec = '-vcodec libx264 -pix_fmt yuv420p -vf "scale=trunc((a*oh)/2)*2:720" -g 30 -b:v 2000k -vprofile high -bf 0'
-    acodec = "-strict experimental -acodec aac -ab 160k -ac 2"
     process_info = {'file_out': fileout, 'job_id': 0}
 
     if audio_only:
         if not fileout.endswith('_audio.mp4'):
             fileout = fileout.replace('.mp4', '_audio.mp4')
+            check_output(filein, fileout)
             print(fileout)
             if os.path.exists(fileout):
                 print('deleting fileout: %s' % fileout)
@@ -373,27 +1298,62 @@ def convert_to_mp4(filein, fileout=None, processing_method='local', dependent_jo
                     print('deleting existing file: %s' % fileout)
                     os.remove(fileout)
         if processing_method == 'local':
-            command = "%s -i %s -vn %s %s" % (PATHS['ffmpeg'], filein, acodec, fileout)
-            cgl_execute(command, command_name=command_name, methodology='local',
-                        WaitForJobID=dependent_job)
+            info = media_info(filein)
+            if info and not info['has_audio']:
+                print('No audio stream in %s, skipping audio conversion' % filein)
+                process_info['skipped'] = 'no audio stream'
+                return process_info
+            command, process_info['method'] = mp4_command(filein, fileout, info, audio_only=True,
+                                                          allow_remux=allow_remux)
+            if incremental:
+                process_info.update(execute_incremental(command, [filein], fileout, content_hash=content_hash,
+                                                        command_name=command_name, methodology='local',
+                                                        WaitForJobID=dependent_job, step='audio',
+                                                        progress_callback=progress_callback))
+            else:
+                process_info.update(execute_instrumented(command, 'audio', outputs=[fileout],
+                                                         progress_callback=progress_callback,
+                                                         command_name=command_name, methodology='local',
+                                                         WaitForJobID=dependent_job))
             process_info['file_out'] = fileout
+            try:
+                write_to_cgl_data(process_info)
+            except ValueError:
+                print('Skipping creation of cgl_data for %s' % fileout)
             return process_info
         elif processing_method == 'smedge':
             filename = "%s.py" % os.path.splitext(__file__)[0]
             command = r'python %s -i %s -o %s -t audio -ft movie' % (filename, filein, fileout)
+            if incremental:
+                command = '%s --incremental' % command
             process_info = cgl_execute(command, command_name=command_name, methodology='smedge',
                                        WaitForJobID=dependent_job)
             process_info['file_out'] = fileout
             return process_info
     else:
         if processing_method == 'local':
-            command = "%s -i %s %s %s -f mp4 %s" % (PATHS['ffmpeg'], filein, acodec, vcodec, fileout)
-            cgl_execute(command, command_name='Convert to mp4', methodology=processing_method, WaitForJobID=dependent_job,
-                        new_window=new_window)
+            command, process_info['method'] = mp4_command(filein, fileout, media_info(filein),
+                                                          allow_remux=allow_remux)
+            if incremental:
+                process_info.update(execute_incremental(command, [filein], fileout, content_hash=content_hash,
+                                                        command_name='Convert to mp4', methodology=processing_method,
+                                                        WaitForJobID=dependent_job, new_window=new_window,
+                                                        step='mp4', progress_callback=progress_callback))
+            else:
+                process_info.update(execute_instrumented(command, 'mp4', outputs=[fileout],
+                                                         progress_callback=progress_callback,
+                                                         command_name='Convert to mp4', methodology=processing_method,
+                                                         WaitForJobID=dependent_job, new_window=new_window))
             process_info['file_out'] = fileout
+            try:
+                write_to_cgl_data(process_info)
+            except ValueError:
+                print('Skipping creation of cgl_data for %s' % fileout)
         elif processing_method == 'smedge':
             filename = "%s.py" % os.path.splitext(__file__)[0]
             command = r'python %s -i %s -o %s -t mp4 -ft movie' % (filename, filein, fileout)
+            if incremental:
+                command = '%s --incremental' % command
             process_info = cgl_execute(command, command_name=command_name, methodology='smedge',
                                        WaitForJobID=dependent_job)
             process_info['file_out'] = fileout
@@ -401,6 +1361,162 @@ def convert_to_mp4(filein, fileout=None, processing_method='local', dependent_jo
     return process_info
 
 
+def mp4_command(filein, fileout, info=None, audio_only=False, allow_remux=True):
+    """
+    :param info: media_info() of filein, decides if the streams can be copied instead of encoded
+    :return: (ffmpeg command, 'remux' or 'encode')
+    """
+    remux = allow_remux and can_remux_mp4(info, audio_only=audio_only)
+    if audio_only:
+        if remux:
+            return "%s -i %s -vn -map 0:a:0 -c:a copy -movflags +faststart %s" % (CONFIG.paths['ffmpeg'], filein,
+                                                                                  fileout), 'remux'
+        return "%s -i %s -vn %s %s" % (CONFIG.paths['ffmpeg'], filein, MP4_ACODEC, fileout), 'encode'
+    if remux:
+        return '%s -i %s -map 0:v:0 -map "0:a:0?" -c copy -movflags +faststart ' \
+               '-f mp4 %s' % (CONFIG.paths['ffmpeg'], filein, fileout), 'remux'
+    return "%s -i %s %s %s -f mp4 %s" % (CONFIG.paths['ffmpeg'], filein, MP4_ACODEC, MP4_VCODEC, fileout), 'encode'
+
+
+def can_remux_mp4(info, audio_only=False):
+    """
+    checks if a movie's streams can be copied into an mp4 as they are, instead of encoding them with
+    MP4_VCODEC/MP4_ACODEC.
+    :param info: media_info() of the movie
+    :param audio_only: only the audio stream matters
+    :return: True if the streams are already h264 yuv420p at or below MP4_MAX_HEIGHT and aac stereo or less
+    """
+    if not info:
+        return False
+    audio_ok = info['audio_codec'] == 'aac' and (info['audio_channels'] or 0) <= MP4_MAX_CHANNELS
+    if audio_only:
+        return info['has_audio'] and audio_ok
+    if not info['has_video'] or info['video_codec'] != 'h264' or info['pix_fmt'] != 'yuv420p':
+        return False
+    if not info['height'] or info['height'] > MP4_MAX_HEIGHT:
+        return False
+    return not info['has_audio'] or audio_ok
+
+
+class RenderPlan(object):
+    """
+    Collects several outputs for one movie and renders them with a single ffmpeg call, so the source is only demuxed
+    and decoded once no matter how many deliverables are made from it.
+
+        plan = RenderPlan('shot.mov')
+        plan.add('mp4')
+        plan.add('audio')
+        plan.add('thumb', 'shot_thumb.jpg')
+        plan.execute()
+    """
+    TARGETS = ('mp4', 'audio', 'wav', 'thumb', 'prores')
+
+    def __init__(self, input_file, output_base=None):
+        """
+        :param input_file: movie to convert
+        :param output_base: path, without extension, used to name outputs that are added without a file name.
+        defaults to the input file without its extension.
+        """
+        self.input_file = input_file
+        self.output_base = output_base or os.path.splitext(input_file)[0]
+        self.outputs = []
+
+    def default_output(self, target, quality=0):
+        if target == 'mp4':
+            return '%s.mp4' % self.output_base
+        elif target == 'audio':
+            return '%s_audio.mp4' % self.output_base
+        elif target == 'wav':
+            return '%s.wav' % self.output_base
+        elif target == 'thumb':
+            return '%s_thumb.jpg' % self.output_base
+        elif target == 'prores':
+            return '%s_prores_%s.mov' % (self.output_base, PRORES_QUALITY[quality])
+
+    def add(self, target, fileout=None, quality=0):
+        """
+        adds an output to the plan.
+        :param target: one of RenderPlan.TARGETS
+        :param fileout: output file, if None a name is made from output_base.  ValueError if it's the input file.
+        :param quality: prores quality, 0:proxy, 1:low, 2:standard, 3:high
+        :return: the output file
+        """
+        if target not in self.TARGETS:
+            raise ValueError('Conversion Type: %s not supported in a RenderPlan, options: %s' % (target,
+                                                                                                 ', '.join(self.TARGETS)))
+        if not fileout:
+            fileout = self.default_output(target, quality)
+        check_output(self.input_file, fileout)
+        if target == 'mp4':
+            args = '%s %s -f mp4' % (MP4_ACODEC, MP4_VCODEC)
+        elif target == 'audio':
+            args = '-vn %s' % MP4_ACODEC
+        elif target == 'wav':
+            args = '-vn -acodec pcm_s16le -ac 2'
+        elif target == 'thumb':
+            res = CONFIG.settings['resolution']['thumb_cine'].replace('x', ':')
+            args = '-an -vf "thumbnail,scale=%s" -frames:v 1' % res
+        else:
+            args = '-c:v prores_ks -qscale:v 1 -profile:v %s -c:a copy' % quality
+        self.outputs.append((target, fileout, args))
+        return fileout
+
+    def command(self, outputs=None):
+        """
+        :param outputs: the (target, fileout, args) to render, defaults to every output in the plan
+        :return: the ffmpeg command that renders the outputs
+        """
+        outputs = ' '.join(['%s %s' % (args, fileout) for target, fileout, args in outputs or self.outputs])
+        return '%s -i %s %s' % (CONFIG.paths['ffmpeg'], self.input_file, outputs)
+
+    def execute(self, processing_method='local', dependent_job=None, command_name='RenderPlan()', new_window=False):
+        """
+        renders all outputs in the plan.  Audio outputs of an input without audio are skipped, rather than failing
+        the whole command.
+        :param processing_method: local or smedge
+        :param dependent_job: job_id of any dependencies
+        :param command_name: this is the command name that will be sent to the render farm
+        :param new_window: Puts the processing of the job into a new shell
+        :return: process_info, with each output listed by target under 'outputs' (None for skipped outputs, which are
+        listed with the reason under 'skipped_outputs')
+        """
+        if not self.outputs:
+            logging.error('No outputs added to RenderPlan for %s' % self.input_file)
+            return
+        for target, fileout, args in self.outputs:
+            check_output(self.input_file, fileout)
+        info = media_info(self.input_file)
+        skipped = {}
+        if info and not info['has_audio']:
+            skipped = dict([(o[0], 'no audio stream') for o in self.outputs if o[0] in ('audio', 'wav')])
+        outputs = [o for o in self.outputs if o[0] not in skipped]
+        if outputs:
+            for target, fileout, args in outputs:
+                prep_for_output(fileout)
+            # farm nodes run the same ffmpeg command, there's nothing gained from a second interpreter on the node.
+            process_info = execute_instrumented(self.command(outputs), 'render_plan', outputs=[o[1] for o in outputs],
+                                                verbose=True, methodology=processing_method,
+                                                command_name=command_name, WaitForJobID=dependent_job,
+                                                new_window=new_window)
+            process_info['file_out'] = outputs[0][1]
+        else:
+            process_info = {'file_out': None, 'job_id': 0, 'skipped': 'no audio stream'}
+        process_info['outputs'] = dict([(target, None if target in skipped else fileout)
+                                        for target, fileout, args in self.outputs])
+        if skipped:
+            print('No audio stream in %s, skipping %s' % (self.input_file, ', '.join(sorted(skipped))))
+            process_info['skipped_outputs'] = skipped
+        try:
+            write_to_cgl_data(process_info)
+        except ValueError:
+            print('Skipping creation of cgl_data for %s' % self.input_file)
+        return process_info
+
+
+def wav_command(filein, fileout):
+    return '%s -i %s -acodec pcm_s16le -ac 2 %s' % (CONFIG.paths['ffmpeg'], filein, fileout)
+
+
 def extract_wav_from_movie(filein, fileout=None, processing_method='local', dependent_job=None):
     """
     extracts audio from a video file.
@@ -412,14 +1528,19 @@ def extract_wav_from_movie(filein, fileout=None, processing_method='local', depe
     """
     # check if the input is an approved video format.
     file_, ext = os.path.splitext(filein)
-    if ext in ext_map.keys():
-        if ext_map[ext] == 'movie':
+    file_type = get_file_type(filein)
+    if file_type:
+        if file_type == 'movie':
             if not fileout:
                 fileout = '%s.wav' % file_
             if not fileout.endswith('.wav'):
                 print("%s is not a .wav file, aborting wav extraction")
                 return
-            command = '%s -i %s -acodec pcm_s16le -ac 2 %s' % (PATHS['ffmpeg'], filein, fileout)
+            info = media_info(filein)
+            if info and not info['has_audio']:
+                print('No audio stream in %s, skipping wav extraction' % filein)
+                return
+            command = wav_command(filein, fileout)
             cgl_execute(command, command_name='Audio Extraction', methodology=processing_method, WaitForJobID=dependent_job,
                         new_window=True)
             return fileout
@@ -427,41 +1548,114 @@ def extract_wav_from_movie(filein, fileout=None, processing_method='local', depe
         print('Extension %s not cataloged in globals, please add it to the ext_map dictionary' % ext)
 
 
-@click.command()
-@click.option('--input_file', '-i', prompt='File Sequence Path (file.####.ext)',
-              help='Path to the Input File.  Can be Image, Image Sequence, Movie')
-@click.option('--output_file', '-o', default=None,
-              help='Path to the output file/folder/sequence')
-@click.option('--width', '-w', default=1920, help='width in pixels')
-@click.option('--height', '-h', default=1080, help='height in pixels')
-@click.option('--file_type', '-ft', default='movie', help='options: sequence, image, movie')
-@click.option('--conversion_type', '-t', default='web_preview',
-              help='Type of Conversions: proxy, mp4, web_preview, prores, thumb, gif, audio')
-@click.option('--quality', '-q', default=0, help='0:proxy, 1:low, 2:standard, 3:high')
-def main(input_file, output_file, height, width, file_type, conversion_type, quality=0):
-    run_dict = {}
+def convert_file(input_file, output_file=None, file_type='movie', conversion_type='web_preview', width=1920,
+                 height=1080, quality=0, workers=1, batch_size=0, incremental=False, segments=0, segment_size=0,
+                 start_frame=None, end_frame=None, chunks=0, chunk_size=0, stream=False, engine='magick',
+                 rungs=None, thumbs=20, segment_type='mpegts', segment_time=HLS_SEGMENT_TIME):
+    """
+    runs the conversion(s) the command line asks for on a single input.
+    :param input_file: Path to the Input File.  Can be Image, Image Sequence, Movie
+    :param output_file: Path to the output file/folder/sequence
+    :param file_type: sequence, image, movie
+    :param conversion_type: proxy, mp4, web_preview, prores, thumb, contact_sheet, audio, wav, hls.  Several movie
+    conversions can be given separated by commas (mp4,audio,thumb), they are rendered with a single decode of the
+    input, output_file then only names them (its extension is dropped) and RenderPlan checks each output.
+    :return: process_info of the conversion
+    """
+    conversion_types = [c.strip() for c in conversion_type.split(',') if c.strip()]
+    if len(conversion_types) < 2:
+        check_output(input_file, output_file)
+    if conversion_type == 'contact_sheet':
+        return create_contact_sheet(input_file, output_file or '%s_sheet.jpg' % os.path.splitext(input_file)[0],
+                                    count=thumbs)
+    if conversion_type == 'hls':
+        return create_abr_ladder(input_file, output_file or '%s_hls' % os.path.splitext(input_file)[0].rstrip('.#'),
+                                 rungs=rungs, segment_type=segment_type, segment_time=segment_time)
     if file_type == 'sequence':
         if conversion_type == 'proxy':
-            create_proxy_sequence(input_file, output_sequence=output_file, width=width, height=height)
+            return create_proxy_sequence(input_file, output_sequence=output_file, width=width, height=height,
+                                         workers=workers, batch_size=batch_size, incremental=incremental,
+                                         start_frame=start_frame, end_frame=end_frame, chunks=chunks,
+                                         chunk_size=chunk_size, engine=engine)
         elif conversion_type == 'web_preview':
-            create_web_mov(input_file, output=output_file)
-    if file_type == 'movie':
-        if conversion_type == 'prores':
-            create_prores_mov(input_file, output_file, quality=quality)
+            return create_web_mov(input_file, output=output_file, incremental=incremental, segments=segments,
+                                  segment_size=segment_size, workers=workers if workers > 1 else None,
+                                  start_frame=start_frame, end_frame=end_frame, stream=stream)
+    elif file_type == 'movie':
+        if len(conversion_types) > 1:
+            output_base = os.path.splitext(output_file)[0] if output_file else None
+            plan = RenderPlan(input_file, output_base=output_base)
+            for each in conversion_types:
+                plan.add(each, quality=quality)
+            return plan.execute()
+        elif conversion_type == 'prores':
+            return create_prores_mov(input_file, output_file, quality=quality)
         elif conversion_type == 'audio':
-            convert_to_mp4(input_file, output_file, audio_only=True)
+            return convert_to_mp4(input_file, output_file, audio_only=True, incremental=incremental)
         elif conversion_type == 'thumb':
-            create_movie_thumb(input_file, output_file)
+            return create_movie_thumb(input_file, output_file)
         elif conversion_type == 'mp4':
-            convert_to_mp4(input_file, output_file)
+            return convert_to_mp4(input_file, output_file, incremental=incremental)
+        elif conversion_type == 'wav':
+            return extract_wav_from_movie(input_file, output_file)
         else:
             print('Conversion Type: %s process not defined' % conversion_type)
-    if run_dict.keys():
-        for key in run_dict:
-            click.echo('%s: %s' % (key, run_dict[key]))
 
 
-if __name__ == '__main__':
-    main()
+def run_job(job):
+    """
+    runs a conversion described by a dict, the form jobs take when they're queued or read from a file:
+
+        {'input_file': 'shot.mov', 'output_file': 'shot.mp4', 'file_type': 'movie', 'conversion_type': 'mp4',
+         'options': {'incremental': True}}
+
+    :param job: dict with input_file, and optionally output_file, file_type, conversion_type and options (keyword
+    arguments of convert_file)
+    :return: process_info of the conversion
+    """
+    options = dict(job.get('options') or {})
+    return convert_file(job['input_file'], job.get('output_file') or None, file_type=job.get('file_type') or 'movie',
+                        conversion_type=job.get('conversion_type') or 'web_preview', **options)
+
+
+def _written(path):
+    name = os.path.basename(path)
+    if '%' in name or '#' in name:
+        return bool(find_sequence(path))
+    return os.path.exists(path)
+
+
+def job_error(process_info):
+    """
+    works out whether a conversion run by run_job did its job.
+    :param process_info: what run_job returned
+    :return: why the job failed, None if it succeeded
+    """
+    if not process_info:
+        return 'nothing was converted'
+    if not isinstance(process_info, dict):
+        # some conversions return the output file.
+        return None if _written(process_info) else '%s was not written' % process_info
+    if process_info.get('failed'):
+        return '%s failed' % len(process_info['failed'])
+    if process_info.get('returncode'):
+        return 'exited with %s' % process_info['returncode']
+    if process_info.get('skipped') or process_info.get('methodology', 'local') != 'local':
+        return None
+    outputs = [process_info.get('file_out')] + list((process_info.get('outputs') or {}).values())
+    missing = [o for o in outputs if o and not _written(o)]
+    if missing:
+        return '%s was not written' % ', '.join(missing)
+    return None
+
+
+def main(args=None):
+    """
+    command line entry point, see convert.cli.  click is only imported when the command line is used.
+    """
+    from convert.cli import main as cli_main
+    return cli_main(args=args)
 
 
+if __name__ == '__main__':
+    main()
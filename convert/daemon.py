@@ -0,0 +1,562 @@
+"""
+A resident conversion daemon.
+
+Farm jobs start a new interpreter, import cgl and read the config just to launch one ffmpeg.  The daemon pays for that
+once: it watches ingest folders, waits for files and sequences to finish arriving, and runs the conversions configured
+for them on a pool of worker threads, calling convert.py's functions directly.  Jobs can also be submitted over a
+local HTTP endpoint:
+
+    curl -X POST localhost:8765/jobs -d '{"input_file": "/ingest/a.mov", "conversion_type": "mp4,thumb"}'
+    curl localhost:8765/jobs/1
+
+Paths in jobs end up in shell commands, so the endpoint only takes existing inputs, known conversion types and options,
+and paths without whitespace or shell metacharacters.
+
+Watched folders are configured with a json file:
+
+    {"workers": 4, "port": 8765, "settle": 5,
+     "watch": [{"path": "/ingest", "output": "/ingest/converted", "recursive": true,
+                "movie": ["mp4", "thumb"], "sequence": ["proxy", "web_preview"]}]}
+
+Outputs of a rule without an output folder go to a 'converted' folder inside the watched folder.  Output folders are
+never watched, so the daemon doesn't convert its own outputs.
+
+New files are picked up with inotify on linux and by polling everywhere else.
+"""
+import collections
+import ctypes
+import ctypes.util
+import errno
+import json
+import logging
+import os
+import re
+import select
+import signal
+import struct
+import sys
+import threading
+import time
+
+import click
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    import queue
+except ImportError:  # python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    import Queue as queue
+
+try:
+    string_types = basestring
+except NameError:  # python 3
+    string_types = str
+
+if __name__ == '__main__' and not __package__:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from convert import convert
+from convert.jobs import OUTPUT_FOLDER, jobs_for, source_key
+from convert.scheduler import get_scheduler
+from convert.sequence_index import find_sequence
+
+DEFAULT_PORT = 8765
+# seconds a file or sequence has to go without changing before it's converted.
+DEFAULT_SETTLE = 5.0
+POLL_INTERVAL = 2.0
+# finished jobs kept for GET /jobs
+JOB_HISTORY = 1000
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT = struct.Struct('iIII')
+# what jobs submitted over HTTP may ask for.
+JOB_TYPES = ('movie', 'sequence')
+JOB_CONVERSIONS = ('mp4', 'audio', 'wav', 'thumb', 'prores', 'proxy', 'web_preview', 'contact_sheet', 'hls')
+JOB_OPTIONS = ('width', 'height', 'quality', 'workers', 'batch_size', 'incremental', 'segments', 'segment_size',
+               'start_frame', 'end_frame', 'chunks', 'chunk_size', 'stream', 'engine', 'rungs', 'thumbs',
+               'segment_type', 'segment_time')
+ENGINES = ('magick', 'pillow')
+# characters a posted path can't contain, it's put on a shell command line unquoted.  Backslashes separate folders
+# on windows.
+UNSAFE_PATH = re.compile(r'[\s;&|`$<>(){}\[\]*?!"\'%s]' % ('' if os.name == 'nt' else r'\\'))
+
+
+def _ignored(name):
+    # manifests, segment folders and other working files start with a dot.
+    return name.startswith('.')
+
+
+class InotifyWatcher(object):
+    """
+    reports files that changed in a set of folders, using linux's inotify through ctypes.
+    """
+
+    def __init__(self, paths, recursive=True):
+        self.paths = paths
+        self.recursive = recursive
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init()
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init failed')
+        self._dirs = {}
+        for path in paths:
+            self.add(path)
+
+    @staticmethod
+    def available():
+        if not sys.platform.startswith('linux'):
+            return False
+        try:
+            return hasattr(ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6'), 'inotify_init')
+        except OSError:
+            return False
+
+    def add(self, path):
+        wd = self._libc.inotify_add_watch(self._fd, _encode(path), WATCH_MASK)
+        if wd < 0:
+            logging.error('Could not watch %s: %s' % (path, os.strerror(ctypes.get_errno())))
+            return
+        self._dirs[wd] = path
+        if self.recursive:
+            for name in os.listdir(path):
+                sub = os.path.join(path, name)
+                if not _ignored(name) and os.path.isdir(sub):
+                    self.add(sub)
+
+    def poll(self, timeout):
+        """
+        :return: list of files that changed, waiting up to timeout seconds for the first one
+        """
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        data = os.read(self._fd, 65536)
+        changed = []
+        offset = 0
+        while offset + EVENT.size <= len(data):
+            wd, mask, cookie, length = EVENT.unpack_from(data, offset)
+            name = data[offset + EVENT.size:offset + EVENT.size + length].rstrip(b'\0')
+            offset += EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                logging.warning('inotify queue overflowed, rescanning %s' % ', '.join(self.paths))
+                return self.rescan()
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            name = _decode(name)
+            if not directory or not name or _ignored(name):
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if self.recursive and mask & (IN_CREATE | IN_MOVED_TO):
+                    self.add(path)
+                    # files can land in a new folder before it's watched.
+                    changed.extend([os.path.join(path, f) for f in os.listdir(path) if not _ignored(f)])
+                continue
+            changed.append(path)
+        return changed
+
+    def rescan(self):
+        """
+        watches any folders that were missed, for when events were lost.
+        :return: list of every file in the watched folders
+        """
+        files = []
+        for path in self.paths:
+            self.add(path)
+            for root, dirs, names in os.walk(path):
+                dirs[:] = [d for d in dirs if not _ignored(d)] if self.recursive else []
+                files.extend([os.path.join(root, name) for name in names if not _ignored(name)])
+        return files
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher(object):
+    """
+    reports files that changed in a set of folders by comparing their size and mtime between scans.
+    """
+
+    def __init__(self, paths, recursive=True, interval=POLL_INTERVAL):
+        self.paths = paths
+        self.recursive = recursive
+        self.interval = interval
+        self._last_scan = 0
+        self._files = self._scan()
+
+    def _scan(self):
+        files = {}
+        for path in self.paths:
+            for root, dirs, names in os.walk(path):
+                dirs[:] = [d for d in dirs if not _ignored(d)] if self.recursive else []
+                for name in names:
+                    if _ignored(name):
+                        continue
+                    full = os.path.join(root, name)
+                    try:
+                        stat = os.stat(full)
+                    except OSError:
+                        continue
+                    files[full] = (stat.st_size, stat.st_mtime)
+        self._last_scan = time.time()
+        return files
+
+    def poll(self, timeout):
+        wait = self._last_scan + self.interval - time.time()
+        if wait > 0:
+            time.sleep(min(wait, timeout))
+            if time.time() < self._last_scan + self.interval:
+                return []
+        files = self._scan()
+        changed = [f for f in files if self._files.get(f) != files[f]]
+        self._files = files
+        return changed
+
+    def close(self):
+        pass
+
+
+def _encode(path):
+    if isinstance(path, bytes):
+        return path
+    return path.encode(sys.getfilesystemencoding() or 'utf-8')
+
+
+def _decode(name):
+    if isinstance(name, str):
+        return name
+    return name.decode(sys.getfilesystemencoding() or 'utf-8', 'replace')
+
+
+class Debouncer(object):
+    """
+    holds back keys until they've gone settle seconds without being touched, so files still being written, and
+    sequences still receiving frames, are only converted once they're complete.
+    """
+
+    def __init__(self, settle=DEFAULT_SETTLE):
+        self.settle = settle
+        self._touched = {}
+
+    def touch(self, key, value):
+        self._touched[key] = (time.time(), value)
+
+    def ready(self):
+        """
+        :return: list of (key, value) that have settled, they're forgotten once returned.
+        """
+        now = time.time()
+        settled = [(k, v[1]) for k, v in self._touched.items() if now - v[0] >= self.settle]
+        for key, value in settled:
+            del self._touched[key]
+        return settled
+
+    def __len__(self):
+        return len(self._touched)
+
+
+def validate_job(job):
+    """
+    checks a job submitted over HTTP before it's queued.
+    :return: what's wrong with the job, None if it can be run
+    """
+    if not isinstance(job, dict) or not job.get('input_file'):
+        return 'input_file is required'
+    unknown = [k for k in job if k not in ('input_file', 'output_file', 'file_type', 'conversion_type', 'options')]
+    if unknown:
+        return 'unknown fields: %s' % ', '.join(sorted(unknown))
+    for key in ('input_file', 'output_file'):
+        path = job.get(key)
+        if path is None:
+            continue
+        if not isinstance(path, string_types) or UNSAFE_PATH.search(path):
+            return '%s must be a path without whitespace or shell characters' % key
+    file_type = job.get('file_type') or 'movie'
+    if file_type not in JOB_TYPES:
+        return 'file_type must be one of %s' % ', '.join(JOB_TYPES)
+    if file_type == 'sequence':
+        if not find_sequence(job['input_file']):
+            return 'no frames found for %s' % job['input_file']
+    elif not os.path.isfile(job['input_file']):
+        return '%s does not exist' % job['input_file']
+    conversion_type = job.get('conversion_type') or 'web_preview'
+    if not isinstance(conversion_type, string_types) or [c for c in conversion_type.split(',')
+                                                         if c not in JOB_CONVERSIONS]:
+        return 'conversion_type must be one or more of %s' % ', '.join(JOB_CONVERSIONS)
+    options = job.get('options') or {}
+    if not isinstance(options, dict):
+        return 'options must be an object'
+    for key, value in options.items():
+        if key not in JOB_OPTIONS:
+            return 'unknown option %s, options: %s' % (key, ', '.join(JOB_OPTIONS))
+        if key == 'engine':
+            ok = value in ENGINES
+        elif key == 'segment_type':
+            ok = value in convert.HLS_SEGMENT_TYPES
+        elif key == 'rungs':
+            ok = value is None or (isinstance(value, list) and not [r for r in value if r not in convert.OPTIONS])
+        else:
+            ok = value is None or isinstance(value, (bool, int, float))
+        if not ok:
+            return 'bad value for option %s: %r' % (key, value)
+
+
+class ConvertDaemon(object):
+    """
+    watches folders and serves an HTTP endpoint, running the resulting jobs on a pool of worker threads.
+    """
+
+    def __init__(self, watch=(), workers=2, port=DEFAULT_PORT, host='127.0.0.1', settle=DEFAULT_SETTLE,
+                 polling=False):
+        """
+        :param watch: list of watch rules, dicts with path, output, recursive and the conversion types to run for
+        each movie and sequence that arrives.  output defaults to OUTPUT_FOLDER inside path.
+        :param workers: number of jobs run at the same time
+        :param port: port of the HTTP endpoint, 0 to run without one
+        :param host: address the HTTP endpoint listens on
+        :param settle: seconds a file or sequence has to go unchanged before it's converted
+        :param polling: poll folders even where inotify is available
+        """
+        self.rules = []
+        for rule in watch:
+            path = os.path.abspath(rule['path'])
+            # outputs written next to their inputs would be picked up and converted again.
+            output = os.path.abspath(rule.get('output') or os.path.join(path, OUTPUT_FOLDER))
+            self.rules.append(dict(rule, path=path, output=output))
+        self.workers = workers
+        self.port = port
+        self.host = host
+        self.debouncer = Debouncer(settle)
+        self.polling = polling
+        self._queue = queue.Queue()
+        self._jobs = collections.OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._stop = threading.Event()
+        self._threads = []
+        self._server = None
+        self._watcher = None
+
+    def submit(self, job, source='http'):
+        """
+        queues a job.  A job identical to one still waiting in the queue is coalesced with it.
+        :param job: job dict (see convert.run_job)
+        :param source: where the job came from, 'http' or 'watch'
+        :return: the job's record
+        """
+        key = json.dumps([job.get('input_file'), job.get('output_file'), job.get('file_type'),
+                          job.get('conversion_type'), job.get('options')], sort_keys=True)
+        with self._lock:
+            if key in self._pending:
+                return dict(self._jobs[self._pending[key]])
+            record = {'id': str(self._next_id), 'job': job, 'source': source, 'status': 'queued',
+                      'submitted': time.time(), 'started': None, 'finished': None, 'error': None, 'file_out': None}
+            self._next_id += 1
+            self._jobs[record['id']] = record
+            self._pending[key] = record['id']
+            self._prune()
+        self._queue.put((key, record['id']))
+        return dict(record)
+
+    def _prune(self):
+        finished = [i for i, r in self._jobs.items() if r['status'] in ('done', 'failed')]
+        for job_id in finished[:max(0, len(finished) - JOB_HISTORY)]:
+            del self._jobs[job_id]
+
+    def job(self, job_id):
+        with self._lock:
+            record = self._jobs.get(job_id)
+            return dict(record) if record else None
+
+    def jobs(self):
+        with self._lock:
+            return [dict(r) for r in self._jobs.values()]
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            key, job_id = item
+            with self._lock:
+                self._pending.pop(key, None)
+                record = self._jobs[job_id]
+                record['status'] = 'running'
+                record['started'] = time.time()
+            try:
+                result = convert.run_job(record['job'])
+            except Exception as e:
+                logging.exception('Job %s failed' % job_id)
+                status, error, file_out = 'failed', str(e), None
+            else:
+                error = convert.job_error(result)
+                status = 'failed' if error else 'done'
+                file_out = result.get('file_out') if isinstance(result, dict) else result
+            with self._lock:
+                record.update({'status': status, 'error': error, 'file_out': file_out, 'finished': time.time()})
+
+    def _rule_for(self, path):
+        for rule in self.rules:
+            if path.startswith(rule['path'] + os.sep):
+                return rule
+
+    def _outputs(self):
+        return [r['output'] + os.sep for r in self.rules]
+
+    def watch_once(self, timeout=1.0):
+        """
+        collects changed files for up to timeout seconds and queues the jobs for anything that has settled.
+        """
+        outputs = self._outputs()
+        for path in self._watcher.poll(timeout):
+            # outputs written into a watched folder shouldn't trigger more conversions.
+            if [o for o in outputs if path.startswith(o)] or not os.path.isfile(path):
+                continue
+            rule = self._rule_for(path)
+            if rule:
+                key, file_type, input_file = source_key(path)
+                self.debouncer.touch(key, (file_type, input_file, rule))
+        for key, (file_type, input_file, rule) in self.debouncer.ready():
+            for job in jobs_for(input_file, file_type, rule):
+                self.submit(job, source='watch')
+
+    def start(self):
+        get_scheduler().concurrency = max(1, self.workers)
+        for _ in range(max(1, self.workers)):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        if self.port:
+            self._server = _Server((self.host, self.port), _Handler)
+            self._server.convert_daemon = self
+            thread = threading.Thread(target=self._server.serve_forever)
+            thread.daemon = True
+            thread.start()
+            logging.info('Accepting jobs on http://%s:%s/jobs' % (self.host, self._server.server_address[1]))
+        paths = [r['path'] for r in self.rules]
+        recursive = any([r.get('recursive', True) for r in self.rules])
+        if paths:
+            if not self.polling and InotifyWatcher.available():
+                self._watcher = InotifyWatcher(paths, recursive=recursive)
+            else:
+                self._watcher = PollingWatcher(paths, recursive=recursive)
+            logging.info('Watching %s with %s' % (', '.join(paths), type(self._watcher).__name__))
+
+    def serve_forever(self):
+        self.start()
+        while not self._stop.is_set():
+            if self._watcher:
+                try:
+                    self.watch_once()
+                except (IOError, OSError) as e:
+                    if e.errno != errno.EINTR:
+                        raise
+            else:
+                self._stop.wait(1.0)
+        self.close()
+
+    def stop(self, *args):
+        self._stop.set()
+
+    def close(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+        if self._watcher:
+            self._watcher.close()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    POST /jobs queues a job dict, GET /jobs lists jobs, GET /jobs/<id> returns one.
+    """
+
+    def _reply(self, code, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _parts(self):
+        return [p for p in self.path.split('?')[0].split('/') if p]
+
+    def do_GET(self):
+        parts = self._parts()
+        daemon = self.server.convert_daemon
+        if parts == ['jobs']:
+            self._reply(200, daemon.jobs())
+        elif len(parts) == 2 and parts[0] == 'jobs' and daemon.job(parts[1]):
+            self._reply(200, daemon.job(parts[1]))
+        else:
+            self._reply(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self._parts() != ['jobs']:
+            self._reply(404, {'error': 'not found'})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            job = json.loads(self.rfile.read(length).decode('utf-8'))
+        except ValueError:
+            self._reply(400, {'error': 'body is not json'})
+            return
+        error = validate_job(job)
+        if error:
+            self._reply(400, {'error': error})
+            return
+        self._reply(202, self.server.convert_daemon.submit(job, source='http'))
+
+    def log_message(self, format, *args):
+        logging.debug('%s %s' % (self.address_string(), format % args))
+
+
+@click.command()
+@click.option('--config', '-c', default=None, help='json file of watch rules and daemon settings')
+@click.option('--workers', '-wk', default=None, type=int, help='number of jobs run at the same time')
+@click.option('--port', '-p', default=None, type=int, help='port of the job endpoint, 0 to disable it')
+@click.option('--settle', '-s', default=None, type=float,
+              help='seconds files have to go unchanged before they are converted')
+@click.option('--polling', is_flag=True, default=False, help='poll watched folders instead of using inotify')
+def main(config, workers, port, settle, polling):
+    settings = {}
+    if config:
+        with open(config) as f:
+            settings = json.load(f)
+    logging.basicConfig(level=logging.INFO)
+    daemon = ConvertDaemon(watch=settings.get('watch', []),
+                           workers=workers or settings.get('workers', 2),
+                           port=port if port is not None else settings.get('port', DEFAULT_PORT),
+                           host=settings.get('host', '127.0.0.1'),
+                           settle=settle if settle is not None else settings.get('settle', DEFAULT_SETTLE),
+                           polling=polling or settings.get('polling', False))
+    signal.signal(signal.SIGINT, daemon.stop)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    daemon.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Turns the files that show up in a folder, a glob or a watched folder into conversion jobs.
+
+Shared by the watch-folder daemon and batch mode.  Jobs are dicts run by convert.run_job:
+
+    {'input_file': 'shot.mov', 'output_file': 'shot.mp4', 'file_type': 'movie', 'conversion_type': 'mp4',
+     'options': {'incremental': True}}
+"""
+import logging
+import os
+
+from convert import convert
+from convert.config import CONFIG
+from convert.sequence_index import FRAME_REGEX, find_sequence
+
+# conversions convert_file runs on sequences, everything else in a rule applies to movies.
+SEQUENCE_TYPES = ('proxy', 'web_preview')
+# folder outputs go to when a watch rule or batch doesn't give one.
+OUTPUT_FOLDER = 'converted'
+
+
+def source_key(path):
+    """
+    :return: (key, file_type, input_file) for a changed file.  Frames of a sequence share the sequence as their key.
+    """
+    match = FRAME_REGEX.match(os.path.basename(path))
+    if match:
+        file_type = CONFIG.ext_map.get('.%s' % match.group('ext'))
+        if file_type in ('image', 'sequence'):
+            hash_sequence = os.path.join(os.path.dirname(path), '%s%s.%s' % (match.group('prefix'),
+                                                                             '#' * len(match.group('frame')),
+                                                                             match.group('ext')))
+            return hash_sequence, 'sequence', hash_sequence
+    return path, convert.get_file_type(path), path
+
+
+def jobs_for(input_file, file_type, rule):
+    """
+    works out the jobs a watch rule asks for when input_file arrives.  Movie outputs that RenderPlan can make are
+    coalesced into a single job, so the movie is only decoded once.
+    :param input_file: movie, or sequence formatted with #
+    :param file_type: 'movie' or 'sequence'
+    :param rule: watch rule from the config
+    :return: list of job dicts (see convert.run_job), jobs that would write over input_file are left out
+    """
+    output_dir = rule.get('output') or os.path.dirname(input_file)
+    conversion_types = rule.get(file_type) or []
+    jobs = []
+    if file_type == 'sequence':
+        sequence = find_sequence(input_file)
+        if not sequence:
+            return []
+        name = sequence.prefix.rstrip('._') or 'sequence'
+        for conversion_type in conversion_types:
+            if conversion_type not in SEQUENCE_TYPES:
+                continue
+            if conversion_type == 'proxy':
+                output_file = os.path.join(output_dir, 'proxy', '%s%s.jpg' % (sequence.prefix, '#' * sequence.padding))
+            elif conversion_type == 'web_preview':
+                output_file = os.path.join(output_dir, '%s.mp4' % name)
+            else:
+                output_file = None
+            jobs.append({'input_file': input_file, 'output_file': output_file, 'file_type': 'sequence',
+                         'conversion_type': conversion_type, 'options': {'incremental': True}})
+    elif file_type == 'movie':
+        base = os.path.join(output_dir, os.path.splitext(os.path.basename(input_file))[0])
+        plan = [c for c in conversion_types if c in convert.RenderPlan.TARGETS]
+        if len(plan) > 1:
+            # convert_file takes the RenderPlan's output base from the output file name.
+            jobs.append({'input_file': input_file, 'output_file': '%s.mov' % base, 'file_type': 'movie',
+                         'conversion_type': ','.join(plan)})
+        elif plan:
+            jobs.append({'input_file': input_file, 'output_file': convert.RenderPlan(input_file, base).default_output(
+                plan[0]), 'file_type': 'movie', 'conversion_type': plan[0]})
+        for conversion_type in conversion_types:
+            if conversion_type in plan or conversion_type in SEQUENCE_TYPES:
+                continue
+            if conversion_type == 'hls':
+                output_file = '%s_hls' % base
+            elif conversion_type == 'contact_sheet':
+                output_file = '%s_sheet.jpg' % base
+            else:
+                output_file = None
+            jobs.append({'input_file': input_file, 'output_file': output_file, 'file_type': 'movie',
+                         'conversion_type': conversion_type})
+    safe = []
+    for job in jobs:
+        if [o for o in _job_outputs(job) if convert.same_file(input_file, o)]:
+            logging.warning('Skipping %s of %s, it would write over its input' % (job['conversion_type'], input_file))
+        else:
+            safe.append(job)
+    return safe
+
+
+def _job_outputs(job):
+    if job['output_file'] and ',' in job['conversion_type']:
+        plan = convert.RenderPlan(job['input_file'], os.path.splitext(job['output_file'])[0])
+        return [plan.default_output(t) for t in job['conversion_type'].split(',')]
+    if job['output_file']:
+        return [job['output_file']]
+    if job['conversion_type'] in ('mp4', 'audio'):
+        # convert_to_mp4 names outputs after the input.
+        return [convert.change_extension(job['input_file'], 'mp4')]
+    return []
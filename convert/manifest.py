@@ -0,0 +1,136 @@
+"""
+Persistent manifest of conversions, used for incremental conversion.
+
+A manifest lives next to the outputs it describes and records, for each output, the fingerprint of every input
+(size, mtime and optionally a content hash) along with the parameters used to create it.  An output is up to date
+when it exists and neither its inputs nor its parameters have changed since it was recorded.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+
+MANIFEST_NAME = '.cgl_convert_manifest.json'
+
+
+def fingerprint(path, content_hash=False):
+    """
+    returns the fingerprint of a file on disk.
+    :param path: path to the file
+    :param content_hash: if True include a sha1 of the file contents
+    :return: dict with size, mtime and optionally hash
+    """
+    stat = os.stat(path)
+    fp = {'size': stat.st_size, 'mtime': stat.st_mtime}
+    if content_hash:
+        fp['hash'] = hash_file(path)
+    return fp
+
+
+def hash_file(path, block_size=1024 * 1024):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        block = f.read(block_size)
+        while block:
+            sha.update(block)
+            block = f.read(block_size)
+    return sha.hexdigest()
+
+
+def _normalize(params):
+    # round trip through json so tuples/lists and key order compare the same as what we read back from disk.
+    return json.loads(json.dumps(params, sort_keys=True))
+
+
+class Manifest(object):
+    """
+    Conversion records for all outputs in a single directory.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, MANIFEST_NAME)
+        self.entries = self._read()
+        self._changed = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_output(cls, output):
+        """
+        returns the manifest that records the given output file.
+        """
+        return cls(os.path.dirname(os.path.abspath(output)))
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            logging.warning('Could not read conversion manifest %s, starting a new one' % self.path)
+            return {}
+
+    def _key(self, output):
+        return os.path.basename(output)
+
+    def is_current(self, output, inputs, params, content_hash=False):
+        """
+        checks if an output exists and was made from the same inputs with the same params.
+        :param output: path to the output file
+        :param inputs: list of input file paths
+        :param params: json serializable conversion parameters
+        :param content_hash: if size or mtime of an input changed, compare content hashes before giving up.
+        :return: True if the output doesn't need to be converted again
+        """
+        entry = self.entries.get(self._key(output))
+        if not entry or not os.path.exists(output):
+            return False
+        if entry.get('params') != _normalize(params):
+            return False
+        recorded = entry.get('inputs', {})
+        if sorted(recorded.keys()) != sorted(inputs):
+            return False
+        for path in inputs:
+            if not os.path.exists(path):
+                return False
+            current = fingerprint(path)
+            previous = recorded[path]
+            if current['size'] == previous['size'] and current['mtime'] == previous['mtime']:
+                continue
+            if content_hash and previous.get('hash') and current['size'] == previous['size']:
+                if hash_file(path) == previous['hash']:
+                    continue
+            return False
+        return True
+
+    def record(self, output, inputs, params, content_hash=False):
+        """
+        records an output as converted, call save() to write it to disk.
+        """
+        entry = {'inputs': dict((path, fingerprint(path, content_hash)) for path in inputs),
+                 'params': _normalize(params)}
+        with self._lock:
+            self.entries[self._key(output)] = entry
+            self._changed[self._key(output)] = entry
+
+    def save(self):
+        """
+        writes recorded entries to disk, merged with anything other processes have written since we read it.
+        """
+        with self._lock:
+            if not self._changed:
+                return
+            entries = self._read()
+            entries.update(self._changed)
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
+            tmp = '%s.%s.tmp' % (self.path, os.getpid())
+            with open(tmp, 'w') as f:
+                json.dump(entries, f, indent=1, sort_keys=True)
+            if os.path.exists(self.path) and os.name == 'nt':
+                os.remove(self.path)
+            os.rename(tmp, self.path)
+            self.entries = entries
+            self._changed = {}
@@ -0,0 +1,189 @@
+"""
+Timing and progress for the commands conversions run.
+
+StepTimer measures wall time, child cpu time and bytes written for a step.  FfmpegProgress adds -progress to an ffmpeg
+command and reads the key=value report ffmpeg writes while it runs, giving frames, fps and speed, optionally passing
+each report to a callback as it arrives.
+"""
+import logging
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+
+def _children_cpu_time():
+    if not resource:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _bytes_written(outputs):
+    total = 0
+    for output in outputs:
+        if os.path.isfile(output):
+            total += os.path.getsize(output)
+    return total
+
+
+class StepTimer(object):
+    """
+    times a conversion step:
+
+        with StepTimer('resize', outputs=frames_out, frames=len(frames_out)) as timer:
+            ...
+        timer.metrics
+
+    cpu_time is the cpu used by child processes that finished during the step, so steps running concurrently in
+    other threads of the same process are included.
+    """
+
+    def __init__(self, step, outputs=(), frames=None):
+        self.step = step
+        self.outputs = outputs
+        self.metrics = {'step': step, 'frames': frames}
+        self._start = None
+        self._cpu = None
+
+    def __enter__(self):
+        self._start = time.time()
+        self._cpu = _children_cpu_time()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        wall_time = time.time() - self._start
+        cpu = _children_cpu_time()
+        self.metrics['wall_time'] = wall_time
+        self.metrics['cpu_time'] = cpu - self._cpu if cpu is not None else None
+        if self.metrics.get('bytes_written') is None:
+            self.metrics['bytes_written'] = _bytes_written(self.outputs)
+        if self.metrics['frames'] and wall_time:
+            self.metrics.setdefault('fps', self.metrics['frames'] / wall_time)
+        return False
+
+
+class FfmpegProgress(object):
+    """
+    reads ffmpeg's -progress report while the command runs:
+
+        progress = FfmpegProgress(callback)
+        command = progress.instrument(command, PATHS['ffmpeg'])
+        with progress:
+            cgl_execute(command)
+        progress.metrics
+    """
+
+    def __init__(self, callback=None, interval=0.5):
+        """
+        :param callback: called with a dict (frame, fps, speed, out_time, total_size, progress) every time ffmpeg
+        reports progress.
+        :param interval: seconds between reads of the progress file
+        """
+        self.callback = callback
+        self.interval = interval
+        fd, self.path = tempfile.mkstemp(suffix='.ffprogress')
+        os.close(fd)
+        self.report = {}
+        self._offset = 0
+        self._buffer = ''
+        self._stop = threading.Event()
+        self._thread = None
+
+    def instrument(self, command, ffmpeg):
+        """
+        :param command: ffmpeg command
+        :param ffmpeg: the ffmpeg executable the command starts with
+        :return: command, writing its progress to this object's file
+        """
+        if not command.startswith(ffmpeg):
+            logging.warning('Not an ffmpeg command, progress not available: %s' % command)
+            return command
+        return '%s -progress %s%s' % (ffmpeg, self.path, command[len(ffmpeg):])
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._watch)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop.set()
+        self._thread.join()
+        self._read()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        return False
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            self._read()
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as f:
+                f.seek(self._offset)
+                data = f.read()
+                self._offset = f.tell()
+        except (IOError, OSError):
+            return
+        self._buffer += data
+        lines = self._buffer.split('\n')
+        self._buffer = lines.pop()
+        for line in lines:
+            if '=' not in line:
+                continue
+            key, value = line.split('=', 1)
+            self.report[key.strip()] = value.strip()
+            if key == 'progress' and self.callback:
+                try:
+                    self.callback(self.snapshot())
+                except Exception as e:
+                    logging.error('Progress callback failed: %s' % e)
+
+    def snapshot(self):
+        """
+        :return: the latest progress report as numbers
+        """
+        report = self.report
+        speed = report.get('speed', '').rstrip('x')
+        out_time = report.get('out_time_us') or report.get('out_time_ms')
+        return {'frame': _number(report.get('frame'), int),
+                'fps': _number(report.get('fps'), float),
+                'speed': _number(speed, float),
+                'out_time': _number(out_time, float) / 1000000.0 if _number(out_time, float) else None,
+                'total_size': _number(report.get('total_size'), int),
+                'progress': report.get('progress')}
+
+    @property
+    def metrics(self):
+        """
+        :return: frames, fps, speed and bytes_written of the finished command
+        """
+        snapshot = self.snapshot()
+        return {'frames': snapshot['frame'], 'encode_fps': snapshot['fps'], 'speed': snapshot['speed'],
+                'out_time': snapshot['out_time'], 'bytes_written': snapshot['total_size']}
+
+
+def _number(value, type_):
+    try:
+        return type_(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def add_metrics(process_info, metrics):
+    """
+    appends step metrics to process_info['metrics'], which is persisted with the rest of process_info by
+    write_to_cgl_data.
+    """
+    if process_info is None:
+        return
+    process_info.setdefault('metrics', []).append(metrics)
@@ -0,0 +1,193 @@
+"""
+Media probing with a persistent metadata cache.
+
+ffprobe is run once per file and its output is reduced to the handful of things conversions care about (duration,
+frame rate, resolution, codecs, audio layout, start timecode).  Results are kept in a local SQLite database keyed by
+path, size and mtime, so pipeline steps that look at the same files over and over don't pay for ffprobe every time.
+"""
+import json
+import logging
+import os
+import sqlite3
+import subprocess
+
+CACHE_PATH = os.environ.get('CGL_PROBE_CACHE',
+                            os.path.join(os.path.expanduser('~'), '.cgl_convert', 'probe_cache.sqlite'))
+
+
+class ProbeCache(object):
+    """
+    SQLite store of probe results.  A connection is opened per call, so a cache can be shared between threads and
+    processes.
+    """
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('CREATE TABLE IF NOT EXISTS probe '
+                             '(path TEXT PRIMARY KEY, size INTEGER, mtime REAL, data TEXT)')
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, path, size, mtime):
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT data FROM probe WHERE path=? AND size=? AND mtime=?',
+                               (path, size, mtime)).fetchone()
+        finally:
+            conn.close()
+        if row:
+            return json.loads(row[0])
+
+    def put(self, path, size, mtime, data):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO probe (path, size, mtime, data) VALUES (?, ?, ?, ?)',
+                             (path, size, mtime, json.dumps(data)))
+        finally:
+            conn.close()
+
+    def clear(self):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('DELETE FROM probe')
+        finally:
+            conn.close()
+
+
+_CACHES = {}
+
+
+def get_cache(path=CACHE_PATH):
+    if path not in _CACHES:
+        _CACHES[path] = ProbeCache(path)
+    return _CACHES[path]
+
+
+def _rate(value):
+    """
+    turns an ffprobe rational ('24000/1001') into a float.
+    """
+    if not value or value == '0/0':
+        return None
+    if '/' in value:
+        num, den = value.split('/')
+        return float(num) / float(den) if float(den) else None
+    return float(value)
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_probe(raw):
+    """
+    reduces ffprobe's json output to the metadata conversions use.
+    :param raw: dict of ffprobe -show_format -show_streams output
+    :return: dict
+    """
+    fmt = raw.get('format', {})
+    streams = raw.get('streams', [])
+    video = [s for s in streams if s.get('codec_type') == 'video' and
+             not s.get('disposition', {}).get('attached_pic')]
+    audio = [s for s in streams if s.get('codec_type') == 'audio']
+    info = {'format_name': fmt.get('format_name'),
+            'duration': _float(fmt.get('duration')),
+            'bit_rate': _float(fmt.get('bit_rate')),
+            'has_video': bool(video),
+            'has_audio': bool(audio),
+            'audio_streams': len(audio),
+            'start_timecode': fmt.get('tags', {}).get('timecode')}
+    info.update(dict.fromkeys(['video_codec', 'pix_fmt', 'width', 'height', 'frame_rate', 'frames', 'audio_codec',
+                               'audio_channels', 'audio_layout', 'sample_rate']))
+    if video:
+        v = video[0]
+        info.update({'video_codec': v.get('codec_name'),
+                     'pix_fmt': v.get('pix_fmt'),
+                     'width': v.get('width'),
+                     'height': v.get('height'),
+                     'frame_rate': _rate(v.get('avg_frame_rate')) or _rate(v.get('r_frame_rate')),
+                     'frames': int(v['nb_frames']) if v.get('nb_frames', '').isdigit() else None})
+        if not info['start_timecode']:
+            info['start_timecode'] = v.get('tags', {}).get('timecode')
+        if info['duration'] is None:
+            info['duration'] = _float(v.get('duration'))
+    if audio:
+        a = audio[0]
+        info.update({'audio_codec': a.get('codec_name'),
+                     'audio_channels': a.get('channels'),
+                     'audio_layout': a.get('channel_layout'),
+                     'sample_rate': int(a['sample_rate']) if a.get('sample_rate') else None})
+    if not info['start_timecode']:
+        for s in streams:
+            if s.get('tags', {}).get('timecode'):
+                info['start_timecode'] = s['tags']['timecode']
+                break
+    return info
+
+
+def run_ffprobe(path, ffprobe='ffprobe'):
+    """
+    :return: ffprobe's json output for path as a dict, None if ffprobe failed
+    """
+    command = [ffprobe, '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', path]
+    try:
+        p = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        logging.error('Could not run %s: %s' % (ffprobe, e))
+        return None
+    out, err = p.communicate()
+    if p.returncode != 0:
+        logging.error('ffprobe failed on %s: %s' % (path, err.decode('utf-8', 'replace').strip()))
+        return None
+    return json.loads(out.decode('utf-8'))
+
+
+def probe(path, ffprobe='ffprobe', cache=True, cache_path=CACHE_PATH):
+    """
+    returns metadata for a media file, from the cache if the file hasn't changed since it was last probed.
+    :param path: media file to probe
+    :param ffprobe: path to the ffprobe executable
+    :param cache: read and write the probe cache
+    :param cache_path: location of the SQLite cache
+    :return: dict of metadata (see parse_probe), None if the file couldn't be probed
+    """
+    path = os.path.abspath(path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        logging.error('Can not probe %s, file does not exist' % path)
+        return None
+    store = None
+    if cache:
+        try:
+            store = get_cache(cache_path)
+            info = store.get(path, stat.st_size, stat.st_mtime)
+            if info:
+                return info
+        except (sqlite3.Error, OSError) as e:
+            logging.warning('Probe cache %s unavailable: %s' % (cache_path, e))
+            store = None
+    raw = run_ffprobe(path, ffprobe)
+    if raw is None:
+        return None
+    info = parse_probe(raw)
+    if store:
+        try:
+            store.put(path, stat.st_size, stat.st_mtime, info)
+        except sqlite3.Error as e:
+            logging.warning('Could not write to probe cache %s: %s' % (cache_path, e))
+    return info
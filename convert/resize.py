@@ -0,0 +1,107 @@
+"""
+In-process image resizing for proxies.
+
+Starting a magick process per frame costs more than the resize itself at small proxy resolutions.  PillowResizer
+decodes, resizes and writes frames inside the current process (Pillow releases the GIL while it works, so a thread
+pool runs frames in parallel), and reports the frames it can't handle so they can be handed to magick instead.
+Pillow is optional, without it every frame goes to magick.  It's imported the first time a frame is resized, so
+importing the conversions doesn't pay for it.
+"""
+import logging
+import os
+import re
+import threading
+
+# formats Pillow reads reliably, exr, dpx and friends go to magick.
+PILLOW_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tif', '.tiff', '.tga', '.bmp', '.webp')
+PILLOW_MODES = ('1', 'L', 'LA', 'P', 'RGB', 'RGBA', 'CMYK', 'YCbCr')
+GEOMETRY_REGEX = re.compile(r'^(?P<width>\d+)?(x(?P<height>\d+))?$')
+
+# PIL.Image once it's been imported, False if Pillow isn't installed.
+_image = None
+
+
+def _pil_image():
+    global _image
+    if _image is None:
+        try:
+            from PIL import Image
+            _image = Image
+        except ImportError:
+            _image = False
+    return _image or None
+
+
+def available():
+    return _pil_image() is not None
+
+
+def target_size(size, res):
+    """
+    works out the output size the way magick's -resize geometry does.
+    :param size: (width, height) of the source
+    :param res: '1920' scales to a width of 1920, 'x1080' to a height of 1080, '1920x1080' fits within both, all
+    keeping the aspect ratio.
+    :return: (width, height)
+    """
+    match = GEOMETRY_REGEX.match(str(res))
+    if not match or not (match.group('width') or match.group('height')):
+        raise ValueError('Unsupported resize geometry: %s' % res)
+    src_w, src_h = size
+    scales = []
+    if match.group('width'):
+        scales.append(float(match.group('width')) / src_w)
+    if match.group('height'):
+        scales.append(float(match.group('height')) / src_h)
+    scale = min(scales)
+    # rounded half up like magick, round() rounds half to even on python 3.
+    return max(1, int(src_w * scale + 0.5)), max(1, int(src_h * scale + 0.5))
+
+
+class PillowResizer(object):
+    """
+    resizes frames to one geometry.  Output sizes are worked out once per source size and shared between threads, and
+    jpeg sources are decoded at a reduced scale (draft mode) so large plates never need a full size buffer.
+    """
+
+    def __init__(self, res, quality=92):
+        self.res = res
+        self.quality = quality
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def can_read(self, file_in):
+        return available() and os.path.splitext(file_in)[-1].lower() in PILLOW_EXTENSIONS
+
+    def size_for(self, size):
+        if size not in self._sizes:
+            with self._lock:
+                self._sizes[size] = target_size(size, self.res)
+        return self._sizes[size]
+
+    def resize(self, file_in, file_out):
+        """
+        :return: True if the frame was written, False if Pillow can't handle it and it should go to magick.
+        """
+        if not self.can_read(file_in):
+            return False
+        Image = _pil_image()
+        try:
+            image = Image.open(file_in)
+            size = self.size_for(image.size)
+            if image.format == 'JPEG':
+                image.draft('RGB', size)
+            if image.mode not in PILLOW_MODES:
+                # high bit depth modes lose range when Pillow converts them, magick does it properly.
+                return False
+            ext = os.path.splitext(file_out)[-1].lower()
+            if ext in ('.jpg', '.jpeg') and image.mode != 'RGB':
+                image = image.convert('RGB')
+            if image.size != size:
+                image = image.resize(size, Image.LANCZOS, reducing_gap=3.0)
+            kwargs = {'quality': self.quality} if ext in ('.jpg', '.jpeg') else {}
+            image.save(file_out, **kwargs)
+            return True
+        except (IOError, OSError, ValueError) as e:
+            logging.warning('Pillow could not resize %s, handing it to magick: %s' % (file_in, e))
+            return False
@@ -0,0 +1,239 @@
+"""
+Shares the machine between the ffmpeg and magick processes conversions start locally.
+
+Left alone every encoder sizes its thread pool to the whole machine and magick caches as much as it likes, so a few
+conversions running at once oversubscribe the cores and spike memory.  Before a command starts it reserves a slot:
+a thread budget and a predicted memory use.  The budget is worked out when the slot is granted, the cores divided
+between the command, the commands already running and those waiting (or the jobs a runner says it runs at once, if
+that's more), so a command on its own gets the whole machine and commands started from separate threads run side by
+side with smaller budgets.  Slots wait while memory is short or every core already has a command, and the command is
+rewritten to stay inside its budget (ffmpeg -threads/-filter_threads, which sizes libx264's threads, magick -limit
+thread/memory/map), optionally pinned to its own cores with taskset.
+
+    scheduler = get_scheduler()
+    with scheduler.reserve(share=workers, memory=MAGICK_MEMORY) as slot:
+        cgl_execute(slot.wrap(command, ffmpeg=PATHS['ffmpeg'], magick=PATHS['magick']))
+"""
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+
+MB = 1024 * 1024
+# predicted memory of a single command, used for admission and magick's -limit memory.
+FFMPEG_MEMORY = 512 * MB
+MAGICK_MEMORY = 256 * MB
+# fraction of the memory available when the scheduler starts that commands may use between them.
+MEMORY_FRACTION = 0.8
+
+
+def cpu_count():
+    """
+    :return: number of cores this process may run on
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return multiprocessing.cpu_count()
+
+
+def available_memory():
+    """
+    :return: bytes of memory available to new processes, None if it can't be found out
+    """
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError):
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def _which(name):
+    for directory in os.environ.get('PATH', '').split(os.pathsep):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+
+
+def _output_position(command, output):
+    # where the last argument that is exactly output starts, None if it's not in the command.
+    position = command.rfind(' %s' % output)
+    while position != -1:
+        end = position + len(output) + 1
+        if end == len(command) or command[end] == ' ':
+            return position
+        position = command.rfind(' %s' % output, 0, position)
+    return None
+
+
+def _core_list(cores):
+    return ','.join([str(c) for c in cores])
+
+
+class Slot(object):
+    """
+    resources granted to one command.
+    """
+
+    def __init__(self, scheduler, threads, memory, cores=None):
+        self.scheduler = scheduler
+        self.threads = threads
+        self.memory = memory
+        self.cores = cores
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.scheduler.release(self)
+        return False
+
+    def wrap(self, command, ffmpeg='ffmpeg', magick='magick', outputs=()):
+        """
+        rewrites a command to stay inside this slot.
+        :param command: ffmpeg or magick command, anything else is only pinned
+        :param ffmpeg: the ffmpeg executable commands start with
+        :param magick: the magick executable commands start with
+        :param outputs: output files of a command writing several, each gets its encoder limited.  The last argument
+        is taken as the only output otherwise.
+        :return: command
+        """
+        if command.startswith('%s ' % ffmpeg):
+            head = command[len(ffmpeg):]
+            # input -threads sizes the decoder, output -threads the encoder (libx264's threads).
+            positions = [_output_position(head, o) for o in outputs or ()]
+            positions = sorted(set([p for p in positions if p is not None]), reverse=True)
+            if not positions:
+                positions = [head.rindex(' ')]
+            for position in positions:
+                head = '%s -threads %s%s' % (head[:position], self.threads, head[position:])
+            command = '%s -threads %s -filter_threads %s%s' % (ffmpeg, self.threads, self.threads, head)
+        elif command.startswith('%s ' % magick):
+            rest = command[len(magick):]
+            prefix = magick
+            for tool in (' mogrify', ' convert', ' montage', ' composite'):
+                if rest.startswith(tool + ' '):
+                    prefix, rest = magick + tool, rest[len(tool):]
+                    break
+            limits = ' -limit thread %s' % self.threads
+            if self.memory:
+                limits = '%s -limit memory %sMiB -limit map %sMiB' % (limits, self.memory // MB,
+                                                                     2 * self.memory // MB)
+            command = '%s%s%s' % (prefix, limits, rest)
+        if self.cores and self.scheduler.taskset:
+            command = '%s -c %s %s' % (self.scheduler.taskset, _core_list(self.cores), command)
+        return command
+
+
+class Scheduler(object):
+    """
+    grants slots while there are cores and memory free for them.
+    """
+
+    def __init__(self, cores=None, memory=None, concurrency=1, pin=False):
+        """
+        :param cores: cores to share, defaults to every core this process may use
+        :param memory: bytes of memory to share, defaults to MEMORY_FRACTION of what's available
+        :param concurrency: number of jobs expected to run at once, budgets are never bigger than their share of the
+        cores.
+        :param pin: pin each command to its own cores with taskset (linux only).  Pinned commands wait for a free core.
+        """
+        self.cores = cores or cpu_count()
+        if memory is None:
+            available = available_memory()
+            memory = int(available * MEMORY_FRACTION) if available else None
+        self.memory = memory
+        self.concurrency = max(1, concurrency)
+        self.taskset = _which('taskset') if pin and sys.platform.startswith('linux') else None
+        if pin and not self.taskset:
+            logging.warning('taskset not found, commands will not be pinned to cores')
+        self._free_cores = list(range(self.cores))
+        self._threads = 0
+        self._memory = 0
+        self._running = 0
+        self._waiting = 0
+        self._condition = threading.Condition()
+
+    def budget(self, share=1):
+        """
+        :param share: number of commands the caller runs at the same time
+        :return: threads a command starting now should use, the cores split between it, the commands running and
+        waiting, and the caller's other commands.
+        """
+        return max(1, self.cores // max(self.concurrency, share, self._running + self._waiting + 1))
+
+    def _fits(self, memory):
+        if not self._running:
+            # a command bigger than the machine still runs, on its own.
+            return True
+        if self._running >= self.cores or (self.taskset and not self._free_cores):
+            return False
+        return not self.memory or self._memory + memory <= self.memory
+
+    def reserve(self, share=1, threads=None, memory=0):
+        """
+        waits until a command can run without oversubscribing the machine.
+        :param share: number of commands the caller runs at the same time, budgets are never bigger than their share
+        :param threads: thread budget, overrides the one worked out when the slot is granted
+        :param memory: predicted memory use in bytes
+        :return: Slot, release it (or use it as a context manager) when the command is done
+        """
+        if self.memory:
+            memory = min(memory, self.memory)
+        with self._condition:
+            self._waiting += 1
+            try:
+                while not self._fits(memory):
+                    self._condition.wait()
+            finally:
+                self._waiting -= 1
+            threads = min(threads or self.budget(share), self.cores)
+            cores = None
+            if self.taskset:
+                threads = min(threads, len(self._free_cores))
+                cores, self._free_cores = self._free_cores[:threads], self._free_cores[threads:]
+            self._threads += threads
+            self._memory += memory
+            self._running += 1
+        return Slot(self, threads, memory, cores)
+
+    def release(self, slot):
+        with self._condition:
+            self._threads -= slot.threads
+            self._memory -= slot.memory
+            self._running -= 1
+            if slot.cores:
+                self._free_cores = sorted(self._free_cores + slot.cores)
+            self._condition.notify_all()
+
+
+_scheduler = None
+_lock = threading.Lock()
+
+
+def get_scheduler():
+    """
+    :return: the scheduler local commands share, created on first use
+    """
+    global _scheduler
+    with _lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+        return _scheduler
+
+
+def configure(**kwargs):
+    """
+    replaces the shared scheduler, see Scheduler for the arguments.  Jobs runners set concurrency to the number of
+    jobs they run at once.
+    """
+    global _scheduler
+    with _lock:
+        _scheduler = Scheduler(**kwargs)
+        return _scheduler
@@ -0,0 +1,191 @@
+"""
+Indexes image sequences on disk.
+
+A directory is scanned once with os.scandir and every file that looks like a frame (name.####.ext) is grouped into a
+sequence.  Indexes are cached per directory and rebuilt when the directory's mtime changes, so asking for several
+sequences in a render directory with tens of thousands of files only lists it once.
+"""
+import os
+import re
+import threading
+import time
+
+FRAME_REGEX = re.compile(r'^(?P<prefix>.*?)(?P<frame>\d{3,})\.(?P<ext>\w{2,4})$')
+PATTERN_REGEX = re.compile(r'^(?P<prefix>.*?)(?P<token>\*|#+|%0?(?P<padding>\d*)d)\.(?P<ext>\w{2,4})$')
+# directory mtimes only have a resolution of a second or two on some filesystems (NFS, FAT), an index built within
+# this many seconds of the directory changing can't be trusted to have seen every file.
+MTIME_GRACE = 2.0
+
+_CACHE = {}
+_LOCK = threading.Lock()
+
+
+class SequenceInfo(object):
+    """
+    A single image sequence found on disk.
+    """
+
+    def __init__(self, directory, prefix, padding, ext):
+        self.directory = directory
+        self.prefix = prefix
+        self.padding = padding
+        self.ext = ext
+        self.frames = []
+
+    def __repr__(self):
+        return '<SequenceInfo %s %s-%s (%s frames)>' % (self.num_sequence, self.start_frame, self.end_frame,
+                                                         len(self.frames))
+
+    @property
+    def start_frame(self):
+        return self.frames[0] if self.frames else None
+
+    @property
+    def end_frame(self):
+        return self.frames[-1] if self.frames else None
+
+    @property
+    def gaps(self):
+        """
+        list of frame numbers missing between start_frame and end_frame.
+        """
+        if not self.frames:
+            return []
+        existing = set(self.frames)
+        return [f for f in range(self.start_frame, self.end_frame + 1) if f not in existing]
+
+    @property
+    def num_sequence(self):
+        return os.path.join(self.directory, '%s%%0%sd.%s' % (self.prefix, self.padding, self.ext))
+
+    @property
+    def hash_sequence(self):
+        return os.path.join(self.directory, '%s%s.%s' % (self.prefix, '#' * self.padding, self.ext))
+
+    @property
+    def star_sequence(self):
+        return os.path.join(self.directory, '%s*.%s' % (self.prefix, self.ext))
+
+    def frame_string(self, frame):
+        return str(frame).zfill(self.padding)
+
+    def frame_path(self, frame):
+        return os.path.join(self.directory, '%s%s.%s' % (self.prefix, self.frame_string(frame), self.ext))
+
+
+class SequenceIndex(object):
+    """
+    All sequences in a single directory.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.mtime = None
+        self.scanned_at = None
+        self._sequences = {}
+        self.scan()
+
+    def scan(self):
+        sequences = {}
+        self.mtime = os.stat(self.directory).st_mtime
+        self.scanned_at = time.time()
+        for entry in _scandir(self.directory):
+            match = FRAME_REGEX.match(entry)
+            if not match:
+                continue
+            frame = match.group('frame')
+            key = (match.group('prefix'), len(frame), match.group('ext'))
+            if key not in sequences:
+                sequences[key] = SequenceInfo(self.directory, *key)
+            sequences[key].frames.append(int(frame))
+        for sequence in sequences.values():
+            sequence.frames.sort()
+        self._sequences = sequences
+
+    def is_current(self):
+        try:
+            mtime = os.stat(self.directory).st_mtime
+        except OSError:
+            return False
+        return mtime == self.mtime and self.scanned_at - mtime > MTIME_GRACE
+
+    @property
+    def sequences(self):
+        return sorted(self._sequences.values(), key=lambda s: (s.prefix, s.padding, s.ext))
+
+    def find(self, pattern):
+        """
+        finds the sequence matching a file name, formatted with (#, %04d, *) or as a single frame.
+        :param pattern: file name or full path of the sequence
+        :return: SequenceInfo or None
+        """
+        name = os.path.basename(pattern)
+        match = PATTERN_REGEX.match(name)
+        if match:
+            padding = None
+            token = match.group('token')
+            if token.startswith('#'):
+                padding = len(token)
+            elif match.group('padding'):
+                padding = int(match.group('padding'))
+        else:
+            match = FRAME_REGEX.match(name)
+            if not match:
+                return None
+            padding = len(match.group('frame'))
+        candidates = [s for s in self.sequences if s.prefix == match.group('prefix') and s.ext == match.group('ext')]
+        if padding:
+            candidates = [s for s in candidates if s.padding == padding]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda s: len(s.frames))
+
+
+def _scandir(directory):
+    if hasattr(os, 'scandir'):
+        for entry in os.scandir(directory):
+            if not entry.name.startswith('.'):
+                yield entry.name
+    else:
+        for name in os.listdir(directory):
+            if not name.startswith('.'):
+                yield name
+
+
+def get_index(directory):
+    """
+    returns the cached SequenceIndex for a directory, rescanning it if it's changed since the last scan.
+    :param directory: directory to index
+    :return: SequenceIndex
+    """
+    directory = os.path.abspath(directory)
+    with _LOCK:
+        index = _CACHE.get(directory)
+        if index and index.is_current():
+            return index
+        index = SequenceIndex(directory)
+        _CACHE[directory] = index
+        return index
+
+
+def find_sequence(path):
+    """
+    finds the sequence on disk for a sequence path formatted with (#, %04d, *) or a single frame of it.
+    :param path: path to the sequence
+    :return: SequenceInfo or None
+    """
+    directory = os.path.dirname(path) or '.'
+    if not os.path.isdir(directory):
+        return None
+    return get_index(directory).find(path)
+
+
+def clear_cache(directory=None):
+    """
+    drops cached indexes, all of them if no directory is given.
+    """
+    with _LOCK:
+        if directory:
+            _CACHE.pop(os.path.abspath(directory), None)
+        else:
+            _CACHE.clear()
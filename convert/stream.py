@@ -0,0 +1,92 @@
+"""
+Streams frames straight into an encoder.
+
+Frames are decoded, resized and converted to sRGB by magick, written to stdout as ppm and fed in order to the stdin of
+an ffmpeg reading image2pipe.  Nothing is written to disk between the renders and the movie, so building a review
+movie from exr/dpx renders doesn't need an intermediate jpeg sequence.
+"""
+import collections
+import logging
+import subprocess
+from multiprocessing.pool import ThreadPool
+
+PIPE_INPUT_ARGS = '-f image2pipe -c:v ppm -framerate %s -i -'
+
+
+def decode_command(magick, file_in, res=None, colorspace='sRGB'):
+    """
+    :param magick: path to the magick executable
+    :param file_in: frame to decode
+    :param res: fit the frame within this geometry (1920x1080) before it's piped, None to keep the full resolution.
+    :param colorspace: colorspace the frame is converted to
+    :return: magick command, as a list, that writes the frame to stdout as an 8 bit ppm
+    """
+    command = [magick, file_in, '-colorspace', colorspace]
+    if res:
+        command += ['-resize', res]
+    return command + ['-depth', '8', 'ppm:-']
+
+
+def _decode(command):
+    p = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = p.communicate()
+    if p.returncode != 0 or not out:
+        return None, err.decode('utf-8', 'replace') if err else 'decode returned %s' % p.returncode
+    return out, None
+
+
+def stream_frames(frames, encoder_command, magick='magick', res=None, colorspace='sRGB', workers=1, read_ahead=None):
+    """
+    decodes frames with magick and pipes them, in order, into an encoder.
+    :param frames: list of frame paths, in the order they go into the movie
+    :param encoder_command: shell command of an encoder reading ppm frames from stdin (see PIPE_INPUT_ARGS)
+    :param magick: path to the magick executable
+    :param res: fit frames within this geometry before piping them
+    :param colorspace: colorspace frames are converted to
+    :param workers: number of frames decoded at the same time
+    :param read_ahead: max number of decoded frames waiting for the encoder, defaults to twice the workers.  Keeps
+    memory bounded when decoding is faster than encoding.
+    :return: dict with the encoder's returncode, the number of frames piped and the frames that failed to decode.
+    Failed frames are replaced with the previous frame so the movie keeps its timing.
+    """
+    read_ahead = read_ahead or max(2, workers * 2)
+    failed = []
+    written = 0
+    pool = ThreadPool(max(1, workers))
+    encoder = subprocess.Popen(encoder_command, stdin=subprocess.PIPE, shell=True)
+    pending = collections.deque()
+    queue = iter(frames)
+    previous = None
+    try:
+        for frame in queue:
+            pending.append((frame, pool.apply_async(_decode, (decode_command(magick, frame, res, colorspace),))))
+            if len(pending) >= read_ahead:
+                break
+        while pending:
+            frame, result = pending.popleft()
+            for next_frame in queue:
+                pending.append((next_frame, pool.apply_async(_decode, (decode_command(magick, next_frame, res,
+                                                                                      colorspace),))))
+                break
+            data, error = result.get()
+            if data is None:
+                logging.error('Could not decode %s: %s' % (frame, error))
+                failed.append({'file_in': frame, 'error': error})
+                data = previous
+                if data is None:
+                    continue
+            encoder.stdin.write(data)
+            previous = data
+            written += 1
+    except (IOError, OSError) as e:
+        # the encoder went away, its return code says why.
+        logging.error('Encoder stopped accepting frames: %s' % e)
+    finally:
+        pool.terminate()
+        pool.join()
+        try:
+            encoder.stdin.close()
+        except (IOError, OSError):
+            pass
+        encoder.wait()
+    return {'command': encoder_command, 'returncode': encoder.returncode, 'frames': written, 'failed': failed}
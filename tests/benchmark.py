@@ -0,0 +1,372 @@
+"""
+Benchmarks every conversion entry point against synthetic media.
+
+Inputs are generated locally with ffmpeg (testsrc/sine movies and numbered image sequences), and cgl's app_config,
+cgl_execute, write_to_cgl_data and path objects are replaced with local stand-ins, so the suite runs anywhere ffmpeg and
+magick are on the PATH without touching studio config or cgl_data.
+
+    python -m tests.benchmark --frames 96 --resolution 1920x1080 --output bench.json
+    python -m tests.benchmark --output bench.json --baseline previous_bench.json --tolerance 0.1
+
+Each case reports wall time, throughput (frames per second), peak python memory and the peak RSS of child processes.
+With --baseline, cases slower than the baseline by more than the tolerance are listed and the run exits with 1.
+
+Before the cases run, importing convert.convert is timed in a fresh interpreter.  The run exits with 1 if the import
+takes longer than --import_budget, loads the config, or imports click, cgl.core.path or Pillow: farm tasks pay for all
+of that on every start.
+"""
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+import click
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+EXECUTED = []
+CGL_DATA = []
+
+
+def _which(name):
+    if hasattr(shutil, 'which'):
+        return shutil.which(name) or name
+    return name
+
+
+def local_cgl_execute(command, methodology='local', verbose=True, command_name='cgl_execute', WaitForJobID=None,
+                      new_window=False, **kwargs):
+    """
+    stand-in for cgl.core.utils.general.cgl_execute, runs every command locally and waits for it.
+    """
+    start = time.time()
+    p = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output = p.communicate()[0]
+    info = {'command': command, 'command_name': command_name, 'methodology': 'local', 'job_id': len(EXECUTED),
+            'start_time': start, 'end_time': time.time(), 'returncode': p.returncode}
+    if p.returncode != 0:
+        print('FAILED: %s\n%s' % (command, output.decode('utf-8', 'replace')[-2000:]))
+    EXECUTED.append(info)
+    return info
+
+
+def local_write_to_cgl_data(process_info):
+    CGL_DATA.append(process_info)
+
+
+def local_app_config():
+    return {'paths': {'ffmpeg': _which('ffmpeg'), 'ffprobe': _which('ffprobe'), 'magick': _which('magick')},
+            'default': {'padding': 4, 'frame_rate': 24,
+                        'resolution': {'thumb': '192x108', 'thumb_cine': '256x108', 'video_review': '1920x1080'}},
+            'ext_map': {'.mov': 'movie', '.mp4': 'movie', '.jpg': 'image', '.png': 'image', '.wav': 'audio'},
+            'account_info': {'project_management': 'lumbermill'}}
+
+
+class LocalSequence(object):
+    """
+    stand-in for cgl.core.path.Sequence, enough of it for the conversion functions.
+    """
+    regex = re.compile(r'^(?P<prefix>.*?)(?P<token>\*|#+|%0?(?P<padding>\d*)d)(?P<ext>\.\w{2,4})$')
+
+    def __init__(self, path, padding=None):
+        from convert.sequence_index import find_sequence
+        self.path = path
+        match = self.regex.match(path)
+        self.valid = bool(match)
+        if not match:
+            return
+        token = match.group('token')
+        self.ext = match.group('ext')
+        if padding:
+            self.padding = int(padding)
+        elif token.startswith('#'):
+            self.padding = len(token)
+        else:
+            self.padding = int(match.group('padding') or 4)
+        prefix = match.group('prefix')
+        self.star_sequence = '%s*%s' % (prefix, self.ext)
+        self.num_sequence = '%s%%0%sd%s' % (prefix, self.padding, self.ext)
+        on_disk = find_sequence(self.num_sequence)
+        self.start_frame = on_disk.start_frame if on_disk else 1
+
+    def is_valid_sequence(self):
+        return self.valid
+
+
+class LocalPathObject(object):
+    """
+    stand-in for cgl.core.path.PathObject.
+    """
+
+    def __init__(self, path):
+        self.path_root = path
+        self.context = 'render'
+
+    def set_attr(self, **kwargs):
+        pass
+
+
+# cgl modules install_stubs replaces.
+STUBBED = ('cgl', 'cgl.core', 'cgl.core.config', 'cgl.core.utils', 'cgl.core.utils.general', 'cgl.core.path')
+
+
+def install_stubs():
+    """
+    puts local stand-ins for the cgl modules convert.convert imports into sys.modules.
+    """
+    modules = {}
+    for name in STUBBED:
+        modules[name] = sys.modules[name] = types.ModuleType(name)
+    modules['cgl.core.config'].app_config = local_app_config
+    modules['cgl.core.utils.general'].cgl_execute = local_cgl_execute
+    modules['cgl.core.utils.general'].write_to_cgl_data = local_write_to_cgl_data
+    modules['cgl.core.path'].Sequence = LocalSequence
+    modules['cgl.core.path'].PathObject = LocalPathObject
+
+
+# seconds importing convert.convert may take.
+IMPORT_BUDGET = 0.25
+# modules convert.convert should only import when they're used.
+DEFERRED = ('click', 'cgl.core.config', 'cgl.core.path', 'PIL')
+# run in a fresh interpreter, only cgl_execute's module is stubbed: importing anything in DEFERRED fails or shows up.
+IMPORT_CHECK = '''
+import json, sys, time, types
+sys.path.insert(0, %r)
+for name in ('cgl', 'cgl.core', 'cgl.core.utils', 'cgl.core.utils.general'):
+    sys.modules[name] = types.ModuleType(name)
+general = sys.modules['cgl.core.utils.general']
+general.cgl_execute = general.write_to_cgl_data = lambda *args, **kwargs: None
+start = time.time()
+try:
+    import convert.convert
+    error = None
+except ImportError as e:
+    error = str(e)
+seconds = time.time() - start
+config = sys.modules.get('convert.config')
+print(json.dumps({'seconds': seconds, 'error': error, 'config_loaded': bool(config and config.CONFIG.loaded),
+                  'imported': [m for m in %r if m in sys.modules]}))
+'''
+
+
+def import_time(budget, repeat=3):
+    """
+    times importing convert.convert in a fresh interpreter, keeping the fastest of repeat runs.
+    :param budget: seconds the import may take
+    :return: dict with seconds, error (the import failed), config_loaded, imported (deferred modules that were imported
+    anyway) and ok
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = IMPORT_CHECK % (root, DEFERRED)
+    best = None
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', script], cwd=root)
+        result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+    best['budget'] = budget
+    best['ok'] = (best['seconds'] <= budget and not best['error'] and not best['config_loaded'] and
+                  not best['imported'])
+    print('%-24s %8.3fs budget %.3fs %s%s%s%s' % ('import convert.convert', best['seconds'], budget,
+                                                 'ok' if best['ok'] else 'FAILED',
+                                                 ' %s' % best['error'] if best['error'] else '',
+                                                 ', config loaded' if best['config_loaded'] else '',
+                                                 ''.join([', imported %s' % m for m in best['imported']])))
+    return best
+
+
+def run(command):
+    subprocess.check_call(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def generate_media(workdir, frames, resolution, duration, frame_rate=24):
+    """
+    generates the synthetic inputs the benchmarks run on.
+    :return: dict of input paths
+    """
+    ffmpeg = _which('ffmpeg')
+    size = resolution
+    media = {'movie': os.path.join(workdir, 'movie.mov'),
+             'movie_h264': os.path.join(workdir, 'movie_h264.mp4'),
+             'jpg_sequence': os.path.join(workdir, 'jpg', 'bench.####.jpg'),
+             'png_sequence': os.path.join(workdir, 'png', 'bench.####.png')}
+    lavfi = '-f lavfi -i testsrc=size=%s:rate=%s:duration=%s -f lavfi -i sine=frequency=1000:duration=%s' % (
+        size, frame_rate, duration, duration)
+    run('%s -y %s -c:v mjpeg -q:v 3 -c:a pcm_s16le -shortest %s' % (ffmpeg, lavfi, media['movie']))
+    run('%s -y %s -vf scale=-2:720 -c:v libx264 -pix_fmt yuv420p -c:a aac -ac 2 -shortest %s' % (ffmpeg, lavfi,
+                                                                                              media['movie_h264']))
+    for key, ext in [('jpg_sequence', 'jpg'), ('png_sequence', 'png')]:
+        directory = os.path.dirname(media[key])
+        os.makedirs(directory)
+        run('%s -y -f lavfi -i testsrc=size=%s:rate=%s -frames:v %s -start_number 1001 %s' % (
+            ffmpeg, size, frame_rate, frames, os.path.join(directory, 'bench.%%04d.%s' % ext)))
+    return media
+
+
+def cases(media, out, frames, duration, frame_rate, workers):
+    """
+    :return: list of (name, frames processed, function) for every benchmark case
+    """
+    from convert import convert
+    movie_frames = int(duration * frame_rate)
+    jpgs = media['jpg_sequence']
+    return [
+        ('proxy_sequence', frames,
+         lambda: convert.create_proxy_sequence(jpgs, os.path.join(out, 'proxy', 'bench.####.jpg'), width='960')),
+        ('proxy_sequence_workers', frames,
+         lambda: convert.create_proxy_sequence(jpgs, os.path.join(out, 'proxy_w', 'bench.####.jpg'), width='960',
+                                               workers=workers)),
+        ('web_mov', frames,
+         lambda: convert.create_web_mov(jpgs, os.path.join(out, 'web.mp4'))),
+        ('web_mov_segmented', frames,
+         lambda: convert.create_web_mov(jpgs, os.path.join(out, 'web_segmented.mp4'), segments=workers)),
+        ('web_mov_stream', frames,
+         lambda: convert.create_web_mov(media['png_sequence'], os.path.join(out, 'web_stream.mp4'), stream=True,
+                                        workers=workers)),
+        ('mp4', movie_frames,
+         lambda: convert.convert_to_mp4(media['movie'], os.path.join(out, 'movie.mp4'))),
+        ('mp4_remux', movie_frames,
+         lambda: convert.convert_to_mp4(media['movie_h264'], os.path.join(out, 'movie_remux.mp4'))),
+        ('mp4_audio', movie_frames,
+         lambda: convert.convert_to_mp4(media['movie'], os.path.join(out, 'movie_audio.mp4'), audio_only=True)),
+        ('prores', movie_frames,
+         lambda: convert.create_prores_mov(media['movie'], os.path.join(out, 'movie_prores.mov'))),
+        ('movie_thumb', movie_frames,
+         lambda: convert.create_movie_thumb(media['movie'], os.path.join(out, 'movie_thumb.jpg'))),
+        ('extract_wav', movie_frames,
+         lambda: convert.extract_wav_from_movie(media['movie'], os.path.join(out, 'movie.wav'))),
+        ('render_plan', movie_frames, lambda: _render_plan(convert, media['movie'], os.path.join(out, 'plan'))),
+        ('contact_sheet', movie_frames,
+         lambda: convert.create_contact_sheet(media['movie'], os.path.join(out, 'movie_sheet.jpg'))),
+        ('abr_ladder', movie_frames,
+         lambda: convert.create_abr_ladder(media['movie'], os.path.join(out, 'hls'), rungs=['720p', '360p'])),
+    ]
+
+
+def _render_plan(convert, movie, output_base):
+    plan = convert.RenderPlan(movie, output_base=output_base)
+    for target in ('mp4', 'audio', 'wav', 'thumb'):
+        plan.add(target)
+    return plan.execute()
+
+
+def _child_maxrss_kb():
+    if not resource:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # bytes on mac, kilobytes everywhere else
+    return maxrss / 1024 if sys.platform == 'darwin' else maxrss
+
+
+def measure(name, frames, function, repeat, out):
+    """
+    runs a case repeat times, keeping the fastest run.
+    """
+    best = None
+    for _ in range(repeat):
+        if os.path.exists(out):
+            shutil.rmtree(out)
+        os.makedirs(out)
+        del EXECUTED[:]
+        tracemalloc.start()
+        start = time.time()
+        try:
+            result = function()
+            error = None
+        except Exception as e:
+            result = None
+            error = '%s: %s' % (e.__class__.__name__, e)
+        wall_time = time.time() - start
+        python_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        ok = error is None and all(info['returncode'] == 0 for info in EXECUTED)
+        run_result = {'wall_time': wall_time,
+                      'throughput_fps': frames / wall_time if wall_time else None,
+                      'frames': frames,
+                      'python_peak_kb': python_peak / 1024,
+                      'child_maxrss_kb': _child_maxrss_kb(),
+                      'processes': len(EXECUTED),
+                      'ok': ok,
+                      'error': error,
+                      'steps': result.get('metrics') if isinstance(result, dict) else None}
+        if best is None or (ok and wall_time < best['wall_time']):
+            best = run_result
+    print('%-24s %8.2fs %8.1f fps %s' % (name, best['wall_time'], best['throughput_fps'] or 0,
+                                        'ok' if best['ok'] else 'FAILED %s' % (best['error'] or '')))
+    return best
+
+
+def compare(report, baseline, tolerance):
+    """
+    :return: list of (case, baseline wall time, wall time) for cases slower than baseline by more than tolerance
+    """
+    regressions = []
+    for name, result in report['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous or not previous.get('ok') or not result['ok']:
+            continue
+        if result['wall_time'] > previous['wall_time'] * (1 + tolerance):
+            regressions.append((name, previous['wall_time'], result['wall_time']))
+    return regressions
+
+
+@click.command()
+@click.option('--frames', '-f', default=48, help='length of the image sequences')
+@click.option('--resolution', '-r', default='1920x1080', help='resolution of the synthetic media')
+@click.option('--duration', '-d', default=5, help='length of the synthetic movies in seconds')
+@click.option('--workers', '-wk', default=4, help='workers/segments for the parallel cases')
+@click.option('--repeat', default=1, help='runs per case, the fastest is reported')
+@click.option('--case', '-c', 'selected', multiple=True, help='only run these cases')
+@click.option('--output', '-o', default='bench_report.json', help='where the json report is written')
+@click.option('--baseline', '-b', default=None, help='json report to compare against')
+@click.option('--tolerance', default=0.1, help='allowed slowdown against the baseline, 0.1 is 10%')
+@click.option('--workdir', default=None, help='where media is generated, a temp dir by default')
+@click.option('--import_budget', default=IMPORT_BUDGET, help='seconds importing convert.convert may take')
+def main(frames, resolution, duration, workers, repeat, selected, output, baseline, tolerance, workdir, import_budget):
+    import_result = import_time(import_budget)
+    install_stubs()
+    cleanup = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix='cgl_convert_bench_')
+    frame_rate = local_app_config()['default']['frame_rate']
+    try:
+        media = generate_media(workdir, frames, resolution, duration, frame_rate)
+        report = {'meta': {'frames': frames, 'resolution': resolution, 'duration': duration, 'workers': workers,
+                           'repeat': repeat, 'python': platform.python_version(), 'platform': platform.platform(),
+                           'cpu_count': os.cpu_count() if hasattr(os, 'cpu_count') else None,
+                           'date': time.strftime('%Y-%m-%d %H:%M:%S')},
+                  'import': import_result,
+                  'results': {}}
+        out = os.path.join(workdir, 'out')
+        for name, case_frames, function in cases(media, out, frames, duration, frame_rate, workers):
+            if selected and name not in selected:
+                continue
+            report['results'][name] = measure(name, case_frames, function, repeat, out)
+    finally:
+        if cleanup:
+            shutil.rmtree(workdir, ignore_errors=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print('report written to %s' % output)
+    if baseline:
+        with open(baseline, 'r') as f:
+            regressions = compare(report, json.load(f), tolerance)
+        for name, before, after in regressions:
+            print('REGRESSION %-24s %.2fs -> %.2fs' % (name, before, after))
+        if regressions:
+            sys.exit(1)
+    if not import_result['ok']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
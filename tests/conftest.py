@@ -0,0 +1,50 @@
+"""
+Fixtures for tests that need convert.convert.  When cgl isn't installed its modules are swapped for the benchmark's
+stand-ins for the length of the test, and the config is always the benchmark's local one.
+"""
+import importlib
+import sys
+
+import pytest
+
+from tests import benchmark
+
+
+class Executed(list):
+    """
+    stand-in for cgl_execute, records the commands it's given instead of running them.  Commands get returncode back.
+    """
+    returncode = 0
+
+    def __call__(self, command, methodology='local', command_name='cgl_execute', **kwargs):
+        self.append(command)
+        return {'command': command, 'command_name': command_name, 'methodology': methodology, 'job_id': len(self),
+                'returncode': self.returncode}
+
+
+@pytest.fixture
+def convert(monkeypatch):
+    """
+    :return: the convert.convert module
+    """
+    try:
+        importlib.import_module('cgl.core.utils.general')
+    except ImportError:
+        for name in benchmark.STUBBED:
+            monkeypatch.setitem(sys.modules, name, None)
+        benchmark.install_stubs()
+    from convert import convert
+    from convert.config import CONFIG
+    monkeypatch.setattr(CONFIG, '_data', benchmark.local_app_config())
+    return convert
+
+
+@pytest.fixture
+def executed(convert, monkeypatch):
+    """
+    :return: Executed list of the commands convert.convert ran
+    """
+    executed = Executed()
+    monkeypatch.setattr(convert, 'cgl_execute', executed)
+    monkeypatch.setattr(convert, 'write_to_cgl_data', lambda process_info: None)
+    return executed
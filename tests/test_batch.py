@@ -0,0 +1,9 @@
+def test_multi_target_jobs_write_next_to_inputs(convert, executed, monkeypatch, tmp_path):
+    from convert.batch import find_jobs
+    monkeypatch.setattr(convert, 'media_info', lambda filein: {'has_audio': True})
+    (tmp_path / 'a.mov').write_text(u'')
+    jobs = find_jobs(str(tmp_path / '*.mov'), 'mp4,thumb', output_dir=str(tmp_path))
+    assert [job['conversion_type'] for job in jobs] == ['mp4,thumb']
+    process_info = convert.run_job(jobs[0])
+    assert process_info['outputs'] == {'mp4': str(tmp_path / 'a.mp4'), 'thumb': str(tmp_path / 'a_thumb.jpg')}
+    assert len(executed) == 1
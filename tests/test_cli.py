@@ -0,0 +1,16 @@
+from click.testing import CliRunner
+
+
+def test_segment_options(convert, monkeypatch):
+    from convert import cli
+    calls = []
+    monkeypatch.setattr(cli, 'convert_file', lambda *args, **kwargs: calls.append((args, kwargs)))
+    result = CliRunner().invoke(cli.main, ['-i', 'shot.mov', '-o', 'shot_hls', '-t', 'hls', '--segment_type', 'fmp4',
+                                           '--segment_time', '4'])
+    assert result.exit_code == 0, result.output
+    (args, kwargs), = calls
+    assert args == ('shot.mov', 'shot_hls')
+    assert (kwargs['conversion_type'], kwargs['segment_type'], kwargs['segment_time']) == ('hls', 'fmp4', 4)
+
+    result = CliRunner().invoke(cli.main, ['-i', 'shot.mov', '-t', 'hls', '--segment_type', 'webm'])
+    assert result.exit_code == 2
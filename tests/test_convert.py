@@ -0,0 +1,145 @@
+import os
+
+
+def test_frame_chunks_by_count(convert):
+    assert convert.frame_chunks(1001, 1010, chunks=3) == [(1001, 1004), (1005, 1008), (1009, 1010)]
+    assert convert.frame_chunks(1, 3, chunks=10) == [(1, 1), (2, 2), (3, 3)]
+    assert convert.frame_chunks(1001, 1010) == [(1001, 1010)]
+
+
+def test_frame_chunks_by_size(convert):
+    assert convert.frame_chunks(0, 9, chunks=2, chunk_size=4) == [(0, 3), (4, 7), (8, 9)]
+    assert convert.frame_chunks(1001, 1001, chunk_size=10) == [(1001, 1001)]
+
+
+def test_contact_sheet_vtt(convert):
+    vtt = convert.contact_sheet_vtt('sheet.jpg', 3661.5, 4, 2, 160, 90).split('\n')
+    assert vtt[:2] == ['WEBVTT', '']
+    cues = [vtt[i:i + 2] for i in range(2, len(vtt) - 1, 3)]
+    assert len(cues) == 4
+    assert cues[0] == ['00:00:00.000 --> 00:15:15.375', 'sheet.jpg#xywh=0,0,160,90']
+    assert cues[1][1] == 'sheet.jpg#xywh=160,0,160,90'
+    assert cues[2][1] == 'sheet.jpg#xywh=0,90,160,90'
+    assert cues[3] == ['00:45:46.125 --> 01:01:01.500', 'sheet.jpg#xywh=160,90,160,90']
+
+
+def _plan(convert, tmp_path, *targets):
+    plan = convert.RenderPlan(str(tmp_path / 'shot.mov'), str(tmp_path / 'out' / 'shot'))
+    for target in targets:
+        plan.add(target)
+    return plan
+
+
+def test_render_plan_command(convert, tmp_path):
+    plan = _plan(convert, tmp_path, 'mp4', 'wav', 'thumb')
+    out = str(tmp_path / 'out' / 'shot')
+    command = plan.command()
+    assert command.startswith('ffmpeg -i %s ' % plan.input_file)
+    assert command.index('-f mp4 %s.mp4' % out) < command.index('-ac 2 %s.wav' % out) < \
+        command.index('-frames:v 1 %s_thumb.jpg' % out)
+    assert plan.command(plan.outputs[1:2]) == 'ffmpeg -i %s -vn -acodec pcm_s16le -ac 2 %s.wav' % (plan.input_file, out)
+
+
+def test_render_plan_execute(convert, executed, monkeypatch, tmp_path):
+    monkeypatch.setattr(convert, 'media_info', lambda filein: {'has_audio': True})
+    plan = _plan(convert, tmp_path, 'mp4', 'audio')
+    process_info = plan.execute()
+    assert len(executed) == 1
+    assert ' %s ' % plan.outputs[0][1] in executed[0] and executed[0].endswith(plan.outputs[1][1])
+    assert process_info['file_out'] == plan.outputs[0][1]
+    assert process_info['outputs'] == {'mp4': plan.outputs[0][1], 'audio': plan.outputs[1][1]}
+    assert 'skipped_outputs' not in process_info
+    assert os.path.isdir(str(tmp_path / 'out'))
+
+
+def test_render_plan_skips_audio(convert, executed, monkeypatch, tmp_path):
+    monkeypatch.setattr(convert, 'media_info', lambda filein: {'has_audio': False})
+    plan = _plan(convert, tmp_path, 'mp4', 'audio', 'wav')
+    process_info = plan.execute()
+    assert len(executed) == 1
+    assert '_audio.mp4' not in executed[0] and '.wav' not in executed[0]
+    assert process_info['outputs'] == {'mp4': plan.outputs[0][1], 'audio': None, 'wav': None}
+    assert process_info['skipped_outputs'] == {'audio': 'no audio stream', 'wav': 'no audio stream'}
+
+    process_info = _plan(convert, tmp_path, 'audio').execute()
+    assert len(executed) == 1
+    assert process_info['file_out'] is None
+    assert process_info['skipped'] == 'no audio stream'
+
+
+def test_abr_ladder_farm_command(convert, executed):
+    process_info = convert.create_abr_ladder('/shots/shot.mov', '/shots/shot_hls', rungs=['720p', '360p'],
+                                             segment_type='fmp4', segment_time=4, processing_method='smedge')
+    assert executed == ['python %s.py -i /shots/shot.mov -o /shots/shot_hls -t hls -ft movie --rungs 720p,360p '
+                        '--segment_type fmp4 --segment_time 4' % os.path.splitext(convert.__file__)[0]]
+    assert process_info['file_out'] == '/shots/shot_hls/master.m3u8'
+
+
+def test_process_frames_reports_failed_commands(convert, executed, tmp_path):
+    frames = []
+    for frame in (1001, 1002):
+        file_in, file_out = tmp_path / ('shot.%s.exr' % frame), tmp_path / ('proxy.%s.jpg' % frame)
+        file_in.write_text(u'')
+        # proxies from an earlier run must not pass for frames this run failed to write.
+        file_out.write_text(u'')
+        frames.append((str(file_in), str(file_out)))
+    executed.returncode = 1
+    process_info = convert.process_frames(frames, '960x')
+    assert len(executed) == 2
+    assert process_info['failed'] == [{'file_in': i, 'file_out': o, 'error': 'exited with 1'} for i, o in frames]
+    assert not [o for i, o in frames if os.path.exists(o)]
+
+    executed.returncode = 0
+    process_info = convert.process_frames(frames, '960x')
+    assert [f['error'] for f in process_info['failed']] == ['output not written'] * 2
+
+
+def _info(height=720, pix_fmt='yuv420p', video_codec='h264', audio_codec='aac', channels=2, audio=True):
+    from convert.probe import parse_probe
+    streams = [{'codec_type': 'video', 'codec_name': video_codec, 'pix_fmt': pix_fmt, 'width': height * 16 // 9,
+                'height': height}]
+    if audio:
+        streams.append({'codec_type': 'audio', 'codec_name': audio_codec, 'channels': channels})
+    return parse_probe({'format': {'duration': '10'}, 'streams': streams})
+
+
+def test_can_remux_mp4(convert):
+    assert convert.can_remux_mp4(_info())
+    assert convert.can_remux_mp4(_info(height=480, audio=False))
+    assert not convert.can_remux_mp4(_info(height=1080))
+    assert not convert.can_remux_mp4(_info(pix_fmt='yuv422p10le'))
+    assert not convert.can_remux_mp4(_info(video_codec='prores'))
+    assert not convert.can_remux_mp4(_info(channels=6))
+    assert not convert.can_remux_mp4(_info(audio_codec='pcm_s24le'))
+    assert not convert.can_remux_mp4(None)
+
+
+def test_can_remux_mp4_audio_only(convert):
+    assert convert.can_remux_mp4(_info(height=1080, pix_fmt='yuv422p10le'), audio_only=True)
+    assert not convert.can_remux_mp4(_info(channels=6), audio_only=True)
+    assert not convert.can_remux_mp4(_info(audio=False), audio_only=True)
+
+
+def test_mp4_command(convert):
+    command, method = convert.mp4_command('a.mov', 'a.mp4', _info())
+    assert method == 'remux'
+    assert command == 'ffmpeg -i a.mov -map 0:v:0 -map "0:a:0?" -c copy -movflags +faststart -f mp4 a.mp4'
+    for info in (_info(height=1080), _info(pix_fmt='yuv444p'), _info(channels=6), None):
+        command, method = convert.mp4_command('a.mov', 'a.mp4', info)
+        assert method == 'encode'
+        assert command == 'ffmpeg -i a.mov %s %s -f mp4 a.mp4' % (convert.MP4_ACODEC, convert.MP4_VCODEC)
+    assert convert.mp4_command('a.mov', 'a.mp4', _info(), allow_remux=False)[1] == 'encode'
+
+
+def test_mp4_command_audio_only(convert):
+    assert convert.mp4_command('a.mov', 'a_audio.mp4', _info(height=1080), audio_only=True) == (
+        'ffmpeg -i a.mov -vn -map 0:a:0 -c:a copy -movflags +faststart a_audio.mp4', 'remux')
+    assert convert.mp4_command('a.mov', 'a_audio.mp4', _info(channels=6), audio_only=True) == (
+        'ffmpeg -i a.mov -vn %s a_audio.mp4' % convert.MP4_ACODEC, 'encode')
+
+
+def test_prores_returns_process_info(convert, executed):
+    process_info = convert.create_prores_mov('/shots/a.mov', quality=2)
+    assert process_info['file_out'] == '/shots/a_prores_standard.mov'
+    assert process_info['metrics'][0]['step'] == 'prores'
+    assert '-profile:v 2 -c:a copy' in executed[0] and executed[0].endswith(' /shots/a_prores_standard.mov')
@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+
+def test_inotify_rescan(convert, tmp_path):
+    from convert.daemon import InotifyWatcher
+    if not InotifyWatcher.available():
+        pytest.skip('inotify is linux only')
+    watcher = InotifyWatcher([str(tmp_path)])
+    try:
+        (tmp_path / 'shots').mkdir()
+        (tmp_path / 'shots' / 'shot.mov').write_text(u'')
+        (tmp_path / '.manifest').write_text(u'')
+        (tmp_path / 'a.mov').write_text(u'')
+        assert sorted(watcher.rescan()) == [str(tmp_path / 'a.mov'), str(tmp_path / 'shots' / 'shot.mov')]
+        assert str(tmp_path / 'shots') in watcher._dirs.values()
+        # the new folder is watched, so files written to it are reported.
+        watcher.poll(0)
+        (tmp_path / 'shots' / 'b.mov').write_text(u'')
+        assert str(tmp_path / 'shots' / 'b.mov') in watcher.poll(1)
+    finally:
+        watcher.close()
+
+
+@pytest.fixture
+def daemon(convert):
+    from convert import daemon
+    return daemon
+
+
+def _frames(tmp_path, count=3):
+    for frame in range(1001, 1001 + count):
+        (tmp_path / ('shot.%s.jpg' % frame)).write_text(u'')
+    return str(tmp_path / 'shot.####.jpg')
+
+
+def test_validate_job_accepts(daemon, tmp_path):
+    movie = tmp_path / 'a.mov'
+    movie.write_text(u'')
+    assert daemon.validate_job({'input_file': str(movie)}) is None
+    assert daemon.validate_job({'input_file': str(movie), 'output_file': str(tmp_path / 'a.mp4'), 'file_type': 'movie',
+                                'conversion_type': 'mp4,thumb', 'options': {'incremental': True}}) is None
+    options = {'rungs': ['720p', '360p'], 'segment_type': 'fmp4', 'segment_time': 4}
+    assert daemon.validate_job({'input_file': str(movie), 'conversion_type': 'hls', 'options': options}) is None
+    assert daemon.validate_job({'input_file': _frames(tmp_path), 'file_type': 'sequence', 'conversion_type': 'proxy',
+                                'options': {'engine': 'pillow', 'width': 960, 'start_frame': None}}) is None
+
+
+@pytest.mark.parametrize('job, error', [
+    (['a.mov'], 'input_file is required'),
+    ({'output_file': 'a.mp4'}, 'input_file is required'),
+    ({'input_file': '{movie}', 'priority': 1}, 'unknown fields: priority'),
+    ({'input_file': '{movie}', 'output_file': 'a.mp4; rm -rf ~'}, 'output_file must be a path'),
+    ({'input_file': '$(reboot).mov'}, 'input_file must be a path'),
+    ({'input_file': '{movie}', 'output_file': 1}, 'output_file must be a path'),
+    ({'input_file': '{movie}', 'file_type': 'image'}, 'file_type must be one of'),
+    ({'input_file': '{missing}'}, 'does not exist'),
+    ({'input_file': '{missing}', 'file_type': 'sequence'}, 'no frames found'),
+    ({'input_file': '{movie}', 'conversion_type': 'mp4,gif'}, 'conversion_type must be one or more of'),
+    ({'input_file': '{movie}', 'conversion_type': 1}, 'conversion_type must be one or more of'),
+    ({'input_file': '{movie}', 'options': ['incremental']}, 'options must be an object'),
+    ({'input_file': '{movie}', 'options': {'shell': True}}, 'unknown option shell'),
+    ({'input_file': '{movie}', 'options': {'engine': 'gimp'}}, 'bad value for option engine'),
+    ({'input_file': '{movie}', 'options': {'rungs': ['8k']}}, 'bad value for option rungs'),
+    ({'input_file': '{movie}', 'options': {'segment_type': 'webm'}}, 'bad value for option segment_type'),
+    ({'input_file': '{movie}', 'options': {'width': '960; rm -rf ~'}}, 'bad value for option width'),
+])
+def test_validate_job_rejects(daemon, tmp_path, job, error):
+    movie = tmp_path / 'a.mov'
+    movie.write_text(u'')
+    if isinstance(job, dict) and 'input_file' in job:
+        job = dict(job, input_file=job['input_file'].format(movie=movie, missing=tmp_path / 'b.mov'))
+    assert error in daemon.validate_job(job)
+
+
+def test_windows_paths(daemon):
+    assert bool(daemon.UNSAFE_PATH.search(r'C:\shots\a.mov')) == (os.name != 'nt')
+
+
+def test_debouncer(daemon, monkeypatch):
+    now = [100.0]
+
+    class Clock(object):
+        @staticmethod
+        def time():
+            return now[0]
+
+    monkeypatch.setattr(daemon, 'time', Clock)
+    debouncer = daemon.Debouncer(settle=5)
+    debouncer.touch('a', 1)
+    now[0] += 3
+    debouncer.touch('b', 2)
+    assert debouncer.ready() == []
+    now[0] += 2
+    debouncer.touch('b', 3)
+    assert debouncer.ready() == [('a', 1)]
+    assert len(debouncer) == 1
+    now[0] += 4.9
+    assert debouncer.ready() == []
+    now[0] += 0.1
+    assert debouncer.ready() == [('b', 3)]
+    assert len(debouncer) == 0
@@ -0,0 +1,12 @@
+"""
+Importing convert.convert has to stay cheap, farm tasks pay for it on every start.  See tests.benchmark.import_time.
+"""
+from tests.benchmark import DEFERRED, IMPORT_BUDGET, import_time
+
+
+def test_import_budget():
+    result = import_time(IMPORT_BUDGET)
+    assert result['error'] is None
+    assert result['seconds'] <= IMPORT_BUDGET
+    assert result['config_loaded'] is False
+    assert [m for m in DEFERRED if m in result['imported']] == []
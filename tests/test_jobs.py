@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+
+@pytest.fixture
+def jobs(convert):
+    from convert import jobs
+    return jobs
+
+
+def test_source_key(jobs, tmp_path):
+    frame = str(tmp_path / 'shot.1001.jpg')
+    sequence = str(tmp_path / 'shot.####.jpg')
+    assert jobs.source_key(frame) == (sequence, 'sequence', sequence)
+    assert jobs.source_key(str(tmp_path / 'shot.1002.jpg'))[0] == sequence
+    movie = str(tmp_path / 'a.mov')
+    assert jobs.source_key(movie) == (movie, 'movie', movie)
+    # numbered movies aren't frames of a sequence.
+    take = str(tmp_path / 'take.001.mov')
+    assert jobs.source_key(take) == (take, 'movie', take)
+
+
+def test_jobs_for_movie(jobs, tmp_path):
+    movie = str(tmp_path / 'a.mov')
+    out = str(tmp_path / 'converted')
+    rule = {'output': out, 'movie': ['mp4', 'thumb', 'hls', 'contact_sheet', 'proxy']}
+    assert jobs.jobs_for(movie, 'movie', rule) == [
+        {'input_file': movie, 'output_file': os.path.join(out, 'a.mov'), 'file_type': 'movie',
+         'conversion_type': 'mp4,thumb'},
+        {'input_file': movie, 'output_file': os.path.join(out, 'a_hls'), 'file_type': 'movie',
+         'conversion_type': 'hls'},
+        {'input_file': movie, 'output_file': os.path.join(out, 'a_sheet.jpg'), 'file_type': 'movie',
+         'conversion_type': 'contact_sheet'}]
+    assert jobs.jobs_for(movie, 'movie', {'output': out, 'movie': ['prores']}) == [
+        {'input_file': movie, 'output_file': os.path.join(out, 'a_prores_proxy.mov'), 'file_type': 'movie',
+         'conversion_type': 'prores'}]
+    assert jobs.jobs_for(movie, 'movie', {'output': out}) == []
+
+
+def test_jobs_for_skips_outputs_over_the_input(jobs, tmp_path):
+    movie = str(tmp_path / 'a.mp4')
+    assert jobs.jobs_for(movie, 'movie', {'movie': ['mp4']}) == []
+    assert jobs.jobs_for(movie, 'movie', {'movie': ['mp4', 'thumb']}) == []
+    assert [j['conversion_type'] for j in jobs.jobs_for(movie, 'movie', {'movie': ['thumb']})] == ['thumb']
+
+
+def test_jobs_for_sequence(jobs, tmp_path):
+    for frame in (1001, 1002):
+        (tmp_path / ('shot.%s.jpg' % frame)).write_text(u'')
+    sequence = str(tmp_path / 'shot.####.jpg')
+    out = str(tmp_path / 'converted')
+    rule = {'output': out, 'sequence': ['proxy', 'web_preview', 'mp4']}
+    assert jobs.jobs_for(sequence, 'sequence', rule) == [
+        {'input_file': sequence, 'output_file': os.path.join(out, 'proxy', 'shot.####.jpg'), 'file_type': 'sequence',
+         'conversion_type': 'proxy', 'options': {'incremental': True}},
+        {'input_file': sequence, 'output_file': os.path.join(out, 'shot.mp4'), 'file_type': 'sequence',
+         'conversion_type': 'web_preview', 'options': {'incremental': True}}]
+    assert jobs.jobs_for(str(tmp_path / 'missing.####.jpg'), 'sequence', rule) == []
@@ -0,0 +1,65 @@
+import os
+
+from convert.manifest import MANIFEST_NAME, Manifest
+
+
+def _write(path, content):
+    with open(str(path), 'w') as f:
+        f.write(content)
+    return str(path)
+
+
+def _touch(path, mtime):
+    os.utime(path, (mtime, mtime))
+
+
+def test_is_current_after_record(tmp_path):
+    frame = _write(tmp_path / 'in.1001.exr', 'frame')
+    output = _write(tmp_path / 'out.1001.jpg', 'proxy')
+    manifest = Manifest(str(tmp_path))
+    assert not manifest.is_current(output, [frame], {'res': 1920})
+    manifest.record(output, [frame], {'res': 1920})
+    manifest.save()
+    manifest = Manifest(str(tmp_path))
+    assert manifest.is_current(output, [frame], {'res': 1920})
+    assert not manifest.is_current(output, [frame], {'res': 1280})
+    os.remove(output)
+    assert not manifest.is_current(output, [frame], {'res': 1920})
+
+
+def test_changed_input(tmp_path):
+    frame = _write(tmp_path / 'in.1001.exr', 'frame')
+    output = _write(tmp_path / 'out.1001.jpg', 'proxy')
+    manifest = Manifest(str(tmp_path))
+    manifest.record(output, [frame], {'res': 1920})
+    _write(frame, 'frame, longer')
+    assert not manifest.is_current(output, [frame], {'res': 1920})
+
+
+def test_content_hash_survives_a_touch(tmp_path):
+    frame = _write(tmp_path / 'in.1001.exr', 'frame')
+    output = _write(tmp_path / 'out.1001.jpg', 'proxy')
+    manifest = Manifest(str(tmp_path))
+    manifest.record(output, [frame], {'res': 1920}, content_hash=True)
+    _touch(frame, os.stat(frame).st_mtime + 100)
+    assert not manifest.is_current(output, [frame], {'res': 1920})
+    assert manifest.is_current(output, [frame], {'res': 1920}, content_hash=True)
+    _write(frame, 'FRAME')
+    _touch(frame, os.stat(frame).st_mtime + 200)
+    assert not manifest.is_current(output, [frame], {'res': 1920}, content_hash=True)
+
+
+def test_save_merges_other_writers(tmp_path):
+    frame = _write(tmp_path / 'in.1001.exr', 'frame')
+    first = _write(tmp_path / 'out.1001.jpg', 'proxy')
+    second = _write(tmp_path / 'out.1001.png', 'proxy')
+    a = Manifest(str(tmp_path))
+    b = Manifest(str(tmp_path))
+    a.record(first, [frame], {'res': 1920})
+    a.save()
+    b.record(second, [frame], {'res': 1920})
+    b.save()
+    manifest = Manifest(str(tmp_path))
+    assert manifest.is_current(first, [frame], {'res': 1920})
+    assert manifest.is_current(second, [frame], {'res': 1920})
+    assert [f for f in os.listdir(str(tmp_path)) if f.startswith(MANIFEST_NAME)] == [MANIFEST_NAME]
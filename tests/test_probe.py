@@ -0,0 +1,37 @@
+from convert.probe import parse_probe
+
+
+def test_movie_with_audio():
+    info = parse_probe({'format': {'format_name': 'mov,mp4', 'duration': '10.5', 'bit_rate': '2000000'},
+                        'streams': [{'codec_type': 'video', 'codec_name': 'h264', 'pix_fmt': 'yuv420p',
+                                     'width': 1920, 'height': 1080, 'avg_frame_rate': '24000/1001',
+                                     'nb_frames': '252', 'tags': {'timecode': '01:00:00:00'}},
+                                    {'codec_type': 'audio', 'codec_name': 'aac', 'channels': 6,
+                                     'channel_layout': '5.1', 'sample_rate': '48000'},
+                                    {'codec_type': 'audio', 'codec_name': 'aac', 'channels': 2}]})
+    assert info['duration'] == 10.5
+    assert (info['has_video'], info['has_audio'], info['audio_streams']) == (True, True, 2)
+    assert (info['width'], info['height'], info['frames']) == (1920, 1080, 252)
+    assert abs(info['frame_rate'] - 23.976) < 0.001
+    assert (info['audio_codec'], info['audio_channels'], info['sample_rate']) == ('aac', 6, 48000)
+    assert info['start_timecode'] == '01:00:00:00'
+
+
+def test_cover_art_is_not_video():
+    info = parse_probe({'format': {'duration': '180'},
+                        'streams': [{'codec_type': 'audio', 'codec_name': 'mp3', 'channels': 2},
+                                    {'codec_type': 'video', 'codec_name': 'mjpeg',
+                                     'disposition': {'attached_pic': 1}}]})
+    assert (info['has_video'], info['has_audio']) == (False, True)
+    assert info['width'] is None
+
+
+def test_fallbacks():
+    info = parse_probe({'format': {}, 'streams': [{'codec_type': 'video', 'avg_frame_rate': '0/0',
+                                                   'r_frame_rate': '25/1', 'duration': '4.0', 'nb_frames': 'N/A'},
+                                                  {'codec_type': 'data', 'tags': {'timecode': '00:00:10:00'}}]})
+    assert info['frame_rate'] == 25.0
+    assert info['duration'] == 4.0
+    assert info['frames'] is None
+    assert info['has_audio'] is False
+    assert info['start_timecode'] == '00:00:10:00'
@@ -0,0 +1,28 @@
+import pytest
+
+from convert.resize import target_size
+
+
+def test_width_height_and_fit():
+    assert target_size((3840, 2160), '1920') == (1920, 1080)
+    assert target_size((3840, 2160), 'x540') == (960, 540)
+    assert target_size((1000, 2000), '1920x1080') == (540, 1080)
+
+
+def test_rounds_half_up_like_magick():
+    assert target_size((4, 5), '2') == (2, 3)
+    assert target_size((1, 1000), '1') == (1, 1000)
+    assert target_size((1000, 1), '10') == (10, 1)
+
+
+def test_bad_geometry():
+    with pytest.raises(ValueError):
+        target_size((1920, 1080), '50%')
+
+
+def test_missing_pillow(monkeypatch, tmp_path):
+    from convert import resize
+    monkeypatch.setattr(resize, '_image', False)
+    assert not resize.available()
+    resizer = resize.PillowResizer('960')
+    assert resizer.resize(str(tmp_path / 'shot.1001.jpg'), str(tmp_path / 'proxy.1001.jpg')) is False
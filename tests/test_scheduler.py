@@ -0,0 +1,91 @@
+import threading
+
+from convert.scheduler import MB, Scheduler, Slot, _output_position
+
+
+def _slot(threads=4, memory=0, cores=None, taskset=None):
+    scheduler = Scheduler(cores=8, memory=1024 * MB)
+    scheduler.taskset = taskset
+    return Slot(scheduler, threads, memory, cores)
+
+
+def test_output_position():
+    assert _output_position('-i a.mov -f mp4 out.mp4', 'out.mp4') == 15
+    assert _output_position('-i out.mp4.mov -f mp4 out.mp4', 'out.mp4') == 21
+    assert _output_position('-i a.mov out.mp4.jpg', 'out.mp4') is None
+
+
+def test_wrap_single_output():
+    command = _slot().wrap('ffmpeg -i a.mov -c:v libx264 a.mp4')
+    assert command == 'ffmpeg -threads 4 -filter_threads 4 -i a.mov -c:v libx264 -threads 4 a.mp4'
+
+
+def test_wrap_outputs():
+    command = 'ffmpeg -i a.mov -f mp4 a.mp4 -vn a_audio.mp4 -frames:v 1 a_thumb.jpg'
+    assert _slot(threads=2).wrap(command, outputs=['a.mp4', 'a_thumb.jpg']) == (
+        'ffmpeg -threads 2 -filter_threads 2 -i a.mov -f mp4 -threads 2 a.mp4 -vn a_audio.mp4 -frames:v 1 -threads 2 '
+        'a_thumb.jpg')
+    # outputs that aren't in the command fall back to the last argument.
+    assert _slot(threads=2).wrap('ffmpeg -i a.mov a.mp4', outputs=['b.mp4']) == \
+        'ffmpeg -threads 2 -filter_threads 2 -i a.mov -threads 2 a.mp4'
+
+
+def test_wrap_magick():
+    slot = _slot(threads=2, memory=256 * MB)
+    assert slot.wrap('magick a.exr -resize 960 a.jpg') == \
+        'magick -limit thread 2 -limit memory 256MiB -limit map 512MiB a.exr -resize 960 a.jpg'
+    assert slot.wrap('magick mogrify -path out -resize 960 a.jpg') == \
+        'magick mogrify -limit thread 2 -limit memory 256MiB -limit map 512MiB -path out -resize 960 a.jpg'
+    assert _slot(threads=2).wrap('/opt/magick convert a.exr a.jpg', magick='/opt/magick') == \
+        '/opt/magick convert -limit thread 2 a.exr a.jpg'
+
+
+def test_wrap_taskset():
+    slot = _slot(threads=2, cores=[2, 3], taskset='/usr/bin/taskset')
+    assert slot.wrap('ffmpeg -i a.mov a.mp4') == \
+        '/usr/bin/taskset -c 2,3 ffmpeg -threads 2 -filter_threads 2 -i a.mov -threads 2 a.mp4'
+    assert slot.wrap('oiiotool a.exr -o a.jpg') == '/usr/bin/taskset -c 2,3 oiiotool a.exr -o a.jpg'
+    assert _slot(cores=[2, 3]).wrap('oiiotool a.exr -o a.jpg') == 'oiiotool a.exr -o a.jpg'
+
+
+def test_budget_split():
+    scheduler = Scheduler(cores=8, memory=1024 * MB)
+    assert scheduler.budget() == 8
+    assert scheduler.budget(share=3) == 2
+    assert Scheduler(cores=8, memory=1024 * MB, concurrency=4).budget() == 2
+    slots = [scheduler.reserve() for i in range(3)]
+    assert [s.threads for s in slots] == [8, 4, 2]
+    scheduler._waiting = 1
+    assert scheduler.budget() == 8 // 5
+    scheduler._waiting = 0
+    for slot in slots:
+        scheduler.release(slot)
+    assert (scheduler._running, scheduler._threads) == (0, 0)
+    assert scheduler.reserve(threads=16).threads == 8
+
+
+def test_fits():
+    scheduler = Scheduler(cores=2, memory=1024 * MB)
+    assert scheduler._fits(4096 * MB)
+    slot = scheduler.reserve(memory=768 * MB)
+    assert scheduler._fits(256 * MB)
+    assert not scheduler._fits(512 * MB)
+    scheduler.reserve()
+    assert not scheduler._fits(0)
+    scheduler.release(slot)
+    scheduler.taskset = '/usr/bin/taskset'
+    scheduler._free_cores = []
+    assert not scheduler._fits(0)
+
+
+def test_reserve_waits_for_release():
+    scheduler = Scheduler(cores=1, memory=1024 * MB)
+    first = scheduler.reserve()
+    granted = []
+    thread = threading.Thread(target=lambda: granted.append(scheduler.reserve()))
+    thread.start()
+    thread.join(0.2)
+    assert not granted and scheduler._waiting == 1
+    scheduler.release(first)
+    thread.join(5)
+    assert len(granted) == 1 and scheduler._waiting == 0
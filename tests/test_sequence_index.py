@@ -0,0 +1,61 @@
+import os
+import time
+
+from convert.sequence_index import clear_cache, find_sequence, get_index
+
+
+def _frames(directory, name, frames, padding=4, ext='exr'):
+    for frame in frames:
+        with open(os.path.join(str(directory), '%s%s.%s' % (name, str(frame).zfill(padding), ext)), 'w') as f:
+            f.write('x')
+
+
+def _age(directory, seconds):
+    # directory mtimes newer than MTIME_GRACE are never trusted, make the scan look old enough to be cached.
+    mtime = time.time() - seconds
+    os.utime(str(directory), (mtime, mtime))
+
+
+def setup_function(function):
+    clear_cache()
+
+
+def test_prefix_siblings_are_separate(tmp_path):
+    _frames(tmp_path, 'shot.', range(1001, 1004))
+    _frames(tmp_path, 'shot_bg.', range(1001, 1011))
+    _frames(tmp_path, 'shot.', range(1, 3), padding=6)
+    _frames(tmp_path, 'shot.', range(1001, 1003), ext='jpg')
+    assert len(get_index(str(tmp_path)).sequences) == 4
+    sequence = find_sequence(os.path.join(str(tmp_path), 'shot.####.exr'))
+    assert (sequence.prefix, sequence.padding, sequence.ext) == ('shot.', 4, 'exr')
+    assert sequence.frames == [1001, 1002, 1003]
+    assert find_sequence(os.path.join(str(tmp_path), 'shot.%06d.exr')).frames == [1, 2]
+    assert find_sequence(os.path.join(str(tmp_path), 'shot_bg.1005.exr')).end_frame == 1010
+    assert find_sequence(os.path.join(str(tmp_path), 'shot_fg.####.exr')) is None
+
+
+def test_gaps(tmp_path):
+    _frames(tmp_path, 'plate.', [1001, 1002, 1005, 1007])
+    sequence = find_sequence(os.path.join(str(tmp_path), 'plate.####.exr'))
+    assert (sequence.start_frame, sequence.end_frame) == (1001, 1007)
+    assert sequence.gaps == [1003, 1004, 1006]
+    assert sequence.frame_path(1003) == os.path.join(str(tmp_path), 'plate.1003.exr')
+
+
+def test_index_is_cached_until_the_directory_changes(tmp_path):
+    _frames(tmp_path, 'plate.', range(1001, 1004))
+    _age(tmp_path, 60)
+    index = get_index(str(tmp_path))
+    assert get_index(str(tmp_path)) is index
+    _frames(tmp_path, 'plate.', [1004])
+    _age(tmp_path, 30)
+    rescanned = get_index(str(tmp_path))
+    assert rescanned is not index
+    assert rescanned.find('plate.####.exr').frames == [1001, 1002, 1003, 1004]
+
+
+def test_recent_changes_are_rescanned(tmp_path):
+    _frames(tmp_path, 'plate.', range(1001, 1003))
+    index = get_index(str(tmp_path))
+    # the directory changed within MTIME_GRACE of the scan, files could still be arriving.
+    assert get_index(str(tmp_path)) is not index